@@ -0,0 +1,224 @@
+import sys
+import json
+import time
+import argparse
+import logging
+from datetime import date, timedelta
+from flask import Flask, g
+from src.models.database import db
+from manage_db import seed_booking_graph
+
+# Performance benchmarks on a throwaway in-memory database:
+#   python benchmarks.py <command> [options]
+
+def benchmark_app():
+    from src.routes.companies import companies_bp
+    from src.routes.invoices import invoices_bp
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    for blueprint in (companies_bp, invoices_bp):
+        app.register_blueprint(blueprint, url_prefix="/api")
+    db.init_app(app)
+    return app
+
+def timed(func, repeat):
+    """Average milliseconds of func over repeat runs"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def excel_data(args):
+    """Monthly Excel data read in-process vs. through the internal HTTP endpoint"""
+    from src.models import reports
+    from src.models.database import Company
+    from src.routes.invoices import generate_excel_like_monthly_invoice_pdf
+
+    app = benchmark_app()
+    with app.app_context():
+        db.create_all()
+        seed_booking_graph(args.bookings)
+        company = db.session.get(Company, 1)
+        arrival = date.today() + timedelta(days=1)
+        month, year = arrival.month, arrival.year
+        client = app.test_client()
+        url = f"/api/companies/{company.id}/monthly-invoice-excel?month={month}&year={year}"
+
+        # Test requests share this app context, so both paths drop the
+        # report built by the previous run
+        def over_http():
+            g.pop("reports", None)
+            return client.get(url).get_json()
+
+        def in_process():
+            g.pop("reports", None)
+            return reports.monthly_excel_report(company, month, year)
+
+        report = in_process()
+        results = {
+            "bookings": args.bookings,
+            "clients": len(report.clients),
+            "httpMs": round(timed(over_http, args.repeat), 3),
+            "inProcessMs": round(timed(in_process, args.repeat), 3),
+            "renderMs": round(timed(lambda: generate_excel_like_monthly_invoice_pdf(report).output(), args.repeat), 3),
+        }
+        results["savedMsPerPdf"] = round(results["httpMs"] - results["inProcessMs"], 3)
+    print(json.dumps(results, indent=2))
+    return 0
+
+def legacy_safe_text(text):
+    """safe_text as it was before src/pdf/text.py: a replace per Turkish letter on every call"""
+    import unicodedata
+    from src.pdf.text import TURKISH_TO_ASCII
+    if text is None:
+        return ""
+    text = str(text)
+    for code, replacement in TURKISH_TO_ASCII.items():
+        text = text.replace(chr(code), replacement)
+    try:
+        text.encode('latin-1')
+        return text
+    except UnicodeEncodeError:
+        return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+def text_cells(args):
+    """Cell text conversion of a large table: per-call safe_text vs. the cached conversions of src/pdf/text.py"""
+    from src.pdf import text
+    from src.pdf.fonts import font_family
+
+    # Names repeat across the rows of a table, as client, hotel and tour names do
+    names = ["Ahmet Yılmaz", "Şükrü Öztürk", "Çiğdem Ağaoğlu", "İstanbul Boğaz Turu", "Grand Hotel Süleymaniye",
+             "محمد العلي", "فندق الشرق", "Maria Gonzalez", "John Smith", "Kapadokya Balon Turu"]
+    cells = [f"{names[index % len(names)]} {index % 500}" for index in range(args.cells)]
+
+    def convert(func):
+        return lambda: [func(cell) for cell in cells]
+
+    results = {
+        "cells": len(cells),
+        "distinct": len(set(cells)),
+        "fontFamily": font_family(),
+        "legacySafeTextMs": round(timed(convert(legacy_safe_text), args.repeat), 3),
+        "safeTextMs": round(timed(convert(text.safe_text), args.repeat), 3),
+        "pdfTextMs": round(timed(convert(text.pdf_text), args.repeat), 3),
+    }
+    results["speedup"] = round(results["legacySafeTextMs"] / results["safeTextMs"], 2) if results["safeTextMs"] else None
+    print(json.dumps(results, indent=2))
+    return 0
+
+def _detailed_report_rows(rows):
+    """rows synthetic service lines of a my-company detailed invoice, ten per client"""
+    from src.models.reports import DetailedServiceRow
+
+    arrival = date.today()
+    for index in range(rows):
+        client = index // 10
+        yield DetailedServiceRow(
+            clientId=client, clientName=f"Client {client} Şükrü Öztürk", arrivalDate=arrival, serviceId=index,
+            serviceName=f"Kapadokya Balon Turu {index}", serviceType="Tour", serviceDate=arrival,
+            cost=100.0, selling=150.0, profit=50.0, clientCost=1000.0, clientSelling=1500.0, clientProfit=500.0
+        )
+
+def pdf_size(args):
+    """Size and render time of invoice PDFs in the standard and the compact profile"""
+    from src.models.database import Settings
+    from src.models.reports import CompanyInfo, MonthlyDetailedReport
+    from src.pdf import profiles
+    from src.pdf.fonts import font_family
+    from src.routes.invoices import generate_my_company_detailed_invoice_pdf
+
+    app = benchmark_app()
+    repeat = min(args.repeat, 5)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Settings(key="company_logo", value=args.logo))
+        db.session.commit()
+        company = CompanyInfo(id=1, name="Benchmark Company", email="", contactPerson="")
+        today = date.today()
+
+        def render(rows):
+            report = MonthlyDetailedReport(company, today.month, today.year, _detailed_report_rows(rows))
+            pdf = generate_my_company_detailed_invoice_pdf(report)
+            return pdf.page, bytes(pdf.output())
+
+        # Service lines per page, from the page counts of two sample documents;
+        # each document then gets the most lines (in steps of an eighth of a
+        # page) that fit its pages
+        profiles.set_profile("standard")
+        per_page = 400 / (render(800)[0] - render(400)[0])
+        step = max(int(per_page / 8), 1)
+        results = {"fontFamily": font_family(), "logo": args.logo, "runs": repeat, "documents": []}
+        for target in (int(pages) for pages in args.pages.split(",")):
+            profiles.set_profile("standard")
+            rows = int(target * per_page) + step
+            while rows > 1 and render(rows)[0] > target:
+                rows = max(rows - step, 1)
+            document = {"targetPages": target, "serviceLines": rows}
+            for name in profiles.PROFILES:
+                profiles.set_profile(name)
+                pages, data = render(rows)
+                document["pages"] = pages
+                document[f"{name}Bytes"] = len(data)
+                document[f"{name}Ms"] = round(timed(lambda: render(rows), repeat), 1)
+            document["savedPercent"] = round(100 * (1 - document["compactBytes"] / document["standardBytes"]), 1)
+            results["documents"].append(document)
+        profiles.set_profile("standard")
+    print(json.dumps(results, indent=2))
+    return 0
+
+def company_statement(args):
+    """A month of a company's client invoices: one PDF per client vs. one statement pack"""
+    from src.models.database import Client
+    from src.query_budget import count_queries
+    from src.routes.invoices import _client_invoice_document, _company_statement_document
+
+    app = benchmark_app()
+    repeat = min(args.repeat, 5)
+    with app.app_context():
+        db.create_all()
+        seed_booking_graph(args.bookings)
+        arrival = date.today() + timedelta(days=1)
+        period = {"month": arrival.month, "year": arrival.year}
+        client_ids = db.session.scalars(db.select(Client.id).where(Client.company_id == 1).order_by(Client.id)).all()
+
+        # Each run starts from an empty identity map, as a new request would
+        def per_client():
+            db.session.expire_all()
+            return sum(len(_client_invoice_document(dict(period, clientId=client_id)).render().output()) for client_id in client_ids)
+
+        def statement():
+            db.session.expire_all()
+            return len(_company_statement_document(dict(period, companyId=1)).render().output())
+
+        results = {"bookings": args.bookings, "clients": len(client_ids), "runs": repeat}
+        for name, func in (("perClient", per_client), ("statement", statement)):
+            with count_queries() as counter:
+                results[f"{name}Bytes"] = func()
+            results[f"{name}Queries"] = counter.count
+            results[f"{name}Ms"] = round(timed(func, repeat), 1)
+        results["speedup"] = round(results["perClientMs"] / results["statementMs"], 2) if results["statementMs"] else None
+    print(json.dumps(results, indent=2))
+    return 0
+
+COMMANDS = {
+    "excel-data": (excel_data, "Latency of the monthly Excel invoice data: in-process query vs. internal HTTP request"),
+    "text": (text_cells, "Conversion of PDF cell text: per-call safe_text vs. the cached conversions"),
+    "pdf-size": (pdf_size, "Size and render time of 1, 10 and 100 page invoice PDFs: standard vs. compact profile"),
+    "company-statement": (company_statement, "A month of one company's client invoices: a PDF per client vs. one statement pack"),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (handler, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("--bookings", type=int, default=1000, help="Number of bookings to seed")
+        subparser.add_argument("--repeat", type=int, default=50, help="Runs to average")
+        subparser.add_argument("--cells", type=int, default=100000, help="Table cells to convert (text)")
+        subparser.add_argument("--pages", default="1,10,100", help="Comma-separated page counts of the documents (pdf-size)")
+        subparser.add_argument("--logo", default="uploads/company_logo.png", help="Header logo setting (pdf-size)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    sys.exit(COMMANDS[args.command][0](args))
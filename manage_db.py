@@ -0,0 +1,231 @@
+import os
+import re
+import sys
+import json
+import argparse
+from datetime import date, time, timedelta
+from flask import Flask
+from sqlalchemy import func, select
+from src.models.database import db, Booking, InvoiceJob, MonthlyCompanyInvoice, Service
+from src.models import maintenance
+
+app = Flask(__name__)
+# Same database selection as src/main.py: DATABASE_URL (PostgreSQL) or the local app.db
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.db")
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+db.init_app(app)
+
+def backfill_money(args):
+    result = maintenance.backfill_money_columns()
+    print(json.dumps(result, indent=2))
+    return 0
+
+def rebuild_invoice_ledger(args):
+    result = maintenance.rebuild_invoice_ledger()
+    print(json.dumps(result, indent=2))
+    return 0
+
+def refresh_monthly_invoices(args):
+    from src.routes.invoices import refresh_monthly_company_invoice
+
+    statement = select(MonthlyCompanyInvoice.id).order_by(MonthlyCompanyInvoice.id)
+    if not args.all:
+        statement = statement.where(MonthlyCompanyInvoice.stale.is_(True))
+    results = []
+    for monthly_invoice_id in db.session.scalars(statement).all():
+        body, status = refresh_monthly_company_invoice({"monthlyInvoiceId": monthly_invoice_id, "full": args.all})
+        results.append(dict(body, status=status))
+    print(json.dumps(results, indent=2, default=str))
+    return 1 if any(result["status"] >= 400 for result in results) else 0
+
+def check_money(args):
+    drift = maintenance.find_money_drift()
+    print(json.dumps(drift, indent=2))
+    return 1 if drift["services"] or drift["bookings"] else 0
+
+# Models whose existing tables gained columns after they were first created
+UPGRADED_MODELS = (Service, Booking, MonthlyCompanyInvoice, InvoiceJob)
+
+def create_tables(args):
+    # create_all only adds the tables that do not exist yet
+    db.create_all()
+    added = {model.__tablename__: maintenance.add_missing_columns(model) for model in UPGRADED_MODELS}
+    print(json.dumps({"addedColumns": {table: columns for table, columns in added.items() if columns}}, indent=2))
+    return 0
+
+def apply_indexes(args):
+    created = maintenance.create_missing_indexes()
+    print(json.dumps({"createdIndexes": created}, indent=2))
+    return 0
+
+# Read-only requests whose SQL check-plans EXPLAINs; {company}, {client}, {vehicle}
+# and {driver} are replaced with the id of an existing row
+PLANNED_REQUESTS = [
+    "/api/bookings?limit=100&status=confirmed",
+    "/api/clients/{client}/bookings",
+    "/api/companies/{company}/clients",
+    "/api/companies/{company}/clients/detailed?month={month}&year={year}",
+    "/api/companies/{company}/monthly-invoice-excel?month={month}&year={year}",
+    "/api/vehicles",
+    "/api/vehicles/{vehicle}/schedule",
+    "/api/vehicles/status",
+    "/api/notifications/driver/{driver}",
+    "/api/invoices?limit=50",
+    "/api/invoices?limit=50&status=pending",
+    "/api/invoices?limit=50&type=client",
+    "/api/invoices?limit=50&companyId={company}",
+    "/api/invoices/company/{company}/statement/preview?month={month}&year={year}",
+    "/settings/company_name",
+]
+
+def capture_planned_requests():
+    """Run PLANNED_REQUESTS and return the SELECTs each one executed as (name, sql, parameters)
+
+    Every statement that could write is refused while they run (except the
+    single-flight claims of GET /companies/<id>/monthly-invoice-excel), so
+    this is safe on the live database. Statements without a WHERE or ORDER BY
+    read their whole table by design and are left out.
+    """
+    from src.models.database import Client, Company, Driver, RequestClaim, Vehicle
+    from src.query_budget import count_queries
+    from src.routes.bookings import bookings_bp
+    from src.routes.clients import clients_bp
+    from src.routes.companies import companies_bp
+    from src.routes.dashboard import dashboard_bp
+    from src.routes.invoices import invoices_bp
+    from src.routes.notifications import notifications_bp
+    from src.routes.settings import settings_bp
+    from src.routes.vehicles import vehicles_bp
+
+    for blueprint in (bookings_bp, clients_bp, companies_bp, dashboard_bp, invoices_bp, notifications_bp, vehicles_bp):
+        app.register_blueprint(blueprint, url_prefix="/api")
+    app.register_blueprint(settings_bp, url_prefix="/settings")
+
+    today = date.today()
+    ids = {
+        name: db.session.scalar(select(func.min(model.id))) or 1
+        for name, model in (("company", Company), ("client", Client), ("vehicle", Vehicle), ("driver", Driver))
+    }
+    db.session.rollback()
+    client = app.test_client()
+    captured, failed = [], []
+    seen = set()
+    with maintenance.read_only(writable=(RequestClaim.__tablename__,)):
+        for template in PLANNED_REQUESTS:
+            url = template.format(month=today.month, year=today.year, **ids)
+            with count_queries() as counter:
+                response = client.get(url)
+            db.session.rollback()
+            if response.status_code >= 400:
+                failed.append({"url": url, "status": response.status_code})
+                continue
+            for sql, parameters in zip(counter.statements, counter.parameters):
+                if sql in seen or not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                seen.add(sql)
+                if re.search(r"\b(?:WHERE|ORDER BY)\b", sql):
+                    captured.append((f"GET {url}", sql, parameters))
+    return captured, failed
+
+def check_plans(args):
+    captured, failed = capture_planned_requests()
+    results = maintenance.check_query_plans(captured)
+    print(json.dumps({"failedRequests": failed, "plans": results}, indent=2))
+    return 1 if failed or any(result["fullScans"] for result in results) else 0
+
+# Endpoints with a @query_budget and the request that exercises them on the seeded graph
+BUDGETED_REQUESTS = [
+    ("bookings.get_bookings", "GET", "/api/bookings?all=true"),
+    ("bookings.get_bookings", "GET", "/api/bookings?limit=100&status=confirmed"),
+    ("clients.get_client_bookings", "GET", "/api/clients/1/bookings"),
+    ("invoices.get_invoices", "GET", "/api/invoices?all=true"),
+    ("invoices.get_invoices", "GET", "/api/invoices?limit=100"),
+    ("notifications.schedule_notifications", "POST", "/api/notifications/schedule"),
+]
+
+def seed_booking_graph(bookings):
+    """Fill an empty database with bookings spread over a few clients, drivers and vehicles"""
+    from src.models.database import Booking, Client, Company, Driver, Invoice, MonthlyCompanyInvoice, Notification, Service, Vehicle
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+    companies = [Company(name=f"Company {i}") for i in range(3)]
+    drivers = [
+        Driver(firstName="Driver", lastName=str(i), email=f"driver{i}@example.com", phone=f"+90500000{i:04d}", licenseNumber=f"L{i}")
+        for i in range(10)
+    ]
+    vehicles = [Vehicle(model="Van", plateNumber=f"34 TB {i:04d}", type="Van", capacity=8) for i in range(10)]
+    clients = [Client(firstName="Client", lastName=str(i), company=companies[i % len(companies)]) for i in range(max(bookings // 10, 1))]
+    db.session.add_all(companies + drivers + vehicles + clients)
+    for i in range(bookings):
+        booking = Booking(
+            client_ref=clients[i % len(clients)], overall_startDate=tomorrow, overall_endDate=tomorrow + timedelta(days=3),
+            status="confirmed"
+        )
+        booking.services.append(Service(
+            serviceType="Hotel", serviceName="Hotel stay", startDate=tomorrow, endDate=tomorrow + timedelta(days=3),
+            hotelName="Hotel", numNights=3, costPerNight=50.0, sellingPricePerNight=80.0
+        ))
+        booking.services.append(Service(
+            serviceType="Tour", serviceName="City tour", startDate=tomorrow, endDate=tomorrow, startTime=time(10, 0),
+            driver_ref=drivers[i % len(drivers)], vehicle_ref=vehicles[i % len(vehicles)], costToCompany=30.0, sellingPrice=60.0
+        ))
+        booking.invoices.append(Invoice(invoiceType="client", totalAmount=300.0, invoiceDate=today))
+        db.session.add(booking)
+        db.session.add(Notification(driver=drivers[i % len(drivers)], booking=booking, message="-", notification_type="whatsapp"))
+    for company in companies:
+        db.session.add(MonthlyCompanyInvoice(company=company, invoice_month=today.month, invoice_year=today.year, invoiceDate=today))
+    db.session.commit()
+
+def check_query_budgets(args):
+    from src.query_budget import count_queries
+    from src.routes.bookings import bookings_bp
+    from src.routes.clients import clients_bp
+    from src.routes.invoices import invoices_bp
+    from src.routes.notifications import notifications_bp
+
+    # A throwaway in-memory database, so the check never touches real data
+    budget_app = Flask(__name__)
+    budget_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    budget_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    for blueprint in (bookings_bp, clients_bp, invoices_bp, notifications_bp):
+        budget_app.register_blueprint(blueprint, url_prefix="/api")
+    db.init_app(budget_app)
+
+    results = []
+    with budget_app.app_context():
+        db.create_all()
+        seed_booking_graph(args.bookings)
+        client = budget_app.test_client()
+        for endpoint, method, url in BUDGETED_REQUESTS:
+            with count_queries() as counter:
+                response = client.open(url, method=method, json={} if method == "POST" else None)
+            budget = budget_app.view_functions[endpoint].query_budget
+            results.append({
+                "endpoint": endpoint, "url": url, "status": response.status_code,
+                "queries": counter.count, "budget": budget
+            })
+    print(json.dumps(results, indent=2))
+    return 1 if any(result["queries"] > result["budget"] or result["status"] >= 400 for result in results) else 0
+
+COMMANDS = {
+    "backfill-money": (backfill_money, "Recompute the stored service/booking money columns"),
+    "rebuild-invoice-ledger": (rebuild_invoice_ledger, "Create and refill the invoice ledger behind GET /invoices from both invoice tables"),
+    "refresh-monthly-invoices": (refresh_monthly_invoices, "Refresh the stale monthly company invoices (--all: every one)"),
+    "check-money": (check_money, "Report services and bookings whose stored money columns drifted"),
+    "create-tables": (create_tables, "Create the model tables and columns missing from an existing database"),
+    "apply-indexes": (apply_indexes, "Create the model indexes missing from an existing database"),
+    "check-plans": (check_plans, "EXPLAIN the hot queries and fail if any of them scans a whole table"),
+    "check-query-budgets": (check_query_budgets, "Run the budgeted endpoints on seeded data and fail on any that exceed their query budget"),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (handler, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+    subparsers.choices["refresh-monthly-invoices"].add_argument("--all", action="store_true", help="Recompute every line of every monthly invoice, not only the changed lines of the stale ones")
+    subparsers.choices["check-query-budgets"].add_argument("--bookings", type=int, default=1000, help="Number of bookings to seed")
+    args = parser.parse_args()
+
+    with app.app_context():
+        sys.exit(COMMANDS[args.command][0](args))
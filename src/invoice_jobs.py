@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app, request
+from sqlalchemy import func, update
+from src.extensions import db
+from src.models.database import InvoiceJob
+
+# Invoice generation jobs, with the database as the queue.
+#
+# The generate endpoints either render the PDF inside the request (the old
+# behaviour) or, when asked to run asynchronously, store an InvoiceJob row and
+# answer 202 with its id. src/invoice_worker.py claims queued rows, runs the
+# registered handler in a process pool and records progress and the final
+# pdfPath on the row; GET /api/invoices/jobs/<id> reports them.
+#
+# A handler takes the request body and a progress callback and returns the
+# (response body, status code) the synchronous endpoint would have answered.
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# A running job whose worker went away (no progress or heartbeat) is retried after this long
+JOB_TIMEOUT = timedelta(seconds=int(os.environ.get("INVOICE_JOB_TIMEOUT", "900")))
+MAX_ATTEMPTS = 3
+
+JOB_HANDLERS = {}
+
+def job_handler(job_type):
+    """Register a function as the handler of a job type"""
+    def decorator(handler):
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return decorator
+
+def no_progress(percent, message=None):
+    pass
+
+def request_flag(data, name, default=False):
+    """Boolean option of a generate request, from the query string or the JSON body"""
+    value = request.args.get(name)
+    if value is None and isinstance(data, dict):
+        value = data.get(name)
+    if value is not None:
+        return str(value).lower() in ("1", "true", "yes")
+    return default
+
+def wants_async(data):
+    """True when the generate request should be queued instead of rendered inline"""
+    return request_flag(data, "async", current_app.config.get("ASYNC_INVOICE_JOBS", False))
+
+def enqueue_job(job_type, params):
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown invoice job type: {job_type}")
+    params = json.dumps({key: value for key, value in (params or {}).items() if key not in ("async", "inline", "persist")}, sort_keys=True)
+    # The same request queued twice (a double click) gets the job already waiting or running
+    job = InvoiceJob.query.filter(
+        InvoiceJob.status.in_([QUEUED, RUNNING]), InvoiceJob.jobType == job_type, InvoiceJob.params == params
+    ).order_by(InvoiceJob.id).first()
+    if job:
+        logging.info(f"Invoice job {job.id} ({job_type}) is already {job.status}")
+        return job
+    job = InvoiceJob(jobType=job_type, params=params, status=QUEUED, message="Queued")
+    db.session.add(job)
+    db.session.commit()
+    logging.info(f"Queued invoice job {job.id} ({job_type})")
+    return job
+
+def job_to_dict(job):
+    return {
+        "id": job.id,
+        "jobType": job.jobType,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "pdfPath": job.pdfPath,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "startedAt": job.started_at.isoformat() if job.started_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def _set_job(job_id, **values):
+    # Own connection and transaction, so progress is visible while the
+    # handler's session is still working
+    with db.engine.begin() as connection:
+        connection.execute(update(InvoiceJob.__table__).where(InvoiceJob.__table__.c.id == job_id).values(**values))
+
+def claim_next_job(worker):
+    """Mark the oldest queued job as running for worker; returns its id or None"""
+    while True:
+        job_id = db.session.query(InvoiceJob.id).filter(InvoiceJob.status == QUEUED).order_by(
+            InvoiceJob.id
+        ).with_for_update(skip_locked=True).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        # Compare-and-set, so two workers never run the same job
+        claimed = db.session.execute(
+            update(InvoiceJob).where(InvoiceJob.id == job_id, InvoiceJob.status == QUEUED).values(
+                status=RUNNING, worker=worker, attempts=InvoiceJob.attempts + 1,
+                progress=0, message="Starting", started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+def touch_jobs(job_ids):
+    """Record that the given running jobs are still being worked on"""
+    if not job_ids:
+        return
+    table = InvoiceJob.__table__
+    with db.engine.begin() as connection:
+        connection.execute(update(table).where(table.c.id.in_(list(job_ids)), table.c.status == RUNNING).values(
+            heartbeat_at=datetime.utcnow()
+        ))
+
+def requeue_stale_jobs(timeout=JOB_TIMEOUT):
+    """Queue running jobs without a sign of life for timeout again, or fail them after MAX_ATTEMPTS"""
+    cutoff = datetime.utcnow() - timeout
+    stale = InvoiceJob.query.filter(
+        InvoiceJob.status == RUNNING, func.coalesce(InvoiceJob.heartbeat_at, InvoiceJob.started_at) < cutoff
+    ).all()
+    for job in stale:
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = FAILED
+            job.error = f"Gave up after {job.attempts} attempts"
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = QUEUED
+            job.message = "Requeued after worker timeout"
+        logging.warning(f"Invoice job {job.id} was still running on {job.worker}: {job.status}")
+    db.session.commit()
+    return len(stale)
+
+def run_job(job_id):
+    """Run a claimed job and store its outcome"""
+    job = db.session.get(InvoiceJob, job_id)
+    if job is None:
+        logging.warning(f"Invoice job {job_id} disappeared before it ran")
+        return
+    job_type, params = job.jobType, json.loads(job.params)
+    db.session.rollback()
+
+    def progress(percent, message=None):
+        _set_job(job_id, progress=percent, message=message, heartbeat_at=datetime.utcnow())
+
+    try:
+        handler = JOB_HANDLERS[job_type]
+        progress(5, "Generating invoice")
+        body, status = handler(params, progress=progress)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Invoice job {job_id} failed: {e}")
+        traceback.print_exc()
+        body, status = {"error": str(e)}, 500
+
+    if status < 400:
+        _set_job(
+            job_id, status=COMPLETED, progress=100, message=body.get("message", "Completed"),
+            pdfPath=body.get("pdfPath"), result=json.dumps(body), finished_at=datetime.utcnow()
+        )
+    else:
+        _set_job(
+            job_id, status=FAILED, message="Failed", error=body.get("error") or body.get("message"),
+            result=json.dumps(body), finished_at=datetime.utcnow()
+        )
+    logging.info(f"Invoice job {job_id} ({job_type}) finished with status {status}")
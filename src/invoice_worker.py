@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from src.extensions import db
+from src import invoice_jobs
+from src.pdf.fonts import unicode_coverage
+from src.pdf.logos import prepare_logo
+
+# Invoice job worker: python -m src.invoice_worker [--processes N] [--drain]
+#
+# The supervisor polls the invoice_job table, claims queued jobs and hands
+# them to a pool of worker processes. Each process builds its own app and
+# database connections and loads the fonts and the company logo once, before
+# its first job.
+
+POLL_INTERVAL = 1.0
+DEFAULT_PROCESSES = int(os.environ.get("INVOICE_WORKER_PROCESSES", os.cpu_count() or 2))
+# Rendering is CPU bound: more processes than CPUs only adds memory and start-up time
+MAX_PROCESSES = max(os.cpu_count() or 2, DEFAULT_PROCESSES)
+STALE_CHECK_INTERVAL = 60.0
+# How often the supervisor records that the jobs in its pool are alive (well under INVOICE_JOB_TIMEOUT)
+HEARTBEAT_INTERVAL = 30.0
+
+_app = None
+
+def create_app(database_uri=None):
+    # Importing the invoice routes registers the job handlers
+    from src.routes.invoices import invoices_bp
+
+    app = Flask(__name__)
+    # Same database selection as src/main.py: DATABASE_URL (PostgreSQL) or the local app.db
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri or os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "app.db"
+    )
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.register_blueprint(invoices_bp, url_prefix="/api")
+    db.init_app(app)
+    return app
+
+def warm_up():
+    """Look up the invoice fonts and prepare the company logo ahead of the first job"""
+    from src.routes.invoices import get_company_settings
+    unicode_coverage()
+    company_name, company_logo = get_company_settings()
+    if company_logo:
+        prepare_logo(company_logo)
+
+def _init_process(database_uri):
+    global _app
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    _app = create_app(database_uri)
+    with _app.app_context():
+        try:
+            warm_up()
+        except Exception as e:
+            logging.warning(f"Invoice worker warm-up failed: {e}")
+
+def process_pool(processes, database_uri=None):
+    """Pool of processes ready to render invoices (see call_in_app), using the given database"""
+    return ProcessPoolExecutor(
+        processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_process, initargs=(database_uri,)
+    )
+
+def call_in_app(func, *args):
+    """Run func inside the app context of a pool process"""
+    with _app.app_context():
+        return func(*args)
+
+def _submit(pool, job_id):
+    return pool.submit(call_in_app, invoice_jobs.run_job, job_id)
+
+def serve(processes, drain=False, poll_interval=POLL_INTERVAL):
+    """Claim and run queued invoice jobs until interrupted (or, with drain, until the queue is empty)"""
+    app = create_app()
+    database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    running = {}  # future: (job id, pool generation)
+    generation = 0
+    last_stale_check = 0.0
+    last_heartbeat = time.monotonic()
+    with app.app_context():
+        pool = process_pool(processes, database_uri)
+        logging.info(f"Invoice worker {worker} started with {processes} processes")
+        try:
+            while True:
+                if time.monotonic() - last_stale_check > STALE_CHECK_INTERVAL:
+                    invoice_jobs.requeue_stale_jobs()
+                    last_stale_check = time.monotonic()
+                if time.monotonic() - last_heartbeat > HEARTBEAT_INTERVAL:
+                    # Jobs still in the pool are alive even between progress updates
+                    invoice_jobs.touch_jobs(job_id for job_id, _ in running.values())
+                    last_heartbeat = time.monotonic()
+
+                while len(running) < processes:
+                    job_id = invoice_jobs.claim_next_job(worker)
+                    if job_id is None:
+                        break
+                    logging.info(f"Claimed invoice job {job_id}")
+                    try:
+                        future = _submit(pool, job_id)
+                    except BrokenProcessPool:
+                        pool, generation = _replace_pool(pool, processes, database_uri), generation + 1
+                        future = _submit(pool, job_id)
+                    running[future] = (job_id, generation)
+
+                if drain and not running:
+                    return 0
+                if running:
+                    done, _ = wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    broken = False
+                    for future in done:
+                        job_id, pool_generation = running.pop(future)
+                        if future.exception():
+                            # The job stays running and is retried once INVOICE_JOB_TIMEOUT passes without a heartbeat
+                            logging.error(f"Invoice worker process failed on job {job_id}: {future.exception()}")
+                            # Every job of a broken pool fails; replace the pool once
+                            broken = broken or (isinstance(future.exception(), BrokenProcessPool) and pool_generation == generation)
+                    if broken:
+                        pool, generation = _replace_pool(pool, processes, database_uri), generation + 1
+                else:
+                    time.sleep(poll_interval)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+def _replace_pool(pool, processes, database_uri):
+    """A new process pool in place of one that broke (a process crashed or was killed)"""
+    logging.error("Invoice worker process pool broke, starting a new one")
+    pool.shutdown(wait=False, cancel_futures=True)
+    return process_pool(processes, database_uri)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued invoice generation jobs")
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES)
+    parser.add_argument("--drain", action="store_true", help="Exit once no queued jobs are left")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(serve(args.processes, drain=args.drain))
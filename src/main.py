@@ -8,6 +8,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
 from src.extensions import db
+from src import previews
 from src.routes.clients import clients_bp
 from src.routes.companies import companies_bp
 from src.routes.drivers import drivers_bp
@@ -20,6 +21,13 @@ from src.routes.dashboard import dashboard_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), "static"))
 app.config["SECRET_KEY"] = "tourism_booking_secret_key_2024"
+# List endpoints answer with the old unpaginated array unless the request asks for a page (see src/pagination.py)
+app.config["LEGACY_LIST_RESPONSES"] = os.environ.get("LEGACY_LIST_RESPONSES", "true").lower() == "true"
+# Invoice generate endpoints queue a job for src/invoice_worker.py instead of rendering in the request (see src/invoice_jobs.py)
+app.config["ASYNC_INVOICE_JOBS"] = os.environ.get("ASYNC_INVOICE_JOBS", "false").lower() == "true"
+# Invoice downloads hand the file to the front proxy: "nginx" (X-Accel-Redirect) or "sendfile" (X-Sendfile)
+app.config["INVOICE_DOWNLOAD_OFFLOAD"] = os.environ.get("INVOICE_DOWNLOAD_OFFLOAD") or None
+app.config["INVOICE_ACCEL_REDIRECT_PREFIX"] = os.environ.get("INVOICE_ACCEL_REDIRECT_PREFIX", "/protected/invoices/")
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -39,6 +47,9 @@ app.register_blueprint(notifications_bp, url_prefix="/api")
 app.register_blueprint(settings_bp, url_prefix="/settings")
 app.register_blueprint(dashboard_bp, url_prefix="/api")
 
+# Compile the invoice preview templates before the first request (see src/previews.py)
+previews.precompile()
+
 # Database configuration
 # استخدام متغير البيئة DATABASE_URL لقاعدة البيانات في بيئة الإنتاج (مثل PostgreSQL)
 # أو استخدام SQLite للتطوير المحلي إذا لم يكن المتغير موجودًا
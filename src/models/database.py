@@ -1,5 +1,10 @@
 from src.extensions import db
 from datetime import datetime, date, time
+from sqlalchemy import DDL, and_, case, event, func, insert, inspect, select, tuple_, update
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session
+
+ACCOMMODATION_TYPES = ["Hotel", "Cabin"]
 
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,7 +15,7 @@ class Client(db.Model):
     passportNumber = db.Column(db.String(50), nullable=True)  # New field
     licenseNumber = db.Column(db.String(50), nullable=True)  # New field
     address = db.Column(db.Text)
-    company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     paidAmount = db.Column(db.Float, nullable=True, default=0.0)
     paymentStatus = db.Column(db.String(20), default="pending")  # pending, paid, overdue
@@ -49,7 +54,7 @@ class Vehicle(db.Model):
     plateNumber = db.Column(db.String(20), unique=True, nullable=False)
     type = db.Column(db.String(50), nullable=False)  # Sedan, SUV, Van, Bus, etc.
     capacity = db.Column(db.Integer, nullable=False)
-    assigned_driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=True)
+    assigned_driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship
@@ -57,14 +62,19 @@ class Vehicle(db.Model):
 
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    client_id = db.Column(db.Integer, db.ForeignKey("client.id"), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey("client.id"), nullable=False, index=True)
     
     # Overall booking details
-    overall_startDate = db.Column(db.Date, nullable=False)
+    overall_startDate = db.Column(db.Date, nullable=False, index=True)
     overall_endDate = db.Column(db.Date, nullable=False)
     notes = db.Column(db.Text)
-    status = db.Column(db.String(20), default="pending")  # pending, confirmed, completed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default="pending", index=True)  # pending, confirmed, completed, cancelled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # Stored rollups of the services' line totals, maintained on flush (see sync_money_columns)
+    rollupCost = db.Column(db.Float, nullable=True, default=0.0)
+    rollupSellingPrice = db.Column(db.Float, nullable=True, default=0.0)
+    rollupProfit = db.Column(db.Float, nullable=True, default=0.0)
     
     # Relationships
     services = db.relationship("Service", backref="booking_ref", lazy=True, cascade="all, delete-orphan")
@@ -77,31 +87,54 @@ class Booking(db.Model):
             return f"{self.client_ref.firstName} {self.client_ref.lastName}"
         return "Unknown Client"
     
-    @property
+    @hybrid_property
     def totalCost(self):
         """Calculate total cost of all services in the booking"""
         return sum(service.totalCost for service in self.services)
+
+    @totalCost.expression
+    def totalCost(cls):
+        return select(func.coalesce(func.sum(Service.totalCost), 0.0)).where(
+            Service.booking_id == cls.id
+        ).correlate_except(Service).scalar_subquery()
     
-    @property
+    @hybrid_property
     def totalSellingPrice(self):
         """Calculate total selling price of all services in the booking"""
         return sum(service.totalSellingPrice for service in self.services)
+
+    @totalSellingPrice.expression
+    def totalSellingPrice(cls):
+        return select(func.coalesce(func.sum(Service.totalSellingPrice), 0.0)).where(
+            Service.booking_id == cls.id
+        ).correlate_except(Service).scalar_subquery()
     
-    @property
+    @hybrid_property
     def profit(self):
         """Calculate total profit of all services in the booking"""
         return self.totalSellingPrice - self.totalCost
 
+    @profit.expression
+    def profit(cls):
+        return select(func.coalesce(func.sum(Service.profit), 0.0)).where(
+            Service.booking_id == cls.id
+        ).correlate_except(Service).scalar_subquery()
+
 class Service(db.Model):
+    __table_args__ = (
+        # Vehicle availability and schedule lookups
+        db.Index("ix_service_vehicle_schedule", "vehicle_id", "startDate", "endDate"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey("booking.id"), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey("booking.id"), nullable=False, index=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=True, index=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=True)
     
     serviceType = db.Column(db.String(50), nullable=False)  # Tour, Vehicle, Hotel
     serviceName = db.Column(db.String(200), nullable=False)
     
-    startDate = db.Column(db.Date, nullable=False)
+    startDate = db.Column(db.Date, nullable=False, index=True)
     endDate = db.Column(db.Date, nullable=False)
     
     # New fields for tour timing (for notifications)
@@ -126,35 +159,65 @@ class Service(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    @property
+    # Stored copies of totalCost/totalSellingPrice/profit, maintained on flush (see sync_money_columns)
+    lineCost = db.Column(db.Float, nullable=True, default=0.0)
+    lineSellingPrice = db.Column(db.Float, nullable=True, default=0.0)
+    lineProfit = db.Column(db.Float, nullable=True, default=0.0)
+
+    @hybrid_property
     def isAccommodation(self):
-        return self.serviceType in ["Hotel", "Cabin"]
+        return self.serviceType in ACCOMMODATION_TYPES
+
+    @isAccommodation.expression
+    def isAccommodation(cls):
+        return cls.serviceType.in_(ACCOMMODATION_TYPES)
     
-    @property
+    @hybrid_property
     def isTour(self):
         return self.serviceType == "Tour"
     
-    @property
+    @hybrid_property
     def isVehicleRental(self):
         return self.serviceType == "Vehicle"
 
-    @property
+    @hybrid_property
     def totalCost(self):
         if self.isAccommodation and self.numNights and self.costPerNight:
             return self.numNights * self.costPerNight
         if self.isVehicleRental and self.is_hourly and self.hours and self.costToCompany:
             return self.hours * self.costToCompany
         return self.costToCompany if self.costToCompany is not None else 0.0
-    
-    @property
+
+    @totalCost.expression
+    def totalCost(cls):
+        # Must stay in step with the Python branch above: zero/NULL factors fall through
+        return case(
+            (and_(cls.isAccommodation, cls.numNights != 0, cls.costPerNight != 0),
+             cls.numNights * cls.costPerNight),
+            (and_(cls.isVehicleRental, cls.is_hourly.is_(True), cls.hours != 0, cls.costToCompany != 0),
+             cls.hours * cls.costToCompany),
+            else_=func.coalesce(cls.costToCompany, 0.0)
+        )
+    
+    @hybrid_property
     def totalSellingPrice(self):
         if self.isAccommodation and self.numNights and self.sellingPricePerNight:
             return self.numNights * self.sellingPricePerNight
         if self.isVehicleRental and self.is_hourly and self.hours and self.sellingPrice:
             return self.hours * self.sellingPrice
         return self.sellingPrice if self.sellingPrice is not None else 0.0
-    
-    @property
+
+    @totalSellingPrice.expression
+    def totalSellingPrice(cls):
+        return case(
+            (and_(cls.isAccommodation, cls.numNights != 0, cls.sellingPricePerNight != 0),
+             cls.numNights * cls.sellingPricePerNight),
+            (and_(cls.isVehicleRental, cls.is_hourly.is_(True), cls.hours != 0, cls.sellingPrice != 0),
+             cls.hours * cls.sellingPrice),
+            else_=func.coalesce(cls.sellingPrice, 0.0)
+        )
+    
+    @hybrid_property
     def profit(self):
         return self.totalSellingPrice - self.totalCost
     
@@ -174,7 +237,7 @@ class Service(db.Model):
 
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    booking_id = db.Column(db.Integer, db.ForeignKey("booking.id"), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey("booking.id"), nullable=False, index=True)
     invoiceType = db.Column(db.String(20), nullable=False) # client, company, monthly_company, my_company
     totalAmount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default="pending")  # pending, paid, overdue
@@ -185,8 +248,25 @@ class Invoice(db.Model):
     # Relationship
     # booking = db.relationship("Booking", backref="invoices", lazy=True) # This line is removed as the relationship is defined in Booking model
 
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+
+def format_invoice_period(month, year):
+    return f"{MONTH_NAMES[month - 1]} {year}"
+
 # New model for monthly company invoices
 class MonthlyCompanyInvoice(db.Model):
+    __table_args__ = (
+        db.Index("ix_monthly_company_invoice_period", "company_id", "invoice_year", "invoice_month"),
+        # One invoice per company, period and type, however many requests generate it at once
+        db.Index(
+            "uq_monthly_company_invoice_period_type", "company_id", "invoice_month", "invoice_year", "invoiceType",
+            unique=True
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=False)
     invoice_month = db.Column(db.Integer, nullable=False)  # 1-12
@@ -204,26 +284,25 @@ class MonthlyCompanyInvoice(db.Model):
     invoiceDate = db.Column(db.Date, nullable=False)
     pdfPath = db.Column(db.String(255), nullable=True)
     notes = db.Column(db.Text)
+    # Set when services behind the invoice changed after it was generated; cleared by a refresh
+    stale = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     company = db.relationship("Company", backref="monthly_invoices", lazy=True)
     invoice_items = db.relationship("MonthlyInvoiceItem", backref="monthly_invoice", lazy=True, cascade="all, delete-orphan")
+    changes = db.relationship("MonthlyInvoiceChange", lazy=True, cascade="all, delete-orphan")
     
     @property
     def invoice_period(self):
         """Get formatted invoice period"""
-        months = [
-             "January", "February", "March", "April", "May", "June",
-    "July", "August", "September", "October", "November", "December"
-        ]
-        return f"{months[self.invoice_month - 1]} {self.invoice_year}"
+        return format_invoice_period(self.invoice_month, self.invoice_year)
 
 # New model for monthly invoice items (services breakdown)
 class MonthlyInvoiceItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    monthly_invoice_id = db.Column(db.Integer, db.ForeignKey("monthly_company_invoice.id"), nullable=False)
-    service_id = db.Column(db.Integer, db.ForeignKey("service.id"), nullable=True)  # Reference to original service
+    monthly_invoice_id = db.Column(db.Integer, db.ForeignKey("monthly_company_invoice.id"), nullable=False, index=True)
+    service_id = db.Column(db.Integer, db.ForeignKey("service.id"), nullable=True, index=True)  # Reference to original service
     
     # Client information
     client_name = db.Column(db.String(200), nullable=False)
@@ -249,10 +328,89 @@ class MonthlyInvoiceItem(db.Model):
     # Relationships
     service = db.relationship("Service", backref="monthly_invoice_items", lazy=True)
 
+# A line of a monthly invoice that may be out of date, recorded with the stale
+# flag and removed by the refresh that recomputes it
+class MonthlyInvoiceChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    monthly_invoice_id = db.Column(db.Integer, db.ForeignKey("monthly_company_invoice.id"), nullable=False, index=True)
+    # The changed service, or the item whose service was deleted; no foreign
+    # keys, the service may be gone by the time the invoice is refreshed
+    service_id = db.Column(db.Integer, nullable=True)
+    item_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Queued invoice PDF generation (see src/invoice_jobs.py)
+class InvoiceJob(db.Model):
+    __table_args__ = (
+        # Workers poll for the oldest queued job
+        db.Index("ix_invoice_job_status", "status", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    jobType = db.Column(db.String(50), nullable=False)  # monthly_company, client, monthly_excel, my_company_detailed
+    params = db.Column(db.Text, nullable=False)  # JSON request body
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    message = db.Column(db.String(255), nullable=True)
+    pdfPath = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON response of the generator
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # Last sign of life of a running job (progress or its worker); stale jobs are requeued by it
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+# Claims of the single-flight layer (see src/single_flight.py)
+class RequestClaim(db.Model):
+    __table_args__ = (
+        # Expired claims are purged on every new claim
+        db.Index("ix_request_claim_expires", "expiresAt"),
+    )
+
+    requestKey = db.Column(db.String(64), primary_key=True)  # SHA-256 of the endpoint and its parameters
+    endpoint = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="running")  # running, done
+    statusCode = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON response body
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expiresAt = db.Column(db.DateTime, nullable=False)
+
+# Display rows of GET /invoices, one per Invoice and MonthlyCompanyInvoice (see sync_invoice_ledger)
+class InvoiceLedger(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("source", "invoice_id", name="uq_invoice_ledger_source"),
+        # The invoice screen pages by (invoice date, source, invoice id), optionally filtered
+        db.Index("ix_invoice_ledger_date", "invoiceDate", "source", "invoice_id"),
+        db.Index("ix_invoice_ledger_status_date", "status", "invoiceDate", "source", "invoice_id"),
+        db.Index("ix_invoice_ledger_type_date", "invoiceType", "invoiceDate", "source", "invoice_id"),
+        db.Index("ix_invoice_ledger_company_date", "company_id", "invoiceDate", "source", "invoice_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.Integer, nullable=False)  # LEDGER_INVOICE or LEDGER_MONTHLY_INVOICE
+    invoice_id = db.Column(db.Integer, nullable=False)
+    company_id = db.Column(db.Integer, nullable=True)  # The client's company, or the invoiced company
+    party = db.Column(db.String(255), nullable=True)  # Client name, or company name of a monthly invoice
+    serviceSummary = db.Column(db.String(500), nullable=True)
+    invoiceType = db.Column(db.String(20), nullable=True)  # Invoice.invoiceType; "company" for monthly invoices
+    status = db.Column(db.String(20), nullable=True)
+    invoiceDate = db.Column(db.Date, nullable=False)
+    totalAmount = db.Column(db.Float, nullable=True)
+    pdfPath = db.Column(db.String(255), nullable=True)
+
 class Notification(db.Model):
+    __table_args__ = (
+        # Driver notification history, newest first
+        db.Index("ix_notification_driver_sent", "driver_id", "sent_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False)
-    booking_id = db.Column(db.Integer, db.ForeignKey("booking.id"), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey("booking.id"), nullable=False, index=True)
     message = db.Column(db.Text, nullable=False)
     notification_type = db.Column(db.String(50), nullable=False)  # email, whatsapp, sms
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -269,5 +427,342 @@ class Settings(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class SettingsVersion(db.Model):
+    """Single-row counter bumped whenever a Settings row changes (see src/models/settings_cache.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+event.listen(
+    SettingsVersion.__table__, "after_create",
+    DDL("INSERT INTO settings_version (id, version) VALUES (1, 0)")
+)
+
+def bump_settings_version(connection):
+    """Increment the settings version in the current transaction"""
+    table = SettingsVersion.__table__
+    result = connection.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=1, version=1))
+
+@event.listens_for(Session, "before_flush")
+def track_settings_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Settings) and (obj not in session.dirty or session.is_modified(obj)):
+            session.info["settings_changed"] = True
+            return
+
+@event.listens_for(Session, "after_flush_postexec")
+def publish_settings_version(session, flush_context):
+    # Commits with settings changes carry the new version, so every worker
+    # notices it on its next check and reloads its cached settings
+    if session.info.pop("settings_changed", False):
+        bump_settings_version(session.connection())
+        session.info["settings_version_bumped"] = True
+
+
+# Stored money columns
+# --------------------
+# Service.line* and Booking.rollup* are written on every flush so that list
+# endpoints and reports can read them instead of recomputing pricing per row.
+
+def booking_rollup_statement(booking_ids=None):
+    """UPDATE recomputing Booking.rollup* from the stored service lines"""
+    def services_sum(column):
+        return select(func.coalesce(func.sum(column), 0.0)).where(
+            Service.booking_id == Booking.id
+        ).scalar_subquery()
+
+    statement = update(Booking.__table__).values(
+        rollupCost=services_sum(Service.lineCost),
+        rollupSellingPrice=services_sum(Service.lineSellingPrice),
+        rollupProfit=services_sum(Service.lineProfit)
+    )
+    if booking_ids is not None:
+        statement = statement.where(Booking.id.in_(booking_ids))
+    return statement
+
+@event.listens_for(Session, "before_flush")
+def sync_money_columns(session, flush_context, instances):
+    """Refresh service line totals and remember which bookings need new rollups"""
+    booking_ids = session.info.setdefault("money_booking_ids", set())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Service) and (obj in session.new or session.is_modified(obj)):
+            obj.lineCost = obj.totalCost
+            obj.lineSellingPrice = obj.totalSellingPrice
+            obj.lineProfit = obj.profit
+            booking_ids.add(obj.booking_id if obj.booking_id is not None else obj.booking_ref)
+    for obj in session.deleted:
+        if isinstance(obj, Service):
+            booking_ids.add(obj.booking_id)
+
+@event.listens_for(Session, "after_flush_postexec")
+def sync_booking_rollups(session, flush_context):
+    pending = session.info.pop("money_booking_ids", None)
+    if not pending:
+        return
+    # Services attached through the relationship only get their booking_id during the flush
+    booking_ids = {item.id if isinstance(item, Booking) else item for item in pending}
+    booking_ids.discard(None)
+    if not booking_ids:
+        return
+    session.connection().execute(booking_rollup_statement(booking_ids))
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Booking) and obj.id in booking_ids:
+            session.expire(obj, ["rollupCost", "rollupSellingPrice", "rollupProfit"])
+
+
+# Invoice ledger
+# --------------
+# InvoiceLedger holds the display columns of both invoice tables (party
+# name, service summary, type, status, date, amount, pdfPath), so the
+# invoice screen is one indexed query whatever the history size. Rows are
+# rewritten after every flush that touches an invoice or what its row shows:
+# the booking's services, the client's name or company, the company's name.
+# Bulk INSERT/UPDATE statements bypass the flush and call
+# refresh_invoice_ledger themselves.
+
+LEDGER_INVOICE = 0
+LEDGER_MONTHLY_INVOICE = 1
+# Ids per IN (...) list
+LEDGER_BATCH = 500
+
+def service_summary(names):
+    """Services of an invoice's booking as the invoice screen shows them: the first two names and how many more"""
+    if not names:
+        return "No services"
+    summary = ", ".join(names[:2])
+    if len(names) > 2:
+        summary += f" (+{len(names) - 2} more)"
+    return summary
+
+def _batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), LEDGER_BATCH):
+        yield ids[start:start + LEDGER_BATCH]
+
+def _invoice_ledger_rows(connection, invoice_ids):
+    statement = select(
+        Invoice.id, Invoice.booking_id, Invoice.invoiceType, Invoice.status, Invoice.invoiceDate,
+        Invoice.totalAmount, Invoice.pdfPath, Client.company_id, Client.firstName, Client.lastName
+    ).select_from(Invoice).outerjoin(Booking, Invoice.booking_id == Booking.id).outerjoin(
+        Client, Booking.client_id == Client.id
+    ).where(Invoice.id.in_(invoice_ids))
+    invoices = connection.execute(statement).all()
+    names = {}
+    booking_ids = {invoice.booking_id for invoice in invoices}
+    for booking_id, service_name in connection.execute(
+        select(Service.booking_id, Service.serviceName).where(Service.booking_id.in_(booking_ids)).order_by(Service.id)
+    ):
+        names.setdefault(booking_id, []).append(service_name or "Unknown Service")
+    for invoice in invoices:
+        yield {
+            "source": LEDGER_INVOICE,
+            "invoice_id": invoice.id,
+            "company_id": invoice.company_id,
+            "party": f"{invoice.firstName or ''} {invoice.lastName or ''}".strip() or None,
+            "serviceSummary": service_summary(names.get(invoice.booking_id)),
+            "invoiceType": invoice.invoiceType,
+            "status": invoice.status,
+            "invoiceDate": invoice.invoiceDate,
+            "totalAmount": invoice.totalAmount,
+            "pdfPath": invoice.pdfPath
+        }
+
+def _monthly_invoice_ledger_rows(connection, monthly_invoice_ids):
+    statement = select(
+        MonthlyCompanyInvoice.id, MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.invoice_month,
+        MonthlyCompanyInvoice.invoice_year, MonthlyCompanyInvoice.status, MonthlyCompanyInvoice.invoiceDate,
+        MonthlyCompanyInvoice.totalAmount, MonthlyCompanyInvoice.pdfPath, Company.name
+    ).select_from(MonthlyCompanyInvoice).outerjoin(Company, MonthlyCompanyInvoice.company_id == Company.id).where(
+        MonthlyCompanyInvoice.id.in_(monthly_invoice_ids)
+    )
+    for invoice in connection.execute(statement):
+        yield {
+            "source": LEDGER_MONTHLY_INVOICE,
+            "invoice_id": invoice.id,
+            "company_id": invoice.company_id,
+            "party": invoice.name,
+            "serviceSummary": f"Monthly Invoice - {format_invoice_period(invoice.invoice_month, invoice.invoice_year)}",
+            "invoiceType": "company",
+            "status": invoice.status,
+            "invoiceDate": invoice.invoiceDate,
+            "totalAmount": invoice.totalAmount,
+            "pdfPath": invoice.pdfPath
+        }
+
+def refresh_invoice_ledger(connection, invoice_ids=(), monthly_invoice_ids=()):
+    """Rewrite the ledger rows of the given invoices and monthly invoices; rows of deleted ones are dropped"""
+    table = InvoiceLedger.__table__
+    written = 0
+    for source, ids, build in (
+        (LEDGER_INVOICE, invoice_ids, _invoice_ledger_rows),
+        (LEDGER_MONTHLY_INVOICE, monthly_invoice_ids, _monthly_invoice_ledger_rows),
+    ):
+        for batch in _batches(ids):
+            connection.execute(table.delete().where(table.c.source == source, table.c.invoice_id.in_(batch)))
+            rows = list(build(connection, batch))
+            if rows:
+                connection.execute(table.insert(), rows)
+            written += len(rows)
+    return written
+
+def _changed(session, obj, *attributes):
+    if obj in session.new or obj in session.deleted:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+@event.listens_for(Session, "before_flush")
+def track_invoice_ledger_changes(session, flush_context, instances):
+    """Remember the invoices whose ledger rows this flush changes"""
+    pending = session.info.setdefault("ledger_pending", {
+        "invoices": set(), "monthly_invoices": set(), "bookings": set(), "clients": set(), "companies": set()
+    })
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Invoice) and (obj not in session.dirty or session.is_modified(obj)):
+            pending["invoices"].add(obj)
+        elif isinstance(obj, MonthlyCompanyInvoice) and (obj not in session.dirty or session.is_modified(obj)):
+            pending["monthly_invoices"].add(obj)
+        elif isinstance(obj, Service) and _changed(session, obj, "serviceName", "booking_id"):
+            pending["bookings"].add(obj.booking_id if obj.booking_id is not None else obj.booking_ref)
+        elif isinstance(obj, Booking) and obj in session.dirty and _changed(session, obj, "client_id", "client_ref"):
+            pending["bookings"].add(obj.id)
+        elif isinstance(obj, Client) and obj in session.dirty and _changed(session, obj, "firstName", "lastName", "company_id", "company"):
+            pending["clients"].add(obj.id)
+        elif isinstance(obj, Company) and obj in session.dirty and _changed(session, obj, "name"):
+            pending["companies"].add(obj.id)
+
+@event.listens_for(Session, "after_flush_postexec")
+def sync_invoice_ledger(session, flush_context):
+    pending = session.info.pop("ledger_pending", None)
+    if not pending or not any(pending.values()):
+        return
+    connection = session.connection()
+    # New rows and services attached through relationships only get their ids during the flush
+    invoice_ids = {obj.id for obj in pending["invoices"]}
+    monthly_invoice_ids = {obj.id for obj in pending["monthly_invoices"]}
+    booking_ids = {item.id if isinstance(item, Booking) else item for item in pending["bookings"]}
+    booking_ids.discard(None)
+    if booking_ids:
+        invoice_ids.update(connection.execute(select(Invoice.id).where(Invoice.booking_id.in_(booking_ids))).scalars())
+    if pending["clients"]:
+        invoice_ids.update(connection.execute(select(Invoice.id).join(Booking, Invoice.booking_id == Booking.id).where(
+            Booking.client_id.in_(pending["clients"])
+        )).scalars())
+    if pending["companies"]:
+        monthly_invoice_ids.update(connection.execute(select(MonthlyCompanyInvoice.id).where(
+            MonthlyCompanyInvoice.company_id.in_(pending["companies"])
+        )).scalars())
+    invoice_ids.discard(None)
+    monthly_invoice_ids.discard(None)
+    refresh_invoice_ledger(connection, invoice_ids, monthly_invoice_ids)
+
+
+# Stale monthly invoices
+# ----------------------
+# A monthly company invoice lists the services of a period as they were when
+# it was generated. Flushes that change what its items show (a service's
+# type, name, dates, prices or booking, a booking's client, a client's name or
+# company) set MonthlyCompanyInvoice.stale on the invoices listing those
+# services and on those of the period the services now fall in, and record
+# each (invoice, service) pair as a MonthlyInvoiceChange, so
+# POST /invoices/monthly/<id>/refresh recomputes just those lines.
+
+STALE_SERVICE_ATTRIBUTES = (
+    "booking_id", "booking_ref", "serviceType", "serviceName", "startDate", "endDate", "numNights", "hotelName",
+    "is_hourly", "hours", "lineCost", "lineSellingPrice", "lineProfit"
+)
+
+def mark_monthly_invoices_stale(connection, service_ids=(), booking_ids=(), item_ids=()):
+    """Flag the monthly invoices listing the given services or items, or covering the period and
+    company of the services of the given bookings, and record the changed lines; returns the ids flagged"""
+    booking_ids = set(booking_ids)
+    service_ids = set(service_ids)
+    periods = {}  # (company, month, year): services now in that period
+    for batch in _batches(booking_ids):
+        for service_id, company_id, start_date in connection.execute(
+            select(Service.id, Client.company_id, Service.startDate).join(Booking, Service.booking_id == Booking.id).join(
+                Client, Booking.client_id == Client.id
+            ).where(Service.booking_id.in_(batch))
+        ):
+            service_ids.add(service_id)
+            if company_id is not None and start_date is not None:
+                periods.setdefault((company_id, start_date.month, start_date.year), set()).add(service_id)
+
+    changes = set()  # (monthly invoice, service, item)
+    for batch in _batches(service_ids):
+        changes.update((invoice_id, service_id, None) for invoice_id, service_id in connection.execute(
+            select(MonthlyInvoiceItem.monthly_invoice_id, MonthlyInvoiceItem.service_id).where(
+                MonthlyInvoiceItem.service_id.in_(batch)
+            ).distinct()
+        ))
+    for batch in _batches(item_ids):
+        changes.update((invoice_id, None, item_id) for invoice_id, item_id in connection.execute(
+            select(MonthlyInvoiceItem.monthly_invoice_id, MonthlyInvoiceItem.id).where(MonthlyInvoiceItem.id.in_(batch))
+        ))
+    keys = sorted(periods)
+    for start in range(0, len(keys), LEDGER_BATCH):
+        for invoice_id, company_id, month, year in connection.execute(select(
+            MonthlyCompanyInvoice.id, MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.invoice_month,
+            MonthlyCompanyInvoice.invoice_year
+        ).where(tuple_(
+            MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.invoice_month, MonthlyCompanyInvoice.invoice_year
+        ).in_(keys[start:start + LEDGER_BATCH]))):
+            changes.update((invoice_id, service_id, None) for service_id in periods[(company_id, month, year)])
+
+    if changes:
+        connection.execute(insert(MonthlyInvoiceChange.__table__), [
+            {"monthly_invoice_id": invoice_id, "service_id": service_id, "item_id": item_id, "created_at": datetime.utcnow()}
+            for invoice_id, service_id, item_id in sorted(changes, key=lambda change: (change[0], change[1] or 0, change[2] or 0))
+        ])
+    invoice_ids = {change[0] for change in changes}
+    table = MonthlyCompanyInvoice.__table__
+    for batch in _batches(invoice_ids):
+        connection.execute(update(table).where(table.c.id.in_(batch)).values(stale=True))
+    return invoice_ids
+
+def detach_monthly_invoice_items(connection, service_ids):
+    """Unlink monthly invoice items from services about to be deleted, flagging their invoices
+
+    The items stay on the invoice until it is refreshed, which removes them
+    and takes their amounts off the totals.
+    """
+    table = MonthlyInvoiceItem.__table__
+    item_ids = set()
+    for batch in _batches(service_ids):
+        item_ids.update(connection.execute(select(table.c.id).where(table.c.service_id.in_(batch))).scalars())
+    stale_ids = mark_monthly_invoices_stale(connection, item_ids=item_ids)
+    for batch in _batches(item_ids):
+        connection.execute(update(table).where(table.c.id.in_(batch)).values(service_id=None))
+    return stale_ids
 
+@event.listens_for(Session, "before_flush")
+def track_monthly_invoice_changes(session, flush_context, instances):
+    """Remember the services and bookings whose monthly invoice items this flush changes"""
+    pending = session.info.setdefault("stale_pending", {"services": set(), "bookings": set(), "clients": set()})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Service) and _changed(session, obj, *STALE_SERVICE_ATTRIBUTES):
+            if obj not in session.new:
+                pending["services"].add(obj.id)
+            if obj not in session.deleted:
+                pending["bookings"].add(obj.booking_id if obj.booking_id is not None else obj.booking_ref)
+        elif isinstance(obj, Booking) and obj in session.dirty and _changed(session, obj, "client_id", "client_ref"):
+            pending["bookings"].add(obj.id)
+        elif isinstance(obj, Client) and obj in session.dirty and _changed(session, obj, "firstName", "lastName", "company_id", "company"):
+            pending["clients"].add(obj.id)
 
+@event.listens_for(Session, "after_flush_postexec")
+def flag_stale_monthly_invoices(session, flush_context):
+    pending = session.info.pop("stale_pending", None)
+    if not pending or not any(pending.values()):
+        return
+    connection = session.connection()
+    booking_ids = {item.id if isinstance(item, Booking) else item for item in pending["bookings"]}
+    if pending["clients"]:
+        booking_ids.update(connection.execute(select(Booking.id).where(Booking.client_id.in_(pending["clients"]))).scalars())
+    booking_ids.discard(None)
+    pending["services"].discard(None)
+    stale_ids = mark_monthly_invoices_stale(connection, pending["services"], booking_ids)
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, MonthlyCompanyInvoice) and obj.id in stale_ids:
+            session.expire(obj, ["stale"])
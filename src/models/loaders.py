@@ -0,0 +1,38 @@
+from sqlalchemy.orm import joinedload, selectinload
+from src.models.database import Booking, Client, Service
+
+# Loader profiles for the list endpoints. Every relationship is lazy=True, so a
+# route that walks booking.services / booking.client_ref row by row issues one
+# query per row; these options load the whole graph in a fixed number of
+# queries instead. Many-to-one links are joined into the parent query,
+# collections are fetched with one extra SELECT ... WHERE id IN (...).
+#
+# They are functions rather than constants because the backref attributes
+# (client_ref, booking_ref, driver_ref, ...) only exist once the mappers have
+# been configured.
+
+def booking_list():
+    """GET /bookings: bookings with their client name and services"""
+    return (
+        joinedload(Booking.client_ref),
+        selectinload(Booking.services),
+    )
+
+def client_bookings():
+    """GET /clients/<id>/bookings: services with their driver and vehicle"""
+    return (
+        selectinload(Booking.services).options(
+            joinedload(Service.driver_ref),
+            joinedload(Service.vehicle_ref),
+        ),
+    )
+
+def client_with_company():
+    return (joinedload(Client.company),)
+
+def service_notifications():
+    """Notification scheduling: services with their booking, client and driver"""
+    return (
+        joinedload(Service.booking_ref).joinedload(Booking.client_ref),
+        joinedload(Service.driver_ref),
+    )
@@ -0,0 +1,223 @@
+import re
+from contextlib import contextmanager
+from datetime import date, datetime
+from sqlalchemy import delete, event, func, inspect, or_, select, text, update
+from sqlalchemy.schema import CreateIndex
+from src.extensions import db
+from src.models.database import (
+    Booking, Invoice, InvoiceJob, InvoiceLedger, MonthlyCompanyInvoice, MonthlyInvoiceChange, MonthlyInvoiceItem, Service,
+    RequestClaim, booking_rollup_statement, refresh_invoice_ledger
+)
+
+# Money values are floats; anything closer than this is treated as equal
+MONEY_TOLERANCE = 0.005
+
+def add_missing_columns(model):
+    """Add columns declared on the model but missing from the live table (ALTER TABLE ... ADD COLUMN)"""
+    table = model.__table__
+    existing = {column["name"] for column in inspect(db.engine).get_columns(table.name)}
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        db.session.execute(text(
+            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+        ))
+        added.append(column.name)
+    db.session.commit()
+    return added
+
+def backfill_money_columns():
+    """Recompute Service.line* and Booking.rollup* for every row (the columns come from create-tables)"""
+    services = db.session.execute(
+        update(Service).values(
+            lineCost=Service.totalCost,
+            lineSellingPrice=Service.totalSellingPrice,
+            lineProfit=Service.profit
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    bookings = db.session.execute(booking_rollup_statement()).rowcount
+    db.session.commit()
+    return {"services": services, "bookings": bookings}
+
+def rebuild_invoice_ledger():
+    """Create the invoice ledger table if it is missing and rewrite every row from the invoice tables"""
+    InvoiceLedger.__table__.create(bind=db.engine, checkfirst=True)
+    connection = db.session.connection()
+    connection.execute(delete(InvoiceLedger.__table__))
+    invoices = refresh_invoice_ledger(connection, invoice_ids=connection.execute(select(Invoice.id)).scalars().all())
+    monthly_invoices = refresh_invoice_ledger(
+        connection, monthly_invoice_ids=connection.execute(select(MonthlyCompanyInvoice.id)).scalars().all()
+    )
+    db.session.commit()
+    return {"invoices": invoices, "monthlyInvoices": monthly_invoices}
+
+def find_money_drift(tolerance=MONEY_TOLERANCE):
+    """Return the services and bookings whose stored money columns disagree with the pricing rules"""
+    def drifted(stored, expected):
+        return or_(stored.is_(None), func.abs(stored - expected) > tolerance)
+
+    services = db.session.query(
+        Service.id, Service.lineCost, Service.totalCost,
+        Service.lineSellingPrice, Service.totalSellingPrice
+    ).filter(or_(
+        drifted(Service.lineCost, Service.totalCost),
+        drifted(Service.lineSellingPrice, Service.totalSellingPrice),
+        drifted(Service.lineProfit, Service.profit)
+    )).order_by(Service.id).all()
+
+    bookings = db.session.query(
+        Booking.id, Booking.rollupCost, Booking.totalCost,
+        Booking.rollupSellingPrice, Booking.totalSellingPrice
+    ).filter(or_(
+        drifted(Booking.rollupCost, Booking.totalCost),
+        drifted(Booking.rollupSellingPrice, Booking.totalSellingPrice),
+        drifted(Booking.rollupProfit, Booking.profit)
+    )).order_by(Booking.id).all()
+
+    return {
+        "services": [
+            {"id": row[0], "lineCost": row[1], "totalCost": row[2], "lineSellingPrice": row[3], "totalSellingPrice": row[4]}
+            for row in services
+        ],
+        "bookings": [
+            {"id": row[0], "rollupCost": row[1], "totalCost": row[2], "rollupSellingPrice": row[3], "totalSellingPrice": row[4]}
+            for row in bookings
+        ]
+    }
+
+def create_missing_indexes():
+    """Create the indexes declared on the models that the live database does not have yet"""
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            _create_index(index)
+            created.append(index.name)
+    return created
+
+def _concurrently(sql):
+    """CREATE [UNIQUE] INDEX statement rewritten to build the index without locking writes"""
+    return re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX CONCURRENTLY ", sql, count=1)
+
+def _create_index(index):
+    if db.engine.dialect.name != "postgresql":
+        index.create(bind=db.engine)
+        return
+    # CONCURRENTLY keeps the table writable while the index builds on a live
+    # database; it cannot run inside a transaction block
+    sql = _concurrently(str(CreateIndex(index).compile(dialect=db.engine.dialect)))
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql(sql)
+
+# What a read-only check may send to the database; anything else is refused
+READ_ONLY_STATEMENTS = ("SELECT", "PRAGMA", "EXPLAIN", "SET LOCAL", "SHOW")
+
+@contextmanager
+def read_only(writable=()):
+    """Refuse every statement that could write to the database inside the block,
+    except writes to the tables in writable"""
+    def refuse_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(READ_ONLY_STATEMENTS):
+            return
+        target = re.match(r'\s*(?:INSERT INTO|UPDATE|DELETE FROM)\s+"?(\w+)', statement, re.IGNORECASE)
+        if not target or target.group(1) not in writable:
+            raise RuntimeError(f"Refused to write during a read-only check: {statement.split(None, 1)[0]}")
+
+    event.listen(db.engine, "before_cursor_execute", refuse_writes)
+    try:
+        yield
+    finally:
+        event.remove(db.engine, "before_cursor_execute", refuse_writes)
+
+def explain(statement, parameters=None):
+    """Return the query plan of a SELECT as a list of text lines
+
+    statement is a SQLAlchemy select, or SQL as the driver received it (see
+    QueryCounter) with its driver parameters.
+    """
+    dialect = db.engine.dialect
+    if not isinstance(statement, str):
+        statement = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        parameters = None
+    connection = db.session.connection()
+    try:
+        if dialect.name == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            return [row[-1] for row in rows]
+        if dialect.name == "postgresql":
+            # Ask whether an index can be used at all; on small tables the planner
+            # would otherwise prefer a sequential scan regardless of indexes
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+            return [row[0] for row in rows]
+        raise ValueError(f"EXPLAIN is not supported for {dialect.name}")
+    finally:
+        db.session.rollback()
+
+def full_scans(plan):
+    """Names of the tables a query plan reads without using an index"""
+    tables = []
+    for line in plan:
+        sqlite_scan = re.match(r"\s*SCAN (?:TABLE )?(\w+)", line)
+        if sqlite_scan and "USING" not in line:
+            tables.append(sqlite_scan.group(1))
+        postgres_scan = re.search(r"Seq Scan on (\w+)", line)
+        if postgres_scan:
+            tables.append(postgres_scan.group(1))
+    return tables
+
+def plan_checks():
+    """(name, statement) pairs whose plans must not fall back to a full table scan
+
+    The hot statements that check-plans cannot reach through a read-only
+    request (see PLANNED_REQUESTS in manage_db.py): writes, the notification
+    run and the invoice worker. The ids are placeholders, only the shape of the
+    predicate matters to the planner.
+    """
+    today = date.today()
+    month, year = today.month, today.year
+    return [
+        # POST /invoices/monthly/generate
+        ("monthly invoice exists", select(MonthlyCompanyInvoice.id).where(
+            MonthlyCompanyInvoice.company_id == 1,
+            MonthlyCompanyInvoice.invoice_month == month,
+            MonthlyCompanyInvoice.invoice_year == year
+        )),
+        # POST /notifications/schedule
+        ("services of drivers tomorrow", select(Service.id).where(
+            Service.startDate == today, Service.driver_id.isnot(None)
+        )),
+        ("services of driver", select(Service.id).where(Service.driver_id == 1)),
+        # Booking edits and deletes clear the invoice lines of their services
+        ("invoice items of service", select(MonthlyInvoiceItem.id).where(MonthlyInvoiceItem.service_id == 1)),
+        ("invoice changes of monthly invoice", select(MonthlyInvoiceChange.id).where(
+            MonthlyInvoiceChange.monthly_invoice_id == 1
+        )),
+        # Invoice worker polling for the next job
+        ("queued invoice jobs", select(InvoiceJob.id).where(InvoiceJob.status == "queued").order_by(InvoiceJob.id)),
+        # Single-flight claims purged when they expire
+        ("expired request claims", select(RequestClaim.requestKey).where(RequestClaim.expiresAt < datetime(2000, 1, 1))),
+    ]
+
+def check_query_plans(captured=()):
+    """EXPLAIN the captured endpoint SQL and every plan check, and report the tables each one scans fully
+
+    captured holds (name, sql, parameters) as recorded from real requests.
+    """
+    checks = list(captured) + [(name, statement, None) for name, statement in plan_checks()]
+    results = []
+    for name, statement, parameters in checks:
+        plan = explain(statement, parameters)
+        result = {"name": name, "plan": plan, "fullScans": full_scans(plan)}
+        if isinstance(statement, str):
+            result["sql"] = statement
+        results.append(result)
+    return results
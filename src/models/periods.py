@@ -0,0 +1,48 @@
+from datetime import MAXYEAR, MINYEAR, date, datetime, time
+from sqlalchemy import DateTime, and_, true
+
+# Period filters are written as half-open ranges (start <= column < next_start)
+# so the database can use the index on the column, which it cannot do for
+# db.extract("month", column) == month.
+
+def period_error(month, year):
+    """Why month and year do not name a month month_range() can filter on, or None when they do"""
+    try:
+        month, year = int(month), int(year)
+    except (TypeError, ValueError):
+        return "Month and year must be numbers"
+    if not 1 <= month <= 12:
+        return "Month must be between 1 and 12"
+    # The range ends on the first day of the next month
+    if not MINYEAR <= year < MAXYEAR:
+        return f"Year must be between {MINYEAR} and {MAXYEAR - 1}"
+    return None
+
+def month_range(month, year):
+    """Return (first day of the month, first day of the next month)"""
+    month = int(month)
+    year = int(year)
+    start = date(year, month, 1)
+    if month == 12:
+        return start, date(year + 1, 1, 1)
+    return start, date(year, month + 1, 1)
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.combine(value, time.min)
+
+def in_range(column, start=None, end=None):
+    """Filter for start <= column < end; a missing bound is left open"""
+    if isinstance(column.type, DateTime):
+        start, end = _as_datetime(start), _as_datetime(end)
+    clauses = []
+    if start is not None:
+        clauses.append(column >= start)
+    if end is not None:
+        clauses.append(column < end)
+    return and_(*clauses) if clauses else true()
+
+def in_month(column, month, year):
+    """Filter for values of column that fall in the given month"""
+    return in_range(column, *month_range(month, year))
@@ -0,0 +1,279 @@
+import logging
+from datetime import date, datetime
+from typing import Iterator, List, NamedTuple, Optional
+from flask import g
+from sqlalchemy import case, func, select
+from src.extensions import db
+from src.models.database import Booking, Client, Company, MonthlyInvoiceItem, Service
+from src.models.periods import in_month
+
+# Report data shared by the JSON endpoints and the PDF generators.
+#
+# Reports are built from aggregated queries into immutable rows, so the PDF
+# generators call them directly instead of going through the HTTP endpoint,
+# and a report is built once per app context (request or invoice job) however
+# many documents use it.
+
+class CompanyInfo(NamedTuple):
+    id: int
+    name: str
+    email: str
+    contactPerson: str
+
+    def to_dict(self):
+        return self._asdict()
+
+class ExcelClientRow(NamedTuple):
+    clientId: int
+    clientName: str
+    email: str
+    arrivalDate: Optional[date]
+    totalAmount: float
+    paidAmount: float
+    dueAmount: float
+    paymentStatus: str
+
+    def to_dict(self):
+        row = self._asdict()
+        row["arrivalDate"] = self.arrivalDate.isoformat() if self.arrivalDate else ""
+        return row
+
+class MonthlyExcelReport(NamedTuple):
+    company: CompanyInfo
+    month: int
+    year: int
+    clients: List[ExcelClientRow]
+    totalAmount: float
+    totalPaid: float
+    totalDue: float
+
+    @property
+    def monthName(self):
+        return datetime(self.year, self.month, 1).strftime("%B")
+
+    def to_dict(self):
+        """Response body of GET /companies/<id>/monthly-invoice-excel"""
+        return {
+            "company": self.company.to_dict(),
+            "period": {
+                "month": self.month,
+                "year": self.year,
+                "monthName": self.monthName
+            },
+            "clients": [client.to_dict() for client in self.clients],
+            "summary": {
+                "totalAmount": round(self.totalAmount, 2),
+                "totalPaid": round(self.totalPaid, 2),
+                "totalDue": round(self.totalDue, 2),
+                "clientCount": len(self.clients)
+            }
+        }
+
+class DetailedServiceRow(NamedTuple):
+    clientId: int
+    clientName: str
+    arrivalDate: Optional[date]
+    serviceId: int
+    serviceName: str
+    serviceType: str
+    serviceDate: Optional[date]
+    cost: float
+    selling: float
+    profit: float
+    # Totals of all services of the client in the report
+    clientCost: float
+    clientSelling: float
+    clientProfit: float
+
+class MonthlyDetailedReport(NamedTuple):
+    company: CompanyInfo
+    month: int
+    year: int
+    services: Iterator[DetailedServiceRow]  # Streamed, ordered by client; iterate once
+
+    @property
+    def monthName(self):
+        return datetime(self.year, self.month, 1).strftime("%B")
+
+class InvoiceClientTotals(NamedTuple):
+    clientName: str
+    arrivalDate: Optional[date]
+    toursCost: float  # Tours and vehicles
+    toursSelling: float
+    hotelsCost: float
+    hotelsSelling: float
+
+def report_period(month=None, year=None):
+    """Month and year of a report, falling back to the current month for missing or out of range values"""
+    now = datetime.now()
+    month = int(month) if month else now.month
+    year = int(year) if year else now.year
+    if month < 1 or month > 12:
+        month = now.month
+    if year < 2020 or year > 2030:
+        year = now.year
+    return month, year
+
+def company_info(company):
+    return CompanyInfo(
+        id=company.id,
+        name=getattr(company, "name", "") or "Unknown Company",
+        email=getattr(company, "email", "") or "",
+        contactPerson=getattr(company, "contactPerson", "") or ""
+    )
+
+def _memoized(key, build):
+    reports = g.setdefault("reports", {})
+    if key not in reports:
+        reports[key] = build()
+    return reports[key]
+
+def monthly_excel_report(company, month, year):
+    """Clients of a company arriving in a month with their totals and payment status"""
+    return _memoized(("monthly_excel", company.id, month, year), lambda: _build_monthly_excel_report(company, month, year))
+
+def _build_monthly_excel_report(company, month, year):
+    # Only clients who have bookings with arrival dates (overall_startDate) in
+    # the month; arrival date and total are aggregated in SQL, one row per client
+    client_rows = db.session.query(
+        Client.id,
+        Client.firstName,
+        Client.lastName,
+        Client.email,
+        Client.paidAmount,
+        Client.paymentStatus,
+        func.min(Booking.overall_startDate),
+        func.coalesce(func.sum(Booking.rollupSellingPrice), 0.0)
+    ).join(Booking, Booking.client_id == Client.id).filter(
+        Client.company_id == company.id,
+        Booking.overall_startDate.isnot(None),  # Ensure arrival date exists
+        in_month(Booking.overall_startDate, month, year)
+    ).group_by(Client.id).order_by(Client.id).all()
+
+    clients = []
+    for client_id, first_name, last_name, email, paid_amount, payment_status, arrival_date, client_total in client_rows:
+        try:
+            client_total = float(client_total or 0)
+            # Skip clients with no valid bookings or zero amount
+            if client_total <= 0:
+                continue
+
+            paid_amount = float(paid_amount or 0)
+            client_name = f"{first_name or ''} {last_name or ''}".strip() or f"Client {client_id}"
+            clients.append(ExcelClientRow(
+                clientId=client_id,
+                clientName=client_name,
+                email=email or "",
+                arrivalDate=arrival_date,
+                totalAmount=client_total,
+                paidAmount=paid_amount,
+                dueAmount=max(0, client_total - paid_amount),
+                paymentStatus=payment_status or "pending"
+            ))
+        except Exception as e:
+            logging.warning(f"Error processing client {client_id}: {e}")
+            continue
+
+    return MonthlyExcelReport(
+        company=company_info(company),
+        month=month,
+        year=year,
+        clients=clients,
+        totalAmount=sum((client.totalAmount for client in clients), 0.0),
+        totalPaid=sum((client.paidAmount for client in clients), 0.0),
+        totalDue=sum((client.dueAmount for client in clients), 0.0)
+    )
+
+# Rows fetched from the database per round trip while streaming a report
+STREAM_BATCH = 1000
+
+def monthly_detailed_report(company, month, year):
+    """Cost, selling price and profit of every service of a company's clients arriving in a month
+
+    Same clients and bookings as monthly_excel_report. The service lines and
+    the per-client totals (window sums over the same rows) come from a single
+    query that is streamed while the report is iterated.
+    """
+    return MonthlyDetailedReport(
+        company=company_info(company),
+        month=month,
+        year=year,
+        services=_detailed_service_rows(company.id, month, year)
+    )
+
+def _detailed_service_rows(company_id, month, year):
+    cost = func.coalesce(Service.lineCost, 0.0)
+    selling = func.coalesce(Service.lineSellingPrice, 0.0)
+    profit = func.coalesce(Service.lineProfit, 0.0)
+    per_client = {"partition_by": Client.id}
+    statement = select(
+        Client.id,
+        Client.firstName,
+        Client.lastName,
+        func.min(Booking.overall_startDate).over(**per_client),
+        Service.id,
+        Service.serviceName,
+        Service.serviceType,
+        Service.startDate,
+        cost,
+        selling,
+        profit,
+        func.sum(cost).over(**per_client),
+        func.sum(selling).over(**per_client),
+        func.sum(profit).over(**per_client)
+    ).join(Booking, Service.booking_id == Booking.id).join(Client, Booking.client_id == Client.id).where(
+        Client.company_id == company_id,
+        Booking.overall_startDate.isnot(None),
+        in_month(Booking.overall_startDate, month, year)
+    ).order_by(Client.id, Service.startDate, Service.id).execution_options(yield_per=STREAM_BATCH)
+
+    for (client_id, first_name, last_name, arrival_date, service_id, service_name, service_type, service_date,
+         service_cost, service_selling, service_profit, client_cost, client_selling, client_profit) in db.session.execute(statement):
+        # Same clients as the Excel-like invoice, which skips zero totals
+        if client_selling <= 0:
+            continue
+        yield DetailedServiceRow(
+            clientId=client_id,
+            clientName=f"{first_name or ''} {last_name or ''}".strip() or f"Client {client_id}",
+            arrivalDate=arrival_date,
+            serviceId=service_id,
+            serviceName=service_name or "Unknown Service",
+            serviceType=service_type or "",
+            serviceDate=service_date,
+            cost=float(service_cost),
+            selling=float(service_selling),
+            profit=float(service_profit),
+            clientCost=float(client_cost),
+            clientSelling=float(client_selling),
+            clientProfit=float(client_profit)
+        )
+
+def monthly_invoice_client_totals(monthly_invoice_id):
+    """Per-client tour/vehicle and hotel totals of a stored monthly invoice, streamed in item order
+
+    One row per client name, summed in SQL, so a statement of 10,000 items
+    never loads the items themselves.
+    """
+    item = MonthlyInvoiceItem
+    tours = item.service_type.in_(["Tour", "Vehicle"])
+    hotels = item.service_type == "Hotel"
+    statement = select(
+        item.client_name,
+        func.min(item.service_date),
+        func.coalesce(func.sum(case((tours, item.cost_price), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((tours, item.selling_price), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((hotels, item.cost_price), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((hotels, item.selling_price), else_=0.0)), 0.0)
+    ).where(item.monthly_invoice_id == monthly_invoice_id).group_by(item.client_name).order_by(
+        func.min(item.id)
+    ).execution_options(yield_per=STREAM_BATCH)
+
+    for client_name, arrival_date, tours_cost, tours_selling, hotels_cost, hotels_selling in db.session.execute(statement):
+        yield InvoiceClientTotals(
+            clientName=client_name or "Unknown Client",
+            arrivalDate=arrival_date,
+            toursCost=float(tours_cost),
+            toursSelling=float(tours_selling),
+            hotelsCost=float(hotels_cost),
+            hotelsSelling=float(hotels_selling)
+        )
@@ -0,0 +1,101 @@
+import copy
+import json
+import logging
+import threading
+import time
+from flask import g, has_request_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from src.extensions import db
+from src.models.database import Settings, SettingsVersion
+
+# Process-wide cache of the Settings table.
+#
+# Every worker keeps the decoded settings together with the settings_version
+# they were loaded at. The version row is bumped in the same transaction as
+# any Settings change (see publish_settings_version in database.py), so a
+# worker only has to compare one integer to know whether its copy is stale:
+# once per request, and at most every VERSION_CHECK_INTERVAL seconds outside
+# requests (scripts, background jobs). Rendering a 40-page invoice or sending
+# 500 messages therefore reads the Settings table at most once.
+
+VERSION_CHECK_INTERVAL = 1.0
+
+class SettingsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        self._warned = False
+        self._has_version_table = None
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+    def _current_version(self):
+        # Looked up once per process on the session's own connection; a read
+        # helper must never roll back (or commit) the caller's session
+        if self._has_version_table is None:
+            self._has_version_table = inspect(db.session.connection()).has_table(SettingsVersion.__tablename__)
+        if not self._has_version_table:
+            # Databases created before settings_version existed: run manage_db.py create-tables
+            if not self._warned:
+                logging.warning("Settings version unavailable, settings are not cached: run manage_db.py create-tables")
+                self._warned = True
+            return None
+        return db.session.execute(select(SettingsVersion.version).where(SettingsVersion.id == 1)).scalar()
+
+    def _needs_check(self):
+        if has_request_context():
+            checked = g.setdefault("settings_caches_checked", set())
+            if id(self) in checked:
+                return False
+            checked.add(id(self))
+            return True
+        return time.monotonic() - self._checked_at >= VERSION_CHECK_INTERVAL
+
+    def values(self):
+        """The decoded settings (JSON values parsed, others as stored)"""
+        with self._lock:
+            if self._values is not None and not self._needs_check():
+                return self._values
+            version = self._current_version()
+            self._checked_at = time.monotonic()
+            if self._values is None or version is None or version != self._version:
+                values = {}
+                for setting in Settings.query.all():
+                    try:
+                        values[setting.key] = json.loads(setting.value)
+                    except json.JSONDecodeError:
+                        values[setting.key] = setting.value
+                self._values = values
+                self._version = version
+            return self._values
+
+cache = SettingsCache()
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _drop_local_copy(session):
+    # This worker sees its own changes right away instead of at the next check
+    if session.info.pop("settings_version_bumped", False):
+        cache.invalidate()
+
+def get_all():
+    return copy.deepcopy(cache.values())
+
+def get(key, default=None):
+    value = cache.values().get(key, default)
+    return copy.deepcopy(value)
+
+def get_dict(key):
+    """A JSON object setting, or None when missing or malformed"""
+    value = get(key)
+    return value if isinstance(value, dict) else None
+
+def get_list(key):
+    """A JSON array setting, or [] when missing or malformed"""
+    value = get(key)
+    return value if isinstance(value, list) else []
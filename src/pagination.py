@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+from flask import current_app, request
+from sqlalchemy import Date, DateTime, and_, or_
+from src.models.periods import in_range
+
+# Keyset (cursor) pagination for the list endpoints.
+#
+# A page is ordered by a whitelisted sort column plus the primary key as tie
+# breaker; next_cursor encodes the sort key of the last row, and the next page
+# continues with WHERE (sort, id) > (last sort, last id). Unlike OFFSET the cost
+# of a page does not grow with how far into the history it is.
+#
+# Response shape: {"items": [...], "next_cursor": "..." | null, "limit": n}.
+# The old bare JSON array is still returned for ?all=true, and for requests
+# without limit/cursor while LEGACY_LIST_RESPONSES is enabled (the default
+# until the frontend sends pagination parameters).
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+class PaginationError(ValueError):
+    pass
+
+def wants_full_list():
+    """True when the caller asked for the unpaginated array"""
+    value = request.args.get("all")
+    if value is not None:
+        return value.lower() in ("1", "true", "yes")
+    if "limit" in request.args or "cursor" in request.args:
+        return False
+    return current_app.config.get("LEGACY_LIST_RESPONSES", True)
+
+def page_limit():
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    if limit < 1:
+        raise PaginationError("limit must be a positive integer")
+    return min(limit, MAX_LIMIT)
+
+def list_arg(name):
+    """Comma separated values of an optional query parameter (?status=pending,confirmed)"""
+    value = request.args.get(name)
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def date_arg(name):
+    """Parse an optional YYYY-MM-DD query parameter"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise PaginationError(f"Invalid date format for {name}. Use YYYY-MM-DD")
+
+def date_range_filter(column, start_name="from", end_name="to"):
+    """Filter column on the inclusive ?from=&to= dates of the request"""
+    start, end = date_arg(start_name), date_arg(end_name)
+    return in_range(column, start, end + timedelta(days=1) if end else None)
+
+def sort_order(sorts, default):
+    """Resolve ?sort=name or ?sort=-name (descending) against the whitelisted sort columns
+
+    Returns (sort spec, [(column, descending), ...]); the key columns must end
+    in a unique, non-null column.
+    """
+    spec = request.args.get("sort", default)
+    name = spec.lstrip("-")
+    if name not in sorts:
+        raise PaginationError(f"Cannot sort by {name}. Use one of: {', '.join(sorted(sorts))}")
+    descending = spec.startswith("-")
+    return spec, [(column, descending) for column in sorts[name]]
+
+def _encode(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _decode(column, value):
+    if value is None:
+        return None
+    column_type = getattr(column, "type", None)
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column_type, Date):
+        return date.fromisoformat(value)
+    return value
+
+def encode_cursor(spec, values):
+    payload = json.dumps([spec, [_encode(value) for value in values]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token, spec, order):
+    """Return the key values stored in a cursor issued for the same sort"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_spec, values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if cursor_spec != spec or len(values) != len(order):
+        raise PaginationError("Cursor does not match the requested sort")
+    try:
+        return [_decode(column, value) for (column, descending), value in zip(order, values)]
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+def after_key(order, values):
+    """WHERE clause selecting the rows that sort after the given key values"""
+    clauses = []
+    for position, ((column, descending), value) in enumerate(zip(order, values)):
+        equal = [prior == prior_value for (prior, _), prior_value in zip(order[:position], values[:position])]
+        beyond = column < value if descending else column > value
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+def order_by(order):
+    return [column.desc() if descending else column.asc() for column, descending in order]
+
+def keyset_page(query, sorts, default_sort):
+    """Fetch one page of an entity query
+
+    sorts maps the public sort names to their key columns (mapped attributes of
+    the queried entity). Returns (rows, next_cursor).
+    """
+    spec, order = sort_order(sorts, default_sort)
+    limit = page_limit()
+    token = request.args.get("cursor")
+    if token:
+        query = query.filter(after_key(order, decode_cursor(token, spec, order)))
+    rows = query.order_by(*order_by(order)).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(spec, [getattr(rows[-1], column.key) for column, _ in order])
+
+def page_response(items, next_cursor):
+    return {"items": items, "next_cursor": next_cursor, "limit": page_limit()}
@@ -0,0 +1,71 @@
+import csv
+import io
+import os
+import time
+import zipfile
+
+# ZIP bundles of stored invoice PDFs (GET /invoices/bundle).
+#
+# The archive is written into an unseekable sink and handed out while it is
+# being built: zipfile then puts each entry's CRC and size in a data
+# descriptor after its data, so nothing has to be rewritten at the front.
+# Entries are stored, not compressed (the PDF streams are compressed
+# already), and each file is copied in CHUNK_SIZE blocks, so memory stays at
+# one block however many PDFs the bundle holds.
+
+CHUNK_SIZE = 1 << 16
+
+class _Sink(io.RawIOBase):
+    """Write-only buffer the archive is written to, emptied after every block"""
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _csv_lines(fields, rows):
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield line.getvalue().encode("utf-8")
+        line.seek(0)
+        line.truncate()
+    yield line.getvalue().encode("utf-8")
+
+def stream_zip(files, manifest=None):
+    """Bytes of a ZIP archive, yielded as it is built
+
+    files is an iterable of (name in the archive, path on disk); manifest an
+    optional (name, fields, rows) CSV written as the first entry.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        if manifest:
+            name, fields, rows = manifest
+            with archive.open(zipfile.ZipInfo(name, time.localtime()[:6]), "w") as entry:
+                for line in _csv_lines(fields, rows):
+                    entry.write(line)
+            yield sink.drain()
+
+        for name, path in files:
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(name, time.localtime(stat.st_mtime)[:6])
+            info.file_size = stat.st_size  # Only decides whether ZIP64 fields are needed
+            with open(path, "rb") as source, archive.open(info, "w") as entry:
+                for block in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    entry.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
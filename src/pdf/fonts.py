@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+from fontTools import ttLib
+
+# Fonts of the invoice PDFs.
+#
+# The unicode family is discovered once per process: Noto Sans Arabic when it
+# is installed in FONT_DIR, DejaVu Sans Condensed otherwise, and the built-in
+# Helvetica when neither is there. FONT_DIR is the INVOICE_FONT_DIR
+# environment variable, or the DejaVu fonts bundled under src/routes/fonts.
+# Each document loads the faces once with pdf.add_font() (fpdf2 subsets the
+# font tables of a document in place on output, so a parsed font cannot be
+# shared between documents); switching styles afterwards is a plain
+# set_font(). The code points the family covers are read once per process.
+
+BUNDLED_FONT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "routes", "fonts", "dejavu-fonts-ttf-2.37", "ttf"
+)
+FONT_DIR = os.environ.get("INVOICE_FONT_DIR") or BUNDLED_FONT_DIR
+FALLBACK_FAMILY = "Helvetica"
+
+# (family, regular file, bold file) in order of preference
+UNICODE_FAMILIES = [
+    ("NotoArabic", "NotoSansArabic-Regular.ttf", "NotoSansArabic-Bold.ttf"),
+    ("DejaVu", "DejaVuSansCondensed.ttf", "DejaVuSansCondensed-Bold.ttf"),
+]
+
+_lock = threading.Lock()
+_family = None
+_styles = {}
+_coverage = {}
+
+def _discover():
+    """(family, {style: path}) of the first unicode family found in FONT_DIR"""
+    for family, regular, bold in UNICODE_FAMILIES:
+        regular_path = os.path.join(FONT_DIR, regular)
+        if not os.path.exists(regular_path):
+            continue
+        bold_path = os.path.join(FONT_DIR, bold)
+        # Bold falls back to the regular face, as before
+        return family, {"": regular_path, "B": bold_path if os.path.exists(bold_path) else regular_path}
+    return FALLBACK_FAMILY, {}
+
+def font_family():
+    """Family name the invoice text is set in"""
+    global _family, _styles
+    if _family is None:
+        with _lock:
+            if _family is None:
+                try:
+                    family, _styles = _discover()
+                    _family = family
+                except Exception as e:
+                    logging.warning(f"Could not look up custom fonts. Using built-in Helvetica. Error: {e}")
+                    _family, _styles = FALLBACK_FAMILY, {}
+                logging.info(f"Invoice PDF font family: {_family}")
+    return _family
+
+def unicode_coverage():
+    """Code points every face of the unicode family can draw, or None with the built-in Helvetica"""
+    family = font_family()
+    if family == FALLBACK_FAMILY:
+        return None
+    if family not in _coverage:
+        coverage = None
+        for path in _styles.values():
+            ttfont = ttLib.TTFont(path, fontNumber=0, lazy=True)
+            codepoints = set(ttfont.getBestCmap())
+            ttfont.close()
+            coverage = codepoints if coverage is None else coverage & codepoints
+        _coverage[family] = frozenset(coverage or ())
+    return _coverage[family]
+
+def register_fonts(pdf):
+    """Make the unicode family available in pdf; returns the family name"""
+    family = font_family()
+    if family == FALLBACK_FAMILY:
+        return family
+    try:
+        for style, path in _styles.items():
+            if f"{family.lower()}{style}" not in pdf.fonts:
+                pdf.add_font(family, style, path)
+    except Exception as e:
+        logging.warning(f"Could not load custom font. Using built-in Helvetica. Error: {e}")
+        return FALLBACK_FAMILY
+    return family
+
+def use_font(pdf, style="", size=10):
+    """Switch pdf to the invoice font in the given style ("", "B", "I" or "BI")"""
+    family = getattr(pdf, "invoice_font_family", None)
+    if family is None:
+        family = pdf.invoice_font_family = register_fonts(pdf)
+    if family != FALLBACK_FAMILY:
+        # The unicode families only come in regular and bold
+        style = style.replace("I", "")
+    pdf.set_font(family, style, size)
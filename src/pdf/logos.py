@@ -0,0 +1,106 @@
+import io
+import logging
+import os
+import threading
+from PIL import Image
+from src.pdf.profiles import active_profile
+
+# Logo pipeline for the invoice headers.
+#
+# A configured logo (the company_logo setting or a Company.logoPath) is
+# located once per process, downscaled with Pillow to the size it is drawn
+# at (resolution and encoding set by the PDF profile, see profiles.py) and
+# re-encoded. draw_logo() hands those small encoded bytes to pdf.image(),
+# which keys its image cache on their digest, so the original file is
+# decoded once per process and the logo embedded once per document no
+# matter how many pages repeat the header.
+
+LOGO_WIDTH_MM = 33
+
+_ROUTES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "routes")
+
+_lock = threading.Lock()
+_resolved = {}
+_prepared = {}
+
+def _candidate_paths(logo_path):
+    return [
+        logo_path,  # As is
+        os.path.join(os.getcwd(), logo_path),  # Current working directory
+        os.path.join(_ROUTES_DIR, logo_path),  # Relative to the routes package
+        os.path.join(_ROUTES_DIR, '..', logo_path),  # Parent directory
+        os.path.join(_ROUTES_DIR, '..', '..', logo_path),  # Two levels up
+        os.path.join('/home/ubuntu', logo_path),  # Home directory
+        os.path.join('/home/ubuntu/src', logo_path),  # src directory
+        os.path.join('/home/ubuntu/uploads', logo_path),  # uploads directory
+        os.path.join('/home/ubuntu/static', logo_path),  # static directory
+        os.path.join('/home/ubuntu/upload', logo_path),  # upload directory
+        os.path.join('/home/ubuntu/src/routes/uploads', logo_path),  # routes/uploads directory
+    ]
+
+def resolve_logo_path(configured):
+    """Absolute path of a configured logo, or '' when it cannot be found
+
+    Found paths are remembered for the process while the file is there;
+    missing ones are probed again on the next call so a logo uploaded, moved
+    or deleted later is picked up.
+    """
+    if not configured:
+        return ''
+    resolved = _resolved.get(configured)
+    if resolved:
+        if os.path.exists(resolved):
+            return resolved
+        _resolved.pop(configured, None)
+        resolved = ''
+
+    logo_path = configured.lstrip('/')
+    if os.path.isabs(configured) and os.path.exists(configured):
+        resolved = configured
+    elif not os.path.isabs(logo_path):
+        resolved = next((os.path.abspath(path) for path in _candidate_paths(logo_path) if os.path.exists(path)), '')
+    if not resolved:
+        logging.warning(f"Logo file not found for {configured}")
+        return ''
+    logging.info(f"Found logo at: {resolved}")
+    _resolved[configured] = resolved
+    return resolved
+
+def _prepare(path, width_mm, profile):
+    target_width = round(width_mm / 25.4 * profile.logo_dpi)
+    with Image.open(path) as img:
+        img.load()
+        if img.width > target_width:
+            img = img.resize((target_width, max(round(img.height * target_width / img.width), 1)), Image.LANCZOS)
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        if has_alpha and profile.flatten_logo:
+            # Onto the white page, which drops the soft mask image
+            page = Image.new("RGB", img.size, (255, 255, 255))
+            page.paste(img, mask=img.getchannel("A"))
+            img, has_alpha = page, False
+        # Embedded as plain DeviceRGB, no ICC profile object
+        img.info.pop("icc_profile", None)
+        buffer = io.BytesIO()
+        if has_alpha:
+            img.save(buffer, "PNG", optimize=True)
+        else:
+            img.save(buffer, "JPEG", quality=profile.logo_quality, optimize=True)
+    return buffer.getvalue()
+
+def prepare_logo(path, width_mm=LOGO_WIDTH_MM):
+    """The downscaled, re-encoded logo at path (image bytes); rebuilt only when the file changes"""
+    stat = os.stat(path)
+    profile = active_profile()
+    key = (path, width_mm, profile.logo_dpi, profile.logo_quality, profile.flatten_logo)
+    with _lock:
+        cached = _prepared.get(key)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+        prepared = _prepare(path, width_mm, profile)
+        _prepared[key] = ((stat.st_mtime_ns, stat.st_size), prepared)
+        return prepared
+
+def draw_logo(pdf, path, x, y, w=LOGO_WIDTH_MM):
+    """Draw the logo at path on the current page of pdf"""
+    return pdf.image(prepare_logo(path, w), x, y, w)
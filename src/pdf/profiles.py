@@ -0,0 +1,51 @@
+import logging
+import os
+from typing import NamedTuple
+
+# Output profiles of the invoice PDFs.
+#
+# "standard" is the output the generators have always written. "compact"
+# gives smaller files for storing and emailing: one /Resources dictionary
+# shared by every page instead of one per page, and the header logo at
+# 150 dpi, flattened onto the white page and stored as a JPEG without a soft
+# mask. Page content streams are zlib-compressed at fpdf2's level in both
+# profiles (fpdf2 has no per-document level). In both profiles the TrueType
+# fonts are subset (fonts.py registers them for fpdf2's subsetter) and the
+# logo is a single image object referenced from every page (logos.py).
+# The profile is chosen per process with INVOICE_PDF_PROFILE.
+
+class PdfProfile(NamedTuple):
+    name: str
+    shared_resources: bool  # One /Resources dictionary for all pages
+    logo_dpi: int  # Resolution of the logo at the size it is drawn
+    logo_quality: int  # JPEG quality of the logo
+    flatten_logo: bool  # Logos with transparency flattened onto white and stored as JPEG
+
+PROFILES = {
+    "standard": PdfProfile("standard", False, 300, 90, False),
+    "compact": PdfProfile("compact", True, 150, 80, True),
+}
+
+_active = None
+
+def set_profile(name):
+    """Write every invoice PDF of this process with the named profile; returns it"""
+    global _active
+    _active = PROFILES[name]
+    return _active
+
+def active_profile():
+    if _active is None:
+        name = os.environ.get("INVOICE_PDF_PROFILE", "standard").lower()
+        if name not in PROFILES:
+            logging.warning(f"Unknown INVOICE_PDF_PROFILE {name!r}, using the standard profile")
+            name = "standard"
+        set_profile(name)
+    return _active
+
+def apply_profile(pdf):
+    """Set the output options of the active profile on a new document; returns the profile"""
+    profile = active_profile()
+    pdf.set_compression(True)
+    pdf.single_resources_object = profile.shared_resources
+    return profile
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from src.pdf.fonts import font_family
+from src.pdf.profiles import active_profile
+
+# Content-addressed store of rendered invoice PDFs.
+#
+# A PDF is filed under a hash of everything it is drawn from: the invoice
+# data, the layout version below, the company name and logo from Settings,
+# the font family and the PDF profile in use. Generating an invoice whose
+# inputs did not change returns the stored file instead of rendering it
+# again; any change to the inputs gives a new hash, so stale files are never
+# served and nothing has to be invalidated by hand.
+
+# Bump when an invoice layout changes, so PDFs rendered by older code are not reused
+LAYOUT_VERSION = 3
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "routes", "invoices")
+ENABLED = os.environ.get("INVOICE_RENDER_CACHE", "1").lower() not in ("0", "false", "no")
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8")
+
+def _logo_identity(logo_path):
+    if not logo_path:
+        return None
+    try:
+        stat = os.stat(logo_path)
+        return [logo_path, stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return [logo_path]
+
+class RenderCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._etags = {}
+
+    def key(self, kind, data, rows=(), settings=None):
+        """Hex digest of an invoice's inputs
+
+        data is any JSON-serialisable value; rows is an optional iterable of
+        further values (for example a streamed report), hashed one by one.
+        settings is the (company name, logo path) pair the headers are drawn with.
+        """
+        digest = hashlib.sha256()
+        digest.update(_encode([kind, LAYOUT_VERSION, font_family(), active_profile().name]))
+        if settings is not None:
+            company_name, company_logo = settings
+            digest.update(_encode([company_name, _logo_identity(company_logo)]))
+        digest.update(_encode(data))
+        for row in rows:
+            digest.update(_encode(row))
+        return digest.hexdigest()
+
+    def filename(self, name, key):
+        return f"{name}_{key[:24]}.pdf"
+
+    def lookup(self, name, key):
+        """File name of the stored PDF for key, or None (counted as a miss) when it has to be rendered"""
+        filename = self.filename(name, key)
+        if ENABLED and os.path.exists(os.path.join(self.directory, filename)):
+            with self._lock:
+                self.hits += 1
+            logging.info(f"Invoice PDF reused from the render cache: {filename}")
+            return filename
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, name, key, data):
+        """Write rendered PDF bytes under key; returns the file name"""
+        filename = self.filename(name, key)
+        os.makedirs(self.directory, exist_ok=True)
+        # Written next to its final name and moved into place, so a concurrent
+        # request never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".render-", suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return filename
+
+    def read(self, filename):
+        with open(os.path.join(self.directory, filename), "rb") as stored:
+            return stored.read()
+
+    def fetch(self, name, key, render):
+        """File name of the PDF for key, calling render() for an FPDF only when it is not stored yet
+
+        Returns (file name, True when the stored file was reused).
+        """
+        filename = self.lookup(name, key)
+        if filename:
+            return filename, True
+        return self.store(name, key, render().output()), False
+
+    def etag(self, path, stat):
+        """Strong ETag of a file in the store: its SHA-256, read once per size and mtime"""
+        identity = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known = self._etags.get(path)
+        if known and known[0] == identity:
+            return known[1]
+        digest = hashlib.sha256()
+        with open(path, "rb") as stored:
+            for block in iter(lambda: stored.read(1 << 16), b""):
+                digest.update(block)
+        etag = digest.hexdigest()
+        with self._lock:
+            self._etags[path] = (identity, etag)
+        return etag
+
+    def stats(self):
+        """Hit and miss counters of this process and the size of the store"""
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pdf")] if os.path.isdir(self.directory) else []
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "enabled": ENABLED,
+            "layoutVersion": LAYOUT_VERSION,
+            "pdfProfile": active_profile().name,
+            "hits": hits,
+            "misses": misses,
+            "hitRate": round(hits / lookups, 3) if lookups else None,
+            "files": len(files),
+            "bytes": sum(entry.stat().st_size for entry in files)
+        }
+
+cache = RenderCache(CACHE_DIR)
@@ -0,0 +1,133 @@
+from itertools import chain, islice
+from typing import NamedTuple, Optional
+from src.pdf.fonts import use_font
+from src.pdf.text import pdf_text
+
+# Tables of the invoice PDFs.
+#
+# Rows come from any iterator and are drawn as they arrive, so a table of
+# 10,000 lines holds one row at a time. Column widths are measured with the
+# document's font metrics on the first SAMPLE_ROWS rows (and the titles),
+# then kept for the whole table. The title row is drawn again at the top of
+# every page the table continues on, and text too wide for its cell is cut
+# to fit instead of running into the next column. Cell text goes through
+# pdf_text (src/pdf/text.py), so callers pass it as stored.
+
+SAMPLE_ROWS = 200
+
+class Column(NamedTuple):
+    title: str
+    align: str = "L"
+    width: Optional[float] = None  # Fixed width in mm; measured when None
+    min_width: float = 15
+    max_width: Optional[float] = None
+
+class Table:
+    def __init__(self, pdf, columns, font_size=9, header_font_size=10, row_height=6, header_height=8, max_width=None):
+        self.pdf = pdf
+        self.columns = columns
+        self.font_size = font_size
+        self.header_font_size = header_font_size
+        self.row_height = row_height
+        self.header_height = header_height
+        self.max_width = max_width or pdf.epw
+        self.widths = [column.width for column in columns]
+
+    def layout(self, sample):
+        """Set the measured column widths from sample rows (cell strings), shrinking them to fit max_width"""
+        pdf = self.pdf
+        if all(column.width is not None for column in self.columns):
+            return
+        padding = 2 * pdf.c_margin + 1
+        use_font(pdf, "B", self.header_font_size)
+        measured = [pdf.get_string_width(column.title) + padding for column in self.columns]
+        use_font(pdf, "", self.font_size)
+        for cells in sample:
+            for index, text in enumerate(cells):
+                if self.columns[index].width is None:
+                    measured[index] = max(measured[index], pdf.get_string_width(pdf_text(text)) + padding)
+
+        for index, column in enumerate(self.columns):
+            if column.width is None:
+                width = max(measured[index], column.min_width)
+                self.widths[index] = min(width, column.max_width) if column.max_width else width
+
+        fixed = sum(width for width, column in zip(self.widths, self.columns) if column.width is not None)
+        flexible = sum(self.widths) - fixed
+        if flexible and fixed + flexible > self.max_width:
+            ratio = max(self.max_width - fixed, 0) / flexible
+            self.widths = [
+                width if column.width is not None else max(width * ratio, 5)
+                for width, column in zip(self.widths, self.columns)
+            ]
+
+    @property
+    def width(self):
+        return sum(self.widths)
+
+    def header(self):
+        pdf = self.pdf
+        use_font(pdf, "B", self.header_font_size)
+        for column, width in zip(self.columns, self.widths):
+            pdf.cell(width, self.header_height, column.title, border=1, align="C")
+        pdf.ln(self.header_height)
+        use_font(pdf, "", self.font_size)
+
+    def _fit(self, text, width):
+        pdf = self.pdf
+        available = width - 2 * pdf.c_margin
+        if pdf.get_string_width(text) <= available:
+            return text
+        ellipsis = "..."
+        # Start from the proportional length, then trim the last characters
+        text = text[:max(int(len(text) * available / pdf.get_string_width(text)), 1)]
+        while text and pdf.get_string_width(text + ellipsis) > available:
+            text = text[:-1]
+        return text + ellipsis if text else ""
+
+    def row(self, cells, fill=None, style="", height=None, spans=None, aligns=None):
+        """Draw one row; spans gives the number of columns each cell covers (default one each)"""
+        pdf = self.pdf
+        height = height or self.row_height
+        if pdf.will_page_break(height):
+            pdf.add_page()
+            self.header()
+        use_font(pdf, style, self.font_size)
+        if fill:
+            pdf.set_fill_color(*fill)
+
+        column = 0
+        for index, text in enumerate(cells):
+            span = spans[index] if spans else 1
+            width = sum(self.widths[column:column + span])
+            align = aligns[index] if aligns else self.columns[column].align
+            # Keyword form: fpdf2 inspects the call stack on every cell given the deprecated ln argument
+            pdf.cell(width, height, self._fit(pdf_text(text), width), border=1, align=align, fill=bool(fill))
+            column += span
+        pdf.ln(height)
+        if style:
+            use_font(pdf, "", self.font_size)
+
+    def rows(self, items, cells=None, fill=None):
+        """Draw a row per item; cells(item) gives its cell strings (the item itself by default)
+        and fill(item) an optional RGB fill color. Returns the row count"""
+        count = 0
+        for item in items:
+            self.row(cells(item) if cells else item, fill=fill(item) if fill else None)
+            count += 1
+        return count
+
+def draw_table(pdf, columns, items, cells=None, fill=None, **options):
+    """Lay out a table on its first rows, draw its title row and a row per item; returns the Table for totals rows
+
+    items is consumed once; see Table.rows for cells and fill.
+    """
+    table = Table(pdf, columns, **options)
+    items = iter(items)
+    sample = list(islice(items, SAMPLE_ROWS))
+    table.layout(cells(item) if cells else item for item in sample)
+    if pdf.will_page_break(table.header_height + table.row_height):
+        pdf.add_page()
+    table.header()
+    table.rows(chain(sample, items), cells=cells, fill=fill)
+    return table
@@ -0,0 +1,87 @@
+import re
+import unicodedata
+from functools import lru_cache
+from arabic_reshaper import ArabicReshaper
+from bidi.algorithm import get_display
+from src.pdf.fonts import unicode_coverage
+
+# Text of the invoice PDFs.
+#
+# Every cell of every row goes through here, and client, hotel and tour
+# names repeat across rows and documents, so the conversions are table
+# driven and their results kept in LRU caches.
+#
+# safe_text() is the latin-1 form the built-in Helvetica (and file names)
+# can take: Turkish letters are transliterated and anything else outside
+# latin-1 is reduced to ASCII. pdf_text() is what a cell should show: with a
+# unicode font installed (src/pdf/fonts.py) it keeps every character the font
+# can draw, shaping Arabic into joined letters in display order, and only
+# falls back to safe_text() for the rest.
+
+TEXT_CACHE_SIZE = 8192
+
+TURKISH_TO_ASCII = str.maketrans({
+    'İ': 'I',  # Turkish capital I with dot
+    'ı': 'i',  # Turkish lowercase dotless i
+    'Ğ': 'G',  # Turkish capital G with breve
+    'ğ': 'g',  # Turkish lowercase g with breve
+    'Ü': 'U',  # Turkish capital U with diaeresis
+    'ü': 'u',  # Turkish lowercase u with diaeresis
+    'Ş': 'S',  # Turkish capital S with cedilla
+    'ş': 's',  # Turkish lowercase s with cedilla
+    'Ö': 'O',  # Turkish capital O with diaeresis
+    'ö': 'o',  # Turkish lowercase o with diaeresis
+    'Ç': 'C',  # Turkish capital C with cedilla
+    'ç': 'c',  # Turkish lowercase c with cedilla
+})
+
+ARABIC = re.compile("[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]")
+
+_reshaper = ArabicReshaper(configuration={
+    'delete_harakat': False,
+    'support_ligatures': True
+})
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def shape_arabic(text):
+    """Arabic text in the joined letter forms and visual order the PDF draws it in"""
+    return get_display(_reshaper.reshape(text))
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _latin1(text):
+    text = text.translate(TURKISH_TO_ASCII)
+    try:
+        text.encode('latin-1')
+        return text
+    except UnicodeEncodeError:
+        # Normalize and drop what is left outside ASCII
+        return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+def safe_text(text):
+    """Text in a form the built-in PDF fonts can draw (latin-1), for None an empty string"""
+    if text is None:
+        return ""
+    text = str(text)
+    if text.isascii():
+        return text
+    return _latin1(text)
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _unicode(text, coverage):
+    if ARABIC.search(text):
+        text = shape_arabic(text)
+    if all(ord(char) in coverage for char in text):
+        return text
+    return "".join(char if ord(char) in coverage else _latin1(char) for char in text)
+
+def pdf_text(text):
+    """Text of a PDF cell: kept as is where the unicode font has the glyphs, otherwise as safe_text()"""
+    if text is None:
+        return ""
+    text = str(text)
+    if text.isascii():
+        return text
+    coverage = unicode_coverage()
+    if coverage is None:
+        return _latin1(text)
+    return _unicode(text, coverage)
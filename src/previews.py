@@ -0,0 +1,58 @@
+import os
+import tempfile
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+# HTML previews of the invoices (GET /invoices/.../preview).
+#
+# A preview is drawn from the same data as the PDF of the invoice (the
+# InvoiceDocument of src/routes/invoices.py or the stored monthly invoice)
+# through the Jinja templates in templates/invoices, so an invoice can be
+# checked on screen in milliseconds and only the final document is rendered
+# with fpdf2. The templates are compiled once per process, and the compiled
+# bytecode is kept in PREVIEW_BYTECODE_DIR so a new worker process loads it
+# instead of parsing the templates again.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "invoices")
+PREVIEW_BYTECODE_DIR = os.environ.get("INVOICE_PREVIEW_BYTECODE_DIR") or os.path.join(
+    tempfile.gettempdir(), "invoice-preview-bytecode"
+)
+# Look for edited templates on every render (development)
+AUTO_RELOAD = os.environ.get("INVOICE_PREVIEW_AUTO_RELOAD", "0").lower() in ("1", "true", "yes")
+
+def _bytecode_cache():
+    try:
+        os.makedirs(PREVIEW_BYTECODE_DIR, exist_ok=True)
+    except OSError:
+        return None
+    return FileSystemBytecodeCache(PREVIEW_BYTECODE_DIR)
+
+def money(value, digits=2):
+    return f"${(value or 0):.{digits}f}"
+
+def day(value, default="N/A"):
+    """A date as YYYY-MM-DD; strings (already formatted) are kept"""
+    if not value:
+        return default
+    return value.strftime("%Y-%m-%d") if hasattr(value, "strftime") else str(value)
+
+environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=AUTO_RELOAD,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+environment.filters["money"] = money
+environment.filters["day"] = day
+
+def precompile():
+    """Compile every preview template ahead of the first request; returns their names"""
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+    return names
+
+def render(template_name, **context):
+    """HTML of a preview template"""
+    return environment.get_template(template_name).render(**context)
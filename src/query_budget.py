@@ -0,0 +1,58 @@
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request query budgets. A view decorated with @query_budget(n) counts the
+# SQL statements it executes; going over n is logged, and raises when
+# QUERY_BUDGET_STRICT is set (manage_db.py check-query-budgets runs that way).
+
+_local = threading.local()
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        # The driver parameters of each statement, in the same order
+        self.parameters = []
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, "counters", ()):
+        counter.count += 1
+        counter.statements.append(statement)
+        counter.parameters.append(parameters)
+
+@contextmanager
+def count_queries():
+    """Count the statements executed on this thread inside the block"""
+    counter = QueryCounter()
+    counters = _local.__dict__.setdefault("counters", [])
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+def query_budget(limit):
+    """Fail loudly when a view needs more than limit queries, i.e. when an N+1 creeps back in"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with count_queries() as counter:
+                response = view(*args, **kwargs)
+            if counter.count > limit:
+                message = f"{view.__name__} executed {counter.count} queries (budget {limit})"
+                logging.warning(message)
+                if current_app.config.get("QUERY_BUDGET_STRICT"):
+                    raise QueryBudgetExceeded(message)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
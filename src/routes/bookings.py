@@ -1,13 +1,44 @@
 from flask import Blueprint, request, jsonify
-from src.models.database import db, Booking, Client, Driver, Vehicle, Service, Invoice, Notification, MonthlyInvoiceItem
+from src.models.database import db, Booking, Client, Driver, Vehicle, Service, Invoice, Notification, detach_monthly_invoice_items
+from src.models import loaders
+from src.query_budget import query_budget
+from src.pagination import PaginationError, date_range_filter, keyset_page, list_arg, page_response, wants_full_list
 from datetime import datetime, time
 
 bookings_bp = Blueprint("bookings", __name__)
 
+BOOKING_SORTS = {
+    "id": [Booking.id],
+    "startDate": [Booking.overall_startDate, Booking.id],
+}
+
+def booking_filters():
+    """Filters of GET /bookings: status, clientId, companyId, serviceType and from/to on the start date"""
+    filters = [date_range_filter(Booking.overall_startDate)]
+    statuses = list_arg("status")
+    if statuses:
+        filters.append(Booking.status.in_(statuses))
+    client_id = request.args.get("clientId", type=int)
+    if client_id:
+        filters.append(Booking.client_id == client_id)
+    company_id = request.args.get("companyId", type=int)
+    if company_id:
+        filters.append(Booking.client_id.in_(db.session.query(Client.id).filter(Client.company_id == company_id)))
+    service_types = list_arg("serviceType")
+    if service_types:
+        filters.append(Booking.services.any(Service.serviceType.in_(service_types)))
+    return filters
+
 @bookings_bp.route("/bookings", methods=["GET"])
+@query_budget(3)
 def get_bookings():
     try:
-        bookings = Booking.query.all()
+        query = Booking.query.options(*loaders.booking_list()).filter(*booking_filters())
+        full_list = wants_full_list()
+        if full_list:
+            bookings, next_cursor = query.all(), None
+        else:
+            bookings, next_cursor = keyset_page(query, BOOKING_SORTS, "-id")
         bookings_data = []
         
         for booking in bookings:
@@ -38,9 +69,9 @@ def get_bookings():
                     "isAccommodation": service.isAccommodation,
                     "isTour": service.isTour,
                     "isVehicleRental": service.isVehicleRental,
-                    "totalCost": service.totalCost,
-                    "totalSellingPrice": service.totalSellingPrice,
-                    "profit": service.profit
+                    "totalCost": service.lineCost,
+                    "totalSellingPrice": service.lineSellingPrice,
+                    "profit": service.lineProfit
                 }
                 services_data.append(service_dict)
 
@@ -54,14 +85,18 @@ def get_bookings():
                 "status": booking.status,
                 "createdAt": booking.created_at.isoformat(),
                 "services": services_data,
-                "totalCost": booking.totalCost,
-                "totalSellingPrice": booking.totalSellingPrice,
-                "profit": booking.profit
+                "totalCost": booking.rollupCost,
+                "totalSellingPrice": booking.rollupSellingPrice,
+                "profit": booking.rollupProfit
             }
             
             bookings_data.append(booking_data)
         
-        return jsonify(bookings_data)
+        if full_list:
+            return jsonify(bookings_data)
+        return jsonify(page_response(bookings_data, next_cursor))
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -212,11 +247,10 @@ def update_booking(booking_id):
         booking.status = data.get("status", "pending")
 
         # Handle services: delete existing, add new ones
-        # First, delete associated MonthlyInvoiceItem records for each service
+        # First, unlink the monthly invoice items listing them; their invoices are
+        # flagged stale and drop the items on their next refresh
         existing_services = Service.query.filter_by(booking_id=booking.id).all()
-        for service in existing_services:
-            MonthlyInvoiceItem.query.filter_by(service_id=service.id).delete()
-        db.session.flush() # Flush to ensure MonthlyInvoiceItem deletions are processed
+        detach_monthly_invoice_items(db.session.connection(), [service.id for service in existing_services])
 
         Service.query.filter_by(booking_id=booking.id).delete()
         db.session.flush()
@@ -333,17 +367,11 @@ def delete_booking(booking_id):
             db.session.flush()
             print("✅ تم حذف جميع الفواتير")
 
-        # الخطوة 2: حذف عناصر الفواتير الشهرية المرتبطة بالخدمات
-        monthly_items_count = 0
-        for service in booking.services:
-            monthly_invoice_items = MonthlyInvoiceItem.query.filter_by(service_id=service.id).all()
-            for item in monthly_invoice_items:
-                db.session.delete(item)
-                monthly_items_count += 1
-        
-        if monthly_items_count > 0:
-            db.session.flush()
-            print(f"✅ تم حذف {monthly_items_count} عنصر من الفواتير الشهرية")
+        # الخطوة 2: فصل عناصر الفواتير الشهرية عن الخدمات
+        # The items stay on their invoices, which are flagged stale and drop them on their next refresh
+        stale_invoice_ids = detach_monthly_invoice_items(db.session.connection(), [service.id for service in booking.services])
+        if stale_invoice_ids:
+            print(f"✅ تم تعليم {len(stale_invoice_ids)} فاتورة شهرية للتحديث")
 
         # الخطوة 3: حذف الإشعارات المرتبطة بالحجز
         notifications = Notification.query.filter_by(booking_id=booking.id).all()
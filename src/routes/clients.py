@@ -1,12 +1,28 @@
 from flask import Blueprint, request, jsonify
 from src.models.database import db, Client, Company, Booking, Service
+from src.models import loaders
+from src.query_budget import query_budget
+from src.pagination import PaginationError, keyset_page, page_response, wants_full_list
 
 clients_bp = Blueprint("clients", __name__)
 
+CLIENT_SORTS = {
+    "id": [Client.id],
+    "lastName": [Client.lastName, Client.id],
+}
+
 @clients_bp.route("/clients", methods=["GET"])
 def get_clients():
     try:
-        clients = Client.query.all()
+        query = Client.query.options(*loaders.client_with_company())
+        company_id = request.args.get("companyId", type=int)
+        if company_id:
+            query = query.filter(Client.company_id == company_id)
+        full_list = wants_full_list()
+        if full_list:
+            clients, next_cursor = query.all(), None
+        else:
+            clients, next_cursor = keyset_page(query, CLIENT_SORTS, "-id")
         result = []
         for client in clients:
             company_name = client.company.name if client.company else "No Company"
@@ -26,7 +42,11 @@ def get_clients():
                 "companyId": client.company_id,
                 "bookingCount": booking_count
             })
-        return jsonify(result)
+        if full_list:
+            return jsonify(result)
+        return jsonify(page_response(result, next_cursor))
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -55,12 +75,15 @@ def get_client(client_id):
         return jsonify({"error": str(e)}), 500
 
 @clients_bp.route("/clients/<int:client_id>/bookings", methods=["GET"])
+@query_budget(4)
 def get_client_bookings(client_id):
     try:
-        client = Client.query.get_or_404(client_id)
+        client = Client.query.options(*loaders.client_with_company()).get_or_404(client_id)
         
         # Get all bookings for this client, ordered by date (newest first)
-        bookings = Booking.query.filter_by(client_id=client_id).order_by(Booking.created_at.desc()).all()
+        bookings = Booking.query.options(*loaders.client_bookings()).filter_by(
+            client_id=client_id
+        ).order_by(Booking.created_at.desc()).all()
         
         # Categorize bookings by service type
         hotels = []
@@ -88,9 +111,9 @@ def get_client_bookings(client_id):
                     "serviceName": service.serviceName,
                     "startDate": service.startDate.isoformat(),
                     "endDate": service.endDate.isoformat(),
-                    "totalCost": float(service.totalCost),
-                    "totalSellingPrice": float(service.totalSellingPrice),
-                    "profit": float(service.profit),
+                    "totalCost": float(service.lineCost or 0),
+                    "totalSellingPrice": float(service.lineSellingPrice or 0),
+                    "profit": float(service.lineProfit or 0),
                     "status": booking.status,
                     "notes": service.notes,
                     "driverName": driver_name,
@@ -121,8 +144,8 @@ def get_client_bookings(client_id):
                     })
                     vehicle_rentals.append(service_data)
                 
-                total_revenue += service.totalSellingPrice
-                total_profit += service.profit
+                total_revenue += service.lineSellingPrice or 0
+                total_profit += service.lineProfit or 0
         
         return jsonify({
             "client": {
@@ -1,14 +1,29 @@
 from flask import Blueprint, request, jsonify
 from src.models.database import db, Company, Client, Booking, Service, MonthlyCompanyInvoice, MonthlyInvoiceItem
+from src.models import reports
+from src.models.periods import in_month, period_error
+from src.models.reports import report_period
+from src.pagination import PaginationError, keyset_page, page_response, wants_full_list
+from src.single_flight import single_flight_response
 from datetime import datetime, date
+from sqlalchemy import func
 import logging
 
 companies_bp = Blueprint("companies", __name__)
 
+COMPANY_SORTS = {
+    "id": [Company.id],
+    "name": [Company.name, Company.id],
+}
+
 @companies_bp.route("/companies", methods=["GET"])
 def get_companies():
     try:
-        companies = Company.query.all()
+        full_list = wants_full_list()
+        if full_list:
+            companies, next_cursor = Company.query.all(), None
+        else:
+            companies, next_cursor = keyset_page(Company.query, COMPANY_SORTS, "name")
         result = []
         for company in companies:
             client_count = Client.query.filter_by(company_id=company.id).count()
@@ -21,7 +36,11 @@ def get_companies():
                 "logoPath": company.logoPath,
                 "clientCount": client_count
             })
-        return jsonify(result)
+        if full_list:
+            return jsonify(result)
+        return jsonify(page_response(result, next_cursor))
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -194,6 +213,9 @@ def get_company_clients_detailed(company_id):
         # Get query parameters for date filtering
         month = request.args.get("month", type=int)
         year = request.args.get("year", type=int)
+        period_problem = period_error(month, year) if month and year else None
+        if period_problem:
+            return jsonify({"error": period_problem}), 400
         
         clients = Client.query.filter_by(company_id=company_id).all()
         
@@ -207,8 +229,7 @@ def get_company_clients_detailed(company_id):
             # Filter by month/year if provided
             if month and year:
                 bookings_query = bookings_query.filter(
-                    db.extract("month", Booking.created_at) == month,
-                    db.extract("year", Booking.created_at) == year
+                    in_month(Booking.created_at, month, year)
                 )
             
             bookings = bookings_query.all()
@@ -288,152 +309,17 @@ def get_company_monthly_invoice_excel(company_id):
         company = Company.query.get_or_404(company_id)
         
         # Get query parameters
-        month = request.args.get("month", type=int, default=datetime.now().month)
-        year = request.args.get("year", type=int, default=datetime.now().year)
-        
-        # Validate month and year
-        if month < 1 or month > 12:
-            month = datetime.now().month
-        if year < 2020 or year > 2030:
-            year = datetime.now().year
-        
-        # FIXED: Get only clients who have bookings with arrival dates in the specified month/year
-        # Use overall_startDate (arrival date) instead of created_at
-        bookings_in_period = db.session.query(Booking).join(Client).filter(
-            Client.company_id == company_id,
-            Booking.overall_startDate.isnot(None),  # Ensure arrival date exists
-            db.extract("month", Booking.overall_startDate) == month,
-            db.extract("year", Booking.overall_startDate) == year
-        ).all()
-        
-        # Get unique client IDs from these bookings
-        client_ids_with_bookings = list(set([booking.client_id for booking in bookings_in_period]))
-        
-        if not client_ids_with_bookings:
-            # No bookings in this period
-            return jsonify({
-                "company": {
-                    "id": company.id,
-                    "name": getattr(company, "name", "") or "Unknown Company",
-                    "email": getattr(company, "email", "") or "",
-                    "contactPerson": getattr(company, "contactPerson", "") or ""
-                },
-                "period": {
-                    "month": month,
-                    "year": year,
-                    "monthName": datetime(year, month, 1).strftime("%B")
-                },
-                "clients": [],
-                "summary": {
-                    "totalAmount": 0.0,
-                    "totalPaid": 0.0,
-                    "totalDue": 0.0,
-                    "clientCount": 0
-                }
-            })
-        
-        # Get clients who have bookings in this period
-        clients = Client.query.filter(Client.id.in_(client_ids_with_bookings)).all()
-        
-        excel_data = []
-        total_paid = 0
-        total_due = 0
-        total_amount = 0
-        
-        for client in clients:
-            try:
-                # Get bookings for this client in the specified period only
-                client_bookings = [b for b in bookings_in_period if b.client_id == client.id]
-                
-                if not client_bookings:
-                    continue
-                
-                # Calculate client totals from bookings in this period only
-                client_total = 0
-                arrival_date = None
-                
-                for booking in client_bookings:
-                    try:
-                        # Get the earliest arrival date from bookings in this period
-                        if booking.overall_startDate:
-                            if not arrival_date or booking.overall_startDate < arrival_date:
-                                arrival_date = booking.overall_startDate
-                        
-                        # Safely get services for this booking
-                        if hasattr(booking, "services") and booking.services:
-                            for service in booking.services:
-                                try:
-                                    if hasattr(service, "totalSellingPrice") and service.totalSellingPrice:
-                                        client_total += float(service.totalSellingPrice)
-                                except (ValueError, TypeError, AttributeError) as e:
-                                    logging.warning(f"Error processing service price for booking {booking.id}: {e}")
-                                    continue
-                    except Exception as e:
-                        logging.warning(f"Error processing booking {booking.id}: {e}")
-                        continue
-                
-                # Skip clients with no valid bookings or zero amount
-                if client_total <= 0:
-                    continue
-                
-                # Get payment status (check if client has payment tracking fields)
-                payment_status = "pending"
-                paid_amount = 0
-                
-                # Check if client has payment tracking fields
-                if hasattr(client, "paymentStatus"):
-                    payment_status = getattr(client, "paymentStatus", "pending") or "pending"
-                if hasattr(client, "paidAmount"):
-                    paid_amount = float(getattr(client, "paidAmount", 0) or 0)
-                
-                # Create safe client name
-                client_name = f"{getattr(client, 'firstName', '') or ''} {getattr(client, 'lastName', '') or ''}".strip()
-                if not client_name:
-                    client_name = f"Client {client.id}"
-                
-                # Calculate due amount
-                due_amount = max(0, client_total - paid_amount)
-                
-                excel_data.append({
-                    "clientId": client.id,
-                    "clientName": client_name,
-                    "email": getattr(client, "email", "") or "",
-                    "arrivalDate": arrival_date.isoformat() if arrival_date else "",
-                    "totalAmount": client_total,
-                    "paidAmount": paid_amount,
-                    "dueAmount": due_amount,
-                    "paymentStatus": payment_status
-                })
-                
-                # Update totals
-                total_amount += client_total
-                total_paid += paid_amount
-                total_due += due_amount
-                
-            except Exception as e:
-                logging.warning(f"Error processing client {client.id}: {e}")
-                continue
+        month, year = report_period(
+            request.args.get("month", type=int, default=datetime.now().month),
+            request.args.get("year", type=int, default=datetime.now().year)
+        )
         
-        return jsonify({
-            "company": {
-                "id": company.id,
-                "name": getattr(company, "name", "") or "Unknown Company",
-                "email": getattr(company, "email", "") or "",
-                "contactPerson": getattr(company, "contactPerson", "") or ""
-            },
-            "period": {
-                "month": month,
-                "year": year,
-                "monthName": datetime(year, month, 1).strftime("%B")
-            },
-            "clients": excel_data,
-            "summary": {
-                "totalAmount": round(total_amount, 2),
-                "totalPaid": round(total_paid, 2),
-                "totalDue": round(total_due, 2),
-                "clientCount": len(excel_data)
-            }
-        })
+        # Assembled in src/models/reports.py, shared with the Excel-like invoice PDFs;
+        # identical requests running at the same time share one report
+        return single_flight_response(
+            "companies.monthly_invoice_excel", {"companyId": company_id, "month": month, "year": year},
+            lambda: (reports.monthly_excel_report(company, month, year).to_dict(), 200)
+        )
     except Exception as e:
         logging.error(f"Error in get_company_monthly_invoice_excel: {e}")
         return jsonify({"error": str(e)}), 500
@@ -498,46 +384,34 @@ def get_companies_with_counts():
         companies = Company.query.all()
         result = []
         
+        # Get payment summary for current month
+        current_month = datetime.now().month
+        current_year = datetime.now().year
+        
+        period_filter = (
+            Booking.overall_startDate.isnot(None),
+            in_month(Booking.overall_startDate, current_month, current_year)
+        )
+        
+        # Revenue of every company for the current month in one grouped query
+        revenue_by_company = dict(db.session.query(
+            Client.company_id,
+            func.coalesce(func.sum(Booking.rollupSellingPrice), 0.0)
+        ).join(Booking, Booking.client_id == Client.id).filter(*period_filter).group_by(Client.company_id).all())
+        
+        # Paid amounts of the clients that have bookings in the current month
+        clients_current_month = db.session.query(Booking.client_id).filter(*period_filter).distinct()
+        paid_by_company = dict(db.session.query(
+            Client.company_id,
+            func.coalesce(func.sum(Client.paidAmount), 0.0)
+        ).filter(Client.id.in_(clients_current_month)).group_by(Client.company_id).all())
+        
         for company in companies:
             # Get basic client count
             client_count = Client.query.filter_by(company_id=company.id).count()
             
-            # Get payment summary for current month
-            current_month = datetime.now().month
-            current_year = datetime.now().year
-            
-            # Get clients with bookings in current month
-            bookings_current_month = db.session.query(Booking).join(Client).filter(
-                Client.company_id == company.id,
-                Booking.overall_startDate.isnot(None),
-                db.extract("month", Booking.overall_startDate) == current_month,
-                db.extract("year", Booking.overall_startDate) == current_year
-            ).all()
-            
-            monthly_revenue = 0
-            monthly_paid = 0
-            
-            client_ids_current_month = list(set([booking.client_id for booking in bookings_current_month]))
-            
-            for client_id in client_ids_current_month:
-                client = Client.query.get(client_id)
-                if client:
-                    # Calculate client total for current month
-                    client_bookings = [b for b in bookings_current_month if b.client_id == client_id]
-                    client_total = 0
-                    
-                    for booking in client_bookings:
-                        if hasattr(booking, "services") and booking.services:
-                            for service in booking.services:
-                                if hasattr(service, "totalSellingPrice") and service.totalSellingPrice:
-                                    client_total += float(service.totalSellingPrice)
-                    
-                    monthly_revenue += client_total
-                    
-                    # Get paid amount
-                    if hasattr(client, "paidAmount"):
-                        paid_amount = float(getattr(client, "paidAmount", 0) or 0)
-                        monthly_paid += paid_amount
+            monthly_revenue = float(revenue_by_company.get(company.id) or 0)
+            monthly_paid = float(paid_by_company.get(company.id) or 0)
             
             result.append({
                 "id": company.id,
@@ -567,14 +441,16 @@ def get_company_clients_simple(company_id):
         # Get query parameters for date filtering
         month = request.args.get("month", type=int)
         year = request.args.get("year", type=int)
+        period_problem = period_error(month, year) if month and year else None
+        if period_problem:
+            return jsonify({"error": period_problem}), 400
         
         if month and year:
             # Get clients with bookings in specified period
             bookings_in_period = db.session.query(Booking).join(Client).filter(
                 Client.company_id == company_id,
                 Booking.overall_startDate.isnot(None),
-                db.extract("month", Booking.overall_startDate) == month,
-                db.extract("year", Booking.overall_startDate) == year
+                in_month(Booking.overall_startDate, month, year)
             ).all()
             
             client_ids = list(set([booking.client_id for booking in bookings_in_period]))
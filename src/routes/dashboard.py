@@ -35,21 +35,20 @@ def get_dashboard_summary():
         # Upcoming bookings (next 7 days)
         next_week = today + timedelta(days=7)
         upcoming_bookings_count = Booking.query.filter(
-            Booking.overall_start_date >= today,
-            Booking.overall_start_date <= next_week,
+            Booking.overall_startDate >= today,
+            Booking.overall_startDate <= next_week,
             Booking.status.in_(["pending", "confirmed"])
         ).count()
         
-        # Total revenue for selected month - calculate in Python, not in SQL
-        bookings_this_month = Booking.query.filter(
-            Booking.overall_start_date >= month_start,
-            Booking.overall_start_date <= month_end,
+        # Total revenue and profit for selected month - summed from the stored booking rollups
+        total_revenue, total_profit = db.session.query(
+            func.coalesce(func.sum(Booking.rollupSellingPrice), 0.0),
+            func.coalesce(func.sum(Booking.rollupProfit), 0.0)
+        ).filter(
+            Booking.overall_startDate >= month_start,
+            Booking.overall_startDate <= month_end,
             Booking.status.in_(["confirmed", "completed"])
-        ).all()
-        
-        # Calculate revenue and profit in Python after fetching the records
-        total_revenue = sum(booking.total_selling_price for booking in bookings_this_month)
-        total_profit = sum(booking.profit for booking in bookings_this_month)
+        ).one()
         
         # Active clients
         active_clients = Client.query.count()
@@ -85,13 +84,13 @@ def get_detailed_stats():
         
         # Service type breakdown
         service_types_query = db.session.query(
-            Service.service_type,
+            Service.serviceType,
             func.count(Service.id)
-        ).group_by(Service.service_type).all()
+        ).group_by(Service.serviceType).all()
         
         service_breakdown = {service_type: count for service_type, count in service_types_query}
         
-        # Monthly revenue (last 6 months) - calculate in Python, not in SQL
+        # Monthly revenue (last 6 months) - summed from the stored booking rollups
         monthly_revenue = []
         for i in range(6):
             month_start = (date.today().replace(day=1) - timedelta(days=i*30)).replace(day=1)
@@ -100,15 +99,13 @@ def get_detailed_stats():
             else:
                 month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
             
-            # Get bookings for this month
-            month_bookings = Booking.query.filter(
-                Booking.overall_start_date >= month_start,
-                Booking.overall_start_date <= month_end,
+            revenue = db.session.query(
+                func.coalesce(func.sum(Booking.rollupSellingPrice), 0.0)
+            ).filter(
+                Booking.overall_startDate >= month_start,
+                Booking.overall_startDate <= month_end,
                 Booking.status.in_(["confirmed", "completed"])
-            ).all()
-            
-            # Calculate revenue in Python
-            revenue = sum(booking.total_selling_price for booking in month_bookings)
+            ).scalar()
             
             monthly_revenue.append({
                 "month": month_start.strftime("%Y-%m"),
@@ -209,34 +206,37 @@ def get_todays_bookings():
 @dashboard_bp.route("/dashboard/accommodation-stats", methods=["GET"])
 def get_accommodation_stats():
     try:
-        # Get accommodation bookings
-        accommodation_services = Service.query.filter(
-            Service.service_type.in_(["Hotel", "Cabin"])
-        ).all()
-        
-        # Calculate accommodation-specific stats
-        total_nights = sum(service.num_nights for service in accommodation_services if service.num_nights)
-        total_accommodation_revenue = sum(service.total_selling_price for service in accommodation_services)
-        total_accommodation_cost = sum(service.total_cost for service in accommodation_services)
+        # Accommodation totals and per-hotel breakdown from the stored service lines
+        total_nights, total_accommodation_revenue, total_accommodation_cost = db.session.query(
+            func.coalesce(func.sum(Service.numNights), 0),
+            func.coalesce(func.sum(Service.lineSellingPrice), 0.0),
+            func.coalesce(func.sum(Service.lineCost), 0.0)
+        ).filter(Service.isAccommodation).one()
         total_accommodation_profit = total_accommodation_revenue - total_accommodation_cost
         
         # Group by hotel/cabin name
+        hotel_rows = db.session.query(
+            Service.hotelName,
+            func.min(Service.serviceType),
+            func.count(Service.id),
+            func.coalesce(func.sum(Service.numNights), 0),
+            func.coalesce(func.sum(Service.lineSellingPrice), 0.0),
+            func.coalesce(func.sum(Service.lineProfit), 0.0)
+        ).filter(
+            Service.isAccommodation,
+            Service.hotelName.isnot(None),
+            Service.hotelName != ""
+        ).group_by(Service.hotelName).all()
+        
         accommodation_breakdown = {}
-        for service in accommodation_services:
-            if service.hotel_name:
-                if service.hotel_name not in accommodation_breakdown:
-                    accommodation_breakdown[service.hotel_name] = {
-                        "type": service.service_type,
-                        "bookings": 0,
-                        "nights": 0,
-                        "revenue": 0,
-                        "profit": 0
-                    }
-                
-                accommodation_breakdown[service.hotel_name]["bookings"] += 1
-                accommodation_breakdown[service.hotel_name]["nights"] += service.num_nights or 0
-                accommodation_breakdown[service.hotel_name]["revenue"] += service.total_selling_price
-                accommodation_breakdown[service.hotel_name]["profit"] += service.profit
+        for hotel_name, service_type, bookings, nights, revenue, profit in hotel_rows:
+            accommodation_breakdown[hotel_name] = {
+                "type": service_type,
+                "bookings": bookings,
+                "nights": nights,
+                "revenue": revenue,
+                "profit": profit
+            }
         
         return jsonify({
             "totalNights": total_nights,
@@ -1,53 +1,69 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, current_app, has_request_context, request, jsonify, send_file
+from typing import Callable, NamedTuple
 from datetime import datetime, date
 import os
+from urllib.parse import quote
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
 from fpdf import FPDF, HTMLMixin
 from fpdf.enums import Align, XPos, YPos
-from src.models.database import db, Invoice, Booking, MonthlyCompanyInvoice, MonthlyInvoiceItem, Company, Client, Service, Settings
-from arabic_reshaper import ArabicReshaper
-from bidi.algorithm import get_display
+from src.models.database import (
+    db, Invoice, InvoiceJob, InvoiceLedger, Booking, MonthlyCompanyInvoice, MonthlyInvoiceChange, MonthlyInvoiceItem, Company, Client, Service, Settings,
+    LEDGER_BATCH, LEDGER_MONTHLY_INVOICE, refresh_invoice_ledger
+)
+from src.models.periods import in_month, period_error
+from src.models import loaders, reports, settings_cache
+from src.models.reports import report_period
+from src import previews
+from src.invoice_jobs import JOB_HANDLERS, enqueue_job, job_handler, job_to_dict, no_progress, request_flag, wants_async
+from src.pdf.fonts import register_fonts, use_font
+from src.pdf.logos import draw_logo, resolve_logo_path
+from src.pdf.profiles import apply_profile
+from src.pdf import bundles, render_cache
+from src.pdf.tables import Column, draw_table
+from src.pdf.text import pdf_text, safe_text
+from src.query_budget import query_budget
+from src.single_flight import single_flight_response
+from src.pagination import PaginationError, date_range_filter, keyset_page, list_arg, page_response, wants_full_list
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
 import logging
-import unicodedata
+import time
+from concurrent.futures import as_completed
+from itertools import chain, groupby
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Extend FPDF with HTMLMixin for better text handling
 class MyFPDF(FPDF, HTMLMixin):
-    pass
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Fonts are registered once per document, see src/pdf/fonts.py
+        self.invoice_font_family = register_fonts(self)
+        # Compression and resource sharing of the active PDF profile, see src/pdf/profiles.py
+        apply_profile(self)
 
 invoices_bp = Blueprint("invoices", __name__)
 
-# Define font paths (assuming these fonts are available in a 'fonts' directory)
-FONT_DIR = "/home/ubuntu/fonts"
+# Invoices of the month-end run (POST /invoices/monthly/close), per company
+MONTH_END_INVOICE_TYPES = ("partner_company", "my_company")
+MONTH_END_PDFS_PER_PROCESS = 100
 
-# Ensure the fonts directory exists
-if not os.path.exists(FONT_DIR):
-    os.makedirs(FONT_DIR)
+# Columns of manifest.csv in GET /invoices/bundle
+BUNDLE_MANIFEST_FIELDS = [
+    "record", "id", "type", "company", "client", "period", "invoiceDate", "totalAmount", "status", "file", "bytes", "included"
+]
 
-# Initialize Arabic reshaper
-configuration = {
-    'delete_harakat': False,
-    'support_ligatures': True
-}
-
-reshaper = ArabicReshaper(configuration=configuration)
-
-def get_arabic_text(text):
-    return get_display(reshaper.reshape(text))
+# GET /invoices pages the invoice ledger by (invoice date, source table, invoice id)
+INVOICE_SORTS = {"date": [InvoiceLedger.invoiceDate, InvoiceLedger.source, InvoiceLedger.invoice_id]}
 
-def safe_get_text(obj, key, default="N/A", max_length=None):
+def get_text(obj, key, default="N/A", max_length=None):
     """
-    Safely get text from an object/dict with None handling and optional length limiting.
-    
-    Args:
-        obj: Dictionary or object to get value from
-        key: Key/attribute name to access
-        default: Default value if key is None or doesn't exist
-        max_length: Maximum length to truncate text (optional)
-    
-    Returns:
-        Safe text string ready for PDF generation
+    Get text from an object/dict with None handling and optional length limiting.
+    Unlike safe_get_text the text is kept as stored; PDF cells draw it through pdf_text.
     """
     try:
         # Handle dictionary access
@@ -67,158 +83,50 @@ def safe_get_text(obj, key, default="N/A", max_length=None):
         # Apply length limit if specified
         if max_length and len(value) > max_length:
             value = value[:max_length]
-        
-        # Apply safe_text processing
-        return safe_text(value)
+        return value
     
     except Exception as e:
-        logging.warning(f"Error getting safe text for key '{key}': {e}")
-        return safe_text(default)
+        logging.warning(f"Error getting text for key '{key}': {e}")
+        return str(default)
 
-def safe_text(text):
-    """
-    Convert text to a safe format for PDF generation.
-    Handles Turkish and other non-Latin characters, and None values.
+def safe_get_text(obj, key, default="N/A", max_length=None):
     """
-    if text is None:
-        return ""
-    
-    # Convert to string if not already
-    text = str(text)
-    
-    # Replace problematic Turkish characters with safe alternatives
-    replacements = {
-        'İ': 'I',  # Turkish capital I with dot
-        'ı': 'i',  # Turkish lowercase dotless i
-        'Ğ': 'G',  # Turkish capital G with breve
-        'ğ': 'g',  # Turkish lowercase g with breve
-        'Ü': 'U',  # Turkish capital U with diaeresis
-        'ü': 'u',  # Turkish lowercase u with diaeresis
-        'Ş': 'S',  # Turkish capital S with cedilla
-        'ş': 's',  # Turkish lowercase s with cedilla
-        'Ö': 'O',  # Turkish capital O with diaeresis
-        'ö': 'o',  # Turkish lowercase o with diaeresis
-        'Ç': 'C',  # Turkish capital C with cedilla
-        'ç': 'c',  # Turkish lowercase c with cedilla
-    }
+    Safely get text from an object/dict with None handling and optional length limiting.
     
-    # Apply replacements
-    for turkish_char, replacement in replacements.items():
-        text = text.replace(turkish_char, replacement)
+    Args:
+        obj: Dictionary or object to get value from
+        key: Key/attribute name to access
+        default: Default value if key is None or doesn't exist
+        max_length: Maximum length to truncate text (optional)
     
-    # Remove any remaining non-ASCII characters that might cause issues
-    try:
-        # Try to encode as latin-1 to check compatibility
-        text.encode('latin-1')
-        return text
-    except UnicodeEncodeError:
-        # If encoding fails, normalize and remove problematic characters
-        normalized = unicodedata.normalize('NFKD', text)
-        ascii_text = normalized.encode('ascii', 'ignore').decode('ascii')
-        return ascii_text
+    Returns:
+        Safe text string ready for PDF generation
+    """
+    # Apply safe_text processing (see src/pdf/text.py)
+    return safe_text(get_text(obj, key, default, max_length))
 
 # Function to get company settings including logo
 def get_company_settings():
     """Get company settings from the database"""
     try:
-        settings = {}
-        
-        # Get all settings from database
-        db_settings = Settings.query.all()
-        for setting in db_settings:
-            try:
-                import json
-                settings[setting.key] = json.loads(setting.value)
-            except json.JSONDecodeError:
-                settings[setting.key] = setting.value
+        # Settings are cached per process, see src/models/settings_cache.py
+        settings = settings_cache.cache.values()
         
         # Default values if not found
-        company_name = safe_text(settings.get('company_name', 'AK SERAGOLU TURIZM'))
+        company_name = settings.get('company_name', 'AK SERAGOLU TURIZM')
         company_logo = settings.get('company_logo', '')
         
         # Debug logging for logo path
         logging.info(f"Company logo path from settings: {company_logo}")
         
-        # Handle different possible logo path formats
-        if company_logo:
-            # Remove leading slash if present
-            logo_path = company_logo.lstrip('/')
-            
-            # Check if it's a relative path and make it absolute
-            if not os.path.isabs(logo_path):
-                # Try different possible base paths
-                possible_paths = [
-                    logo_path,  # As is
-                    os.path.join(os.getcwd(), logo_path),  # Current working directory
-                    os.path.join(os.path.dirname(__file__), logo_path),  # Relative to this file
-                    os.path.join(os.path.dirname(__file__), '..', logo_path),  # Parent directory
-                    os.path.join(os.path.dirname(__file__), '..', '..', logo_path),  # Two levels up
-                    os.path.join('/home/ubuntu', logo_path),  # Home directory
-                    os.path.join('/home/ubuntu/src', logo_path),  # src directory
-                    os.path.join('/home/ubuntu/uploads', logo_path),  # uploads directory
-                    os.path.join('/home/ubuntu/static', logo_path),  # static directory
-                    os.path.join('/home/ubuntu/upload', logo_path),  # upload directory
-                    os.path.join('/home/ubuntu/src/routes/uploads', logo_path),  # routes/uploads directory
-                ]
-                
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        logging.info(f"Found logo at: {path}")
-                        company_logo = path
-                        break
-                else:
-                    logging.warning(f"Logo file not found in any of the expected locations: {possible_paths}")
-                    company_logo = ''
-            else:
-                # Absolute path - check if it exists
-                if not os.path.exists(logo_path):
-                    logging.warning(f"Logo file not found at absolute path: {logo_path}")
-                    company_logo = ''
-                else:
-                    company_logo = logo_path
+        # Resolved once per process, see src/pdf/logos.py
+        company_logo = resolve_logo_path(company_logo)
         
         return company_name, company_logo
     except Exception as e:
         logging.warning(f"Could not load company settings: {e}")
         return 'AK SERAGOLU TURIZM', ''
 
-# Function to add a standard font for English and Unicode characters
-def add_unicode_fonts(pdf):
-    try:
-        # Try to use Noto Sans Arabic font if available
-        noto_font_path = os.path.join(FONT_DIR, "NotoSansArabic-Regular.ttf")
-        noto_bold_path = os.path.join(FONT_DIR, "NotoSansArabic-Bold.ttf")
-        
-        if os.path.exists(noto_font_path):
-            pdf.add_font("NotoArabic", "", noto_font_path)
-            if os.path.exists(noto_bold_path):
-                pdf.add_font("NotoArabic", "B", noto_bold_path)
-            else:
-                pdf.add_font("NotoArabic", "B", noto_font_path)
-            pdf.set_font("NotoArabic", "", 10)
-            return True
-        else:
-            # Fallback to DejaVu fonts
-            dejavu_font_path = os.path.join(FONT_DIR, "DejaVuSansCondensed.ttf")
-            dejavu_bold_path = os.path.join(FONT_DIR, "DejaVuSansCondensed-Bold.ttf")
-            
-            if os.path.exists(dejavu_font_path):
-                pdf.add_font("DejaVu", "", dejavu_font_path)
-                if os.path.exists(dejavu_bold_path):
-                    pdf.add_font("DejaVu", "B", dejavu_bold_path)
-                else:
-                    pdf.add_font("DejaVu", "B", dejavu_font_path)
-                pdf.set_font("DejaVu", "", 10)
-                return True
-            else:
-                # Use built-in Helvetica as last resort
-                pdf.set_font("Helvetica", "", 10)
-                return False
-    except Exception as e:
-        logging.warning(f"Could not load custom font. Using built-in Helvetica. Error: {e}")
-        pdf.set_font("Helvetica", "", 10)
-        return False
-
 class MonthlyCompanyInvoicePDF(MyFPDF):
     def header(self):
         company_name, company_logo = get_company_settings()
@@ -228,7 +136,7 @@ class MonthlyCompanyInvoicePDF(MyFPDF):
             try:
                 logging.info(f"Attempting to load logo from: {company_logo}")
                 # Try to load the image with better error handling
-                self.image(company_logo, 10, 8, 33)
+                draw_logo(self, company_logo, 10, 8, 33)
                 self.ln(25)  # Add more space after logo
                 logging.info("Logo loaded successfully")
             except Exception as e:
@@ -239,16 +147,14 @@ class MonthlyCompanyInvoicePDF(MyFPDF):
             logging.info("No logo path provided")
             self.ln(10)
         
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "B", 15) if add_unicode_fonts(self) else self.set_font("Helvetica", "B", 15)
-        self.cell(0, 10, safe_text(company_name), 0, 1, "C")
+        use_font(self, "B", 15)
+        self.cell(0, 10, pdf_text(company_name), 0, 1, "C")
         self.cell(0, 10, "Monthly Company Invoice", 0, 1, "C")
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "I", 8) if add_unicode_fonts(self) else self.set_font("Helvetica", "I", 8)
+        use_font(self, "I", 8)
         self.cell(0, 10, f"Page {self.page_no()}", 0, 0, "C")
 
 class MyCompanyInvoicePDF(MyFPDF):
@@ -260,7 +166,7 @@ class MyCompanyInvoicePDF(MyFPDF):
             try:
                 logging.info(f"Attempting to load logo from: {company_logo}")
                 # Try to load the image with better error handling
-                self.image(company_logo, 10, 8, 33)
+                draw_logo(self, company_logo, 10, 8, 33)
                 self.ln(25)  # Add more space after logo
                 logging.info("Logo loaded successfully")
             except Exception as e:
@@ -271,16 +177,14 @@ class MyCompanyInvoicePDF(MyFPDF):
             logging.info("No logo path provided")
             self.ln(10)
         
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "B", 15) if add_unicode_fonts(self) else self.set_font("Helvetica", "B", 15)
-        self.cell(0, 10, safe_text(company_name), 0, 1, "C")
+        use_font(self, "B", 15)
+        self.cell(0, 10, pdf_text(company_name), 0, 1, "C")
         self.cell(0, 10, "My Company Invoice (Internal Report)", 0, 1, "C")
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "I", 8) if add_unicode_fonts(self) else self.set_font("Helvetica", "I", 8)
+        use_font(self, "I", 8)
         self.cell(0, 10, f"Page {self.page_no()}", 0, 0, "C")
 
 class ClientDetailedInvoicePDF(MyFPDF):
@@ -292,7 +196,7 @@ class ClientDetailedInvoicePDF(MyFPDF):
             try:
                 logging.info(f"Attempting to load logo from: {company_logo}")
                 # Try to load the image with better error handling
-                self.image(company_logo, 10, 8, 33)
+                draw_logo(self, company_logo, 10, 8, 33)
                 self.ln(25)  # Add more space after logo
                 logging.info("Logo loaded successfully")
             except Exception as e:
@@ -303,61 +207,78 @@ class ClientDetailedInvoicePDF(MyFPDF):
             logging.info("No logo path provided")
             self.ln(10)
         
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "B", 15) if add_unicode_fonts(self) else self.set_font("Helvetica", "B", 15)
-        self.cell(0, 10, safe_text(company_name), 0, 1, "C")
+        use_font(self, "B", 15)
+        self.cell(0, 10, pdf_text(company_name), 0, 1, "C")
         self.cell(0, 10, "Client Detailed Invoice", 0, 1, "C")
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "I", 8) if add_unicode_fonts(self) else self.set_font("Helvetica", "I", 8)
+        use_font(self, "I", 8)
         self.cell(0, 10, f"Page {self.page_no()}", 0, 0, "C")
 
 def generate_client_detailed_invoice_pdf(client_data):
     """Generate PDF for client detailed invoice (client-facing)"""
     pdf = ClientDetailedInvoicePDF()
-    add_unicode_fonts(pdf)
+    use_font(pdf)
     pdf.add_page()
-    
+    _draw_client_invoice(pdf, client_data)
+    return pdf
+
+def generate_company_statement_pdf(clients):
+    """One PDF with the detailed invoice of each client, a section and bookmark per client
+
+    The fonts, logo and Settings are loaded once for the whole pack instead of
+    once per client invoice.
+    """
+    pdf = ClientDetailedInvoicePDF()
+    use_font(pdf)
+    for client_data in clients:
+        pdf.add_page()
+        # Outline entry of the client, pointing at the first page of its invoice
+        pdf.start_section(client_data.get("clientName", "Unknown Client"))
+        _draw_client_invoice(pdf, client_data)
+    return pdf
+
+def _draw_client_invoice(pdf, client_data):
+    """Draw the detailed invoice of a client from the top of the current page"""
     # Serial Number - Display first
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     invoice_serial = client_data.get('invoiceSerial', f"INV-{datetime.now().strftime('%Y%m%d')}-{client_data.get('clientId', '001')}")
     pdf.cell(0, 10, f"Invoice Serial: {invoice_serial}", 0, 1, "L")
     pdf.ln(5)
     
     # Invoice details
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, f"Invoice Date: {date.today().strftime('%Y-%m-%d')}", 0, 1, "L")
     pdf.ln(5)
     
     # Client information - Display client name only once at the top
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, f"Client: {safe_text(client_data.get('clientName', 'Unknown Client'))}", 0, 1, "L")
-    pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
-    pdf.cell(0, 8, f"Email: {safe_text(client_data.get('email', 'No email provided'))}", 0, 1, "L")
-    pdf.cell(0, 8, f"Arrival Date: {safe_text(client_data.get('arrivalDate', 'N/A'))}", 0, 1, "L")
+    use_font(pdf, "B", 14)
+    pdf.cell(0, 10, f"Client: {pdf_text(client_data.get('clientName', 'Unknown Client'))}", 0, 1, "L")
+    use_font(pdf, "", 10)
+    pdf.cell(0, 8, f"Email: {pdf_text(client_data.get('email', 'No email provided'))}", 0, 1, "L")
+    pdf.cell(0, 8, f"Arrival Date: {pdf_text(client_data.get('arrivalDate', 'N/A'))}", 0, 1, "L")
     pdf.ln(10)
     
     # Services breakdown
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     pdf.cell(0, 10, "Service Details", 0, 1, "C")
     pdf.ln(5)
     
     # Safely get services list
     services = client_data.get("services", [])
     if not services:
-        pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
+        use_font(pdf, "", 10)
         pdf.cell(0, 10, "No services found for this client.", 0, 1, "C")
-        return pdf
+        return
     
     # Separate tours/vehicles and hotels with safe access
     tours_vehicles = []
     hotels = []
     
     for service in services:
-        service_category = safe_get_text(service, "serviceCategory", "Unknown")
+        service_category = get_text(service, "serviceCategory", "Unknown")
         if service_category == "Tours and Car Rentals":
             tours_vehicles.append(service)
         elif service_category == "Hotels":
@@ -369,235 +290,136 @@ def generate_client_detailed_invoice_pdf(client_data):
     
     # Tours and Vehicle Rentals Summary
     if tours_vehicles:
-        pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+        use_font(pdf, "B", 12)
         pdf.cell(0, 10, "Tours and Car Rentals", 0, 1, "L")
-        pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
-        
-        # Smart table with auto-adjusting columns for tours (including start date for tours only)
-        pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
+        use_font(pdf, "", 10)
         
         # Check if any service is a tour to determine if we need the date column
-        has_tours = any(safe_get_text(service, "serviceType", "") == "Tour" for service in tours_vehicles)
+        has_tours = any(get_text(service, "serviceType", "") == "Tour" for service in tours_vehicles)
         
         if has_tours:
-            # Table with tour start date column
-            pdf.cell(80, 8, "Service", 1, 0, "C")
-            pdf.cell(40, 8, "Date", 1, 0, "C")
-            pdf.cell(40, 8, "Total Price", 1, 1, "C")
-            
-            pdf.set_font("NotoArabic", "", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 9)
-            for service in tours_vehicles:
-                service_name = safe_get_text(service, "serviceName", "Unknown Service", 35)
-                pdf.cell(80, 6, service_name, 1, 0, "L")
-                
-                # Show start date only for tours
-                if safe_get_text(service, "serviceType", "") == "Tour":
-                    start_date = safe_get_text(service, "startDate", "N/A")
-                    pdf.cell(40, 6, start_date, 1, 0, "C")
-                else:
-                    pdf.cell(40, 6, "-", 1, 0, "C")
-                
-                price = service.get('totalSellingPrice', 0)
-                pdf.cell(40, 6, f"${price:.2f}", 1, 1, "R")
+            # Table with tour start date column (shown for tours only)
+            columns = [Column("Service", min_width=80, max_width=110), Column("Date", "C", width=40), Column("Total Price", "R", width=40)]
+            rows = (
+                (
+                    get_text(service, "serviceName", "Unknown Service"),
+                    get_text(service, "startDate", "N/A") if get_text(service, "serviceType", "") == "Tour" else "-",
+                    f"${service.get('totalSellingPrice', 0):.2f}"
+                )
+                for service in tours_vehicles
+            )
         else:
             # Simple table without date column for non-tour services
-            pdf.cell(120, 8, "Service", 1, 0, "C")
-            pdf.cell(40, 8, "Total Price", 1, 1, "C")
-            
-            pdf.set_font("NotoArabic", "", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 9)
-            for service in tours_vehicles:
-                service_name = safe_get_text(service, "serviceName", "Unknown Service", 50)
-                pdf.cell(120, 6, service_name, 1, 0, "L")
-                price = service.get('totalSellingPrice', 0)
-                pdf.cell(40, 6, f"${price:.2f}", 1, 1, "R")
+            columns = [Column("Service", min_width=120, max_width=150), Column("Total Price", "R", width=40)]
+            rows = (
+                (get_text(service, "serviceName", "Unknown Service"), f"${service.get('totalSellingPrice', 0):.2f}")
+                for service in tours_vehicles
+            )
+        table = draw_table(pdf, columns, rows)
         
         # Tours subtotal
-        pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
-        if has_tours:
-            pdf.cell(120, 8, "Tours/Vehicles Total", 1, 0, "R")
-            pdf.cell(40, 8, f"${tours_total:.2f}", 1, 1, "R")
-        else:
-            pdf.cell(120, 8, "Tours/Vehicles Total", 1, 0, "R")
-            pdf.cell(40, 8, f"${tours_total:.2f}", 1, 1, "R")
+        table.row(
+            ["Tours/Vehicles Total", f"${tours_total:.2f}"],
+            style="B", height=8, spans=[len(columns) - 1, 1], aligns=["R", "R"]
+        )
         pdf.ln(5)
     
     # Hotels Summary
     if hotels:
-        pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+        use_font(pdf, "B", 12)
         pdf.cell(0, 10, "Hotels/Bungaloves", 0, 1, "L")
-        pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
-        
-        # Smart table with auto-adjusting columns for hotels
-        pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
-        
-        # Calculate optimal column widths based on content with safe access
-        max_hotel_name_length = 20  # Default minimum
-        max_city_length = 10  # Default minimum
-        
-        for service in hotels:
-            hotel_name = safe_get_text(service, "hotelName", safe_get_text(service, "serviceName", "Unknown"), 35)
-            hotel_city = safe_get_text(service, "hotelCity", "N/A", 20)
-            
-            max_hotel_name_length = max(max_hotel_name_length, len(hotel_name))
-            max_city_length = max(max_city_length, len(hotel_city))
-        
-        # Adjust column widths based on content
-        hotel_col_width = min(max(60, max_hotel_name_length * 2), 90)
-        city_col_width = min(max(30, max_city_length * 2), 50)
-        price_col_width = 40
-        
-        # Ensure total width doesn't exceed page width (160 is safe margin)
-        total_width = hotel_col_width + city_col_width + price_col_width
-        if total_width > 160:
-            ratio = 160 / total_width
-            hotel_col_width = int(hotel_col_width * ratio)
-            city_col_width = int(city_col_width * ratio)
-            price_col_width = 160 - hotel_col_width - city_col_width
         
-        pdf.cell(hotel_col_width, 8, "Name", 1, 0, "C")
-        pdf.cell(city_col_width, 8, "City", 1, 0, "C")
-        pdf.cell(price_col_width, 8, "Total Price", 1, 1, "C")
-        
-        pdf.set_font("NotoArabic", "", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 9)
-        for service in hotels:
-            hotel_name = safe_get_text(service, "hotelName", safe_get_text(service, "serviceName", "Unknown"), 35)
-            hotel_city = safe_get_text(service, "hotelCity", "N/A", 20)
-            price = service.get('totalSellingPrice', 0)
-            
-            pdf.cell(hotel_col_width, 6, hotel_name, 1, 0, "L")
-            pdf.cell(city_col_width, 6, hotel_city, 1, 0, "L")
-            pdf.cell(price_col_width, 6, f"${price:.2f}", 1, 1, "R")
+        # Name and city columns sized to their content
+        table = draw_table(pdf, [
+            Column("Name", min_width=60, max_width=90),
+            Column("City", min_width=30, max_width=50),
+            Column("Total Price", "R", width=40),
+        ], (
+            (
+                get_text(service, "hotelName", get_text(service, "serviceName", "Unknown")),
+                get_text(service, "hotelCity", "N/A"),
+                f"${service.get('totalSellingPrice', 0):.2f}"
+            )
+            for service in hotels
+        ))
         
         # Hotels subtotal
-        pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(hotel_col_width + city_col_width, 8, "Hotels Total", 1, 0, "R")
-        pdf.cell(price_col_width, 8, f"${hotels_total:.2f}", 1, 1, "R")
+        table.row(["Hotels Total", f"${hotels_total:.2f}"], style="B", height=8, spans=[2, 1], aligns=["R", "R"])
         pdf.ln(5)
     
     # Grand Total
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     total_price = client_data.get('totalSellingPrice', 0)
     pdf.cell(120, 10, "Total Amount", 1, 0, "R")
     pdf.cell(40, 10, f"${total_price:.2f}", 1, 1, "R")
-    
-    return pdf
 
 def generate_monthly_company_invoice_pdf(monthly_invoice):
     """Generate PDF for monthly company invoice (partner company)"""
     pdf = MonthlyCompanyInvoicePDF()
-    add_unicode_fonts(pdf)
+    use_font(pdf)
     pdf.add_page()
     
     # Serial Number - Display first
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     invoice_serial = f"COMP-{monthly_invoice.invoiceDate.strftime('%Y%m')}-{monthly_invoice.id}"
     pdf.cell(0, 10, f"Invoice Serial: {invoice_serial}", 0, 1, "L")
     pdf.ln(5)
     
     # Invoice details
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, f"Invoice Date: {monthly_invoice.invoiceDate.strftime('%Y-%m-%d')}", 0, 1, "L")
-    pdf.cell(0, 10, f"Period: {safe_get_text(monthly_invoice, 'invoice_period', 'N/A')}", 0, 1, "L")
+    pdf.cell(0, 10, pdf_text(f"Period: {get_text(monthly_invoice, 'invoice_period', 'N/A')}"), 0, 1, "L")
     pdf.cell(0, 10, f"Invoice ID: {monthly_invoice.id}", 0, 1, "L")
     pdf.ln(5)
     
     # Company information with safe access
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, "Company Information:", 0, 1, "L")
-    pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
+    use_font(pdf, "", 10)
     
-    company_name = safe_get_text(monthly_invoice.company, 'name', 'Unknown Company') if monthly_invoice.company else 'Unknown Company'
-    contact_person = safe_get_text(monthly_invoice.company, 'contactPerson', 'N/A') if monthly_invoice.company else 'N/A'
-    email = safe_get_text(monthly_invoice.company, 'email', 'N/A') if monthly_invoice.company else 'N/A'
+    company_name = get_text(monthly_invoice.company, 'name', 'Unknown Company') if monthly_invoice.company else 'Unknown Company'
+    contact_person = get_text(monthly_invoice.company, 'contactPerson', 'N/A') if monthly_invoice.company else 'N/A'
+    email = get_text(monthly_invoice.company, 'email', 'N/A') if monthly_invoice.company else 'N/A'
     
-    pdf.cell(0, 8, f"Company: {company_name}", 0, 1, "L")
-    pdf.cell(0, 8, f"Contact Person: {contact_person}", 0, 1, "L")
-    pdf.cell(0, 8, f"Email: {email}", 0, 1, "L")
+    pdf.cell(0, 8, pdf_text(f"Company: {company_name}"), 0, 1, "L")
+    pdf.cell(0, 8, pdf_text(f"Contact Person: {contact_person}"), 0, 1, "L")
+    pdf.cell(0, 8, pdf_text(f"Email: {email}"), 0, 1, "L")
     pdf.ln(10)
     
     # Services breakdown grouped by client
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     pdf.cell(0, 10, "Service Summary by Client", 0, 1, "C")
     pdf.ln(5)
     
-    # Group items by client with safe access
-    client_groups = {}
-    for item in monthly_invoice.invoice_items:
-        client_name = safe_get_text(item, 'client_name', 'Unknown Client')
-        if client_name not in client_groups:
-            client_groups[client_name] = {
-                'tours_total': 0,
-                'hotels_total': 0,
-                'arrival_date': getattr(item, 'service_date', None)
-            }
-        
-        service_type = safe_get_text(item, 'service_type', '')
-        selling_price = getattr(item, 'selling_price', 0) or 0
-        
-        if service_type in ["Tour", "Vehicle"]:
-            client_groups[client_name]['tours_total'] += selling_price
-        elif service_type == "Hotel":
-            client_groups[client_name]['hotels_total'] += selling_price
-    
-    # Smart table with auto-adjusting columns
-    pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
-    
-    # Calculate optimal column widths with safe access
-    max_client_name_length = 20  # Default minimum
-    for client_name in client_groups.keys():
-        max_client_name_length = max(max_client_name_length, len(str(client_name)[:30]))
-    
-    client_col_width = min(max(50, max_client_name_length * 2), 70)
-    date_col_width = 35
-    tours_col_width = 35
-    hotels_col_width = 35
-    
-    # Ensure total width fits
-    total_width = client_col_width + date_col_width + tours_col_width + hotels_col_width
-    if total_width > 160:
-        ratio = 160 / total_width
-        client_col_width = int(client_col_width * ratio)
-        date_col_width = int(date_col_width * ratio)
-        tours_col_width = int(tours_col_width * ratio)
-        hotels_col_width = 160 - client_col_width - date_col_width - tours_col_width
-    
-    pdf.cell(client_col_width, 8, "Client", 1, 0, "C")
-    pdf.cell(date_col_width, 8, "Arrival Date", 1, 0, "C")
-    pdf.cell(tours_col_width, 8, "Tours/Vehicles", 1, 0, "C")
-    pdf.cell(hotels_col_width, 8, "Hotels", 1, 1, "C")
-    
-    pdf.set_font("NotoArabic", "", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 9)
-    
-    total_tours = 0
-    total_hotels = 0
-    
-    for client_name, data in client_groups.items():
-        safe_client_name = safe_text(str(client_name)[:30])
-        pdf.cell(client_col_width, 6, safe_client_name, 1, 0, "L")
-        
-        arrival_date = "N/A"
-        if data['arrival_date']:
-            try:
-                arrival_date = data['arrival_date'].strftime('%Y-%m-%d')
-            except:
-                arrival_date = str(data['arrival_date'])[:10]
-        
-        pdf.cell(date_col_width, 6, arrival_date, 1, 0, "C")
-        pdf.cell(tours_col_width, 6, f"${data['tours_total']:.2f}", 1, 0, "R")
-        pdf.cell(hotels_col_width, 6, f"${data['hotels_total']:.2f}", 1, 1, "R")
-        
-        total_tours += data['tours_total']
-        total_hotels += data['hotels_total']
+    # One row per client, summed in SQL and drawn as the rows stream in
+    totals = {"tours": 0.0, "hotels": 0.0}
+    def client_rows():
+        for client in reports.monthly_invoice_client_totals(monthly_invoice.id):
+            totals["tours"] += client.toursSelling
+            totals["hotels"] += client.hotelsSelling
+            yield (
+                client.clientName,
+                client.arrivalDate.strftime('%Y-%m-%d') if client.arrivalDate else "N/A",
+                f"${client.toursSelling:.2f}",
+                f"${client.hotelsSelling:.2f}"
+            )
+    
+    table = draw_table(pdf, [
+        Column("Client", min_width=50, max_width=90),
+        Column("Arrival Date", "C", width=35),
+        Column("Tours/Vehicles", "R", width=35),
+        Column("Hotels", "R", width=35),
+    ], client_rows())
     
     # Totals
-    pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
-    pdf.cell(client_col_width + date_col_width, 8, "TOTALS", 1, 0, "R")
-    pdf.cell(tours_col_width, 8, f"${total_tours:.2f}", 1, 0, "R")
-    pdf.cell(hotels_col_width, 8, f"${total_hotels:.2f}", 1, 1, "R")
+    table.row(
+        ["TOTALS", f"${totals['tours']:.2f}", f"${totals['hotels']:.2f}"],
+        style="B", height=8, spans=[2, 1, 1], aligns=["R", "R", "R"]
+    )
     
     # Grand Total
     pdf.ln(5)
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     total_amount = getattr(monthly_invoice, 'totalAmount', 0) or 0
     pdf.cell(120, 10, "Total Amount", 1, 0, "R")
     pdf.cell(40, 10, f"${total_amount:.2f}", 1, 1, "R")
@@ -607,111 +429,75 @@ def generate_monthly_company_invoice_pdf(monthly_invoice):
 def generate_my_company_invoice_pdf(monthly_invoice):
     """Generate PDF for my company invoice with cost, selling price, and profit breakdown"""
     pdf = MyCompanyInvoicePDF()
-    add_unicode_fonts(pdf)
+    use_font(pdf)
     pdf.add_page()
     
     # Serial Number - Display first
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     invoice_serial = f"INT-{monthly_invoice.invoiceDate.strftime('%Y%m')}-{monthly_invoice.id}"
     pdf.cell(0, 10, f"Invoice Serial: {invoice_serial}", 0, 1, "L")
     pdf.ln(5)
     
     # Invoice details
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, f"Invoice Date: {monthly_invoice.invoiceDate.strftime('%Y-%m-%d')}", 0, 1, "L")
-    pdf.cell(0, 10, f"Period: {safe_get_text(monthly_invoice, 'invoice_period', 'N/A')}", 0, 1, "L")
+    pdf.cell(0, 10, pdf_text(f"Period: {get_text(monthly_invoice, 'invoice_period', 'N/A')}"), 0, 1, "L")
     pdf.cell(0, 10, f"Invoice ID: {monthly_invoice.id}", 0, 1, "L")
     pdf.ln(5)
     
     # Company information with safe access
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, "Company Information:", 0, 1, "L")
-    pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
+    use_font(pdf, "", 10)
     
-    company_name = safe_get_text(monthly_invoice.company, 'name', 'Unknown Company') if monthly_invoice.company else 'Unknown Company'
-    contact_person = safe_get_text(monthly_invoice.company, 'contactPerson', 'N/A') if monthly_invoice.company else 'N/A'
-    email = safe_get_text(monthly_invoice.company, 'email', 'N/A') if monthly_invoice.company else 'N/A'
+    company_name = get_text(monthly_invoice.company, 'name', 'Unknown Company') if monthly_invoice.company else 'Unknown Company'
+    contact_person = get_text(monthly_invoice.company, 'contactPerson', 'N/A') if monthly_invoice.company else 'N/A'
+    email = get_text(monthly_invoice.company, 'email', 'N/A') if monthly_invoice.company else 'N/A'
     
-    pdf.cell(0, 8, f"Company: {company_name}", 0, 1, "L")
-    pdf.cell(0, 8, f"Contact Person: {contact_person}", 0, 1, "L")
-    pdf.cell(0, 8, f"Email: {email}", 0, 1, "L")
+    pdf.cell(0, 8, pdf_text(f"Company: {company_name}"), 0, 1, "L")
+    pdf.cell(0, 8, pdf_text(f"Contact Person: {contact_person}"), 0, 1, "L")
+    pdf.cell(0, 8, pdf_text(f"Email: {email}"), 0, 1, "L")
     pdf.ln(10)
     
     # Services breakdown grouped by client with cost analysis
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
+    use_font(pdf, "B", 14)
     pdf.cell(0, 10, "Cost Analysis Summary by Client", 0, 1, "C")
     pdf.ln(5)
     
-    # Group items by client with safe access
-    client_groups = {}
-    for item in monthly_invoice.invoice_items:
-        client_name = safe_get_text(item, 'client_name', 'Unknown Client')
-        if client_name not in client_groups:
-            client_groups[client_name] = {
-                'tours_cost': 0,
-                'tours_sale': 0,
-                'hotels_cost': 0,
-                'hotels_sale': 0,
-                'arrival_date': getattr(item, 'service_date', None)
-            }
-        
-        service_type = safe_get_text(item, 'service_type', '')
-        cost_price = getattr(item, 'cost_price', 0) or 0
-        selling_price = getattr(item, 'selling_price', 0) or 0
-        
-        if service_type in ["Tour", "Vehicle"]:
-            client_groups[client_name]['tours_cost'] += cost_price
-            client_groups[client_name]['tours_sale'] += selling_price
-        elif service_type == "Hotel":
-            client_groups[client_name]['hotels_cost'] += cost_price
-            client_groups[client_name]['hotels_sale'] += selling_price
-    
-    # Create summary table
-    pdf.set_font("NotoArabic", "B", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 9)
-    pdf.cell(50, 8, "Client Name", 1, 0, "C")
-    pdf.cell(25, 8, "Arrival Date", 1, 0, "C")
-    pdf.cell(30, 8, "Tours Cost", 1, 0, "C")
-    pdf.cell(30, 8, "Hotels Cost", 1, 0, "C")
-    pdf.cell(35, 8, "Total Profit", 1, 1, "C")
-    
-    pdf.set_font("NotoArabic", "", 8) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 8)
-    total_tours_cost = 0
-    total_hotels_cost = 0
-    total_profit = 0
-    
-    for client_name, totals in client_groups.items():
-        client_profit = (totals['tours_sale'] - totals['tours_cost']) + (totals['hotels_sale'] - totals['hotels_cost'])
-        
-        safe_client_name = safe_text(str(client_name)[:25])
-        pdf.cell(50, 6, safe_client_name, 1, 0, "L")
-        
-        arrival_date = "N/A"
-        if totals['arrival_date']:
-            try:
-                arrival_date = totals['arrival_date'].strftime('%Y-%m-%d')
-            except:
-                arrival_date = str(totals['arrival_date'])[:10]
-        
-        pdf.cell(25, 6, arrival_date, 1, 0, "C")
-        pdf.cell(30, 6, f"${totals['tours_cost']:.2f}", 1, 0, "R")
-        pdf.cell(30, 6, f"${totals['hotels_cost']:.2f}", 1, 0, "R")
-        pdf.cell(35, 6, f"${client_profit:.2f}", 1, 1, "R")
-        
-        total_tours_cost += totals['tours_cost']
-        total_hotels_cost += totals['hotels_cost']
-        total_profit += client_profit
+    # One row per client, summed in SQL and drawn as the rows stream in
+    totals = {"tours_cost": 0.0, "hotels_cost": 0.0, "profit": 0.0}
+    def client_rows():
+        for client in reports.monthly_invoice_client_totals(monthly_invoice.id):
+            client_profit = (client.toursSelling - client.toursCost) + (client.hotelsSelling - client.hotelsCost)
+            totals["tours_cost"] += client.toursCost
+            totals["hotels_cost"] += client.hotelsCost
+            totals["profit"] += client_profit
+            yield (
+                client.clientName,
+                client.arrivalDate.strftime('%Y-%m-%d') if client.arrivalDate else "N/A",
+                f"${client.toursCost:.2f}",
+                f"${client.hotelsCost:.2f}",
+                f"${client_profit:.2f}"
+            )
+    
+    table = draw_table(pdf, [
+        Column("Client Name", min_width=50, max_width=80),
+        Column("Arrival Date", "C", width=25),
+        Column("Tours Cost", "R", width=30),
+        Column("Hotels Cost", "R", width=30),
+        Column("Total Profit", "R", width=35),
+    ], client_rows(), font_size=8, header_font_size=9)
     
     # Totals row
-    pdf.set_font("NotoArabic", "B", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 9)
-    pdf.cell(75, 8, "TOTALS", 1, 0, "R")
-    pdf.cell(30, 8, f"${total_tours_cost:.2f}", 1, 0, "R")
-    pdf.cell(30, 8, f"${total_hotels_cost:.2f}", 1, 0, "R")
-    pdf.cell(35, 8, f"${total_profit:.2f}", 1, 1, "R")
+    table.row(
+        ["TOTALS", f"${totals['tours_cost']:.2f}", f"${totals['hotels_cost']:.2f}", f"${totals['profit']:.2f}"],
+        style="B", height=8, spans=[2, 1, 1, 1], aligns=["R", "R", "R", "R"]
+    )
     
     # Summary section
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, "Financial Summary", 0, 1, "L")
-    pdf.set_font("NotoArabic", "", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 10)
+    use_font(pdf, "", 10)
     
     total_cost = getattr(monthly_invoice, 'totalCost', 0) or 0
     total_amount = getattr(monthly_invoice, 'totalAmount', 0) or 0
@@ -723,69 +509,53 @@ def generate_my_company_invoice_pdf(monthly_invoice):
     
     return pdf
 
+def _ledger_row(entry):
+    """GET /invoices item of an invoice ledger row (see InvoiceLedger)"""
+    monthly = entry.source == LEDGER_MONTHLY_INVOICE
+    return {
+        "id": f"monthly_{entry.invoice_id}" if monthly else entry.invoice_id,
+        "client": safe_text(entry.party) or ("Unknown Company" if monthly else "Unknown"),
+        "service": safe_text(entry.serviceSummary),
+        "type": entry.invoiceType or "unknown",
+        "status": entry.status or ("completed" if monthly else "unknown"),
+        "date": entry.invoiceDate.strftime("%Y-%m-%d") if entry.invoiceDate else "N/A",
+        "amount": float(entry.totalAmount or 0),
+        "pdfPath": entry.pdfPath or ""
+    }
+
+def _invoice_ledger_query():
+    """Invoice ledger rows matching the GET /invoices filters
+
+    Filters: status, type (monthly company invoices are type "company"),
+    companyId and from/to on the invoice date.
+    """
+    query = InvoiceLedger.query.filter(date_range_filter(InvoiceLedger.invoiceDate))
+    statuses = list_arg("status")
+    if statuses:
+        query = query.filter(InvoiceLedger.status.in_(statuses))
+    types = list_arg("type")
+    if types:
+        query = query.filter(InvoiceLedger.invoiceType.in_(types))
+    company_id = request.args.get("companyId", type=int)
+    if company_id:
+        query = query.filter(InvoiceLedger.company_id == company_id)
+    return query
+
 @invoices_bp.route("/invoices", methods=["GET"])
+@query_budget(1)
 def get_invoices():
+    """Invoices and monthly company invoices, newest first, read from the invoice ledger in one query"""
     try:
-        # Get regular invoices
-        invoices = Invoice.query.all()
-        regular_invoices = []
-        
-        for invoice in invoices:
-            booking = invoice.booking
-            client_name = "Unknown"
-            if booking and booking.client_ref:
-                first_name = safe_get_text(booking.client_ref, 'firstName', '')
-                last_name = safe_get_text(booking.client_ref, 'lastName', '')
-                client_name = f"{first_name} {last_name}".strip()
-                if not client_name:
-                    client_name = "Unknown"
-            
-            # Get service names from booking with safe access
-            service_names = []
-            if booking and booking.services:
-                for service in booking.services:
-                    service_name = safe_get_text(service, 'serviceName', 'Unknown Service')
-                    service_names.append(service_name)
-            
-            service_name = ", ".join(service_names[:2]) if service_names else "No services"
-            if len(service_names) > 2:
-                service_name += f" (+{len(service_names) - 2} more)"
-            
-            regular_invoices.append({
-                "id": invoice.id,
-                "client": client_name,
-                "service": service_name,
-                "type": safe_get_text(invoice, 'invoiceType', 'unknown'),
-                "status": safe_get_text(invoice, 'status', 'unknown'),
-                "date": invoice.invoiceDate.strftime("%Y-%m-%d") if invoice.invoiceDate else "N/A",
-                "amount": float(getattr(invoice, 'totalAmount', 0) or 0),
-                "pdfPath": safe_get_text(invoice, 'pdfPath', '')
-            })
-        
-        # Get monthly company invoices with safe access
-        monthly_invoices = MonthlyCompanyInvoice.query.all()
-        logging.info(f"Found {len(monthly_invoices)} monthly company invoices")
-        
-        for monthly_invoice in monthly_invoices:
-            # Ensure status is not None or empty
-            status = safe_get_text(monthly_invoice, 'status', 'completed')
-            company_name = safe_get_text(monthly_invoice.company, 'name', 'Unknown Company') if monthly_invoice.company else 'Unknown Company'
-            invoice_period = safe_get_text(monthly_invoice, 'invoice_period', 'N/A')
-            
-            regular_invoices.append({
-                "id": f"monthly_{monthly_invoice.id}",
-                "client": company_name,
-                "service": f"Monthly Invoice - {invoice_period}",
-                "type": "company",
-                "status": status,
-                "date": monthly_invoice.invoiceDate.strftime("%Y-%m-%d") if monthly_invoice.invoiceDate else "N/A",
-                "amount": float(getattr(monthly_invoice, 'totalAmount', 0) or 0),
-                "pdfPath": safe_get_text(monthly_invoice, 'pdfPath', '')
-            })
-            
-            logging.info(f"Added monthly invoice {monthly_invoice.id} with status: {status}")
-        
-        return jsonify(regular_invoices)
+        query = _invoice_ledger_query()
+        if not wants_full_list():
+            entries, next_cursor = keyset_page(query, INVOICE_SORTS, "-date")
+            return jsonify(page_response([_ledger_row(entry) for entry in entries], next_cursor))
+        
+        # Old array order: invoices, then monthly company invoices
+        entries = query.order_by(InvoiceLedger.source, InvoiceLedger.invoice_id).all()
+        return jsonify([_ledger_row(entry) for entry in entries])
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f"Error fetching invoices: {e}")
         return jsonify({"error": "Failed to fetch invoices", "details": str(e)}), 500
@@ -799,11 +569,271 @@ def get_monthly_company_invoices():
         logging.error(f"Error fetching monthly company invoices: {e}")
         return jsonify({"error": "Failed to fetch monthly company invoices", "details": str(e)}), 500
 
+def _monthly_invoice_item_values(service):
+    """Column values of the MonthlyInvoiceItem listing a service"""
+    service_selling_price = getattr(service, 'totalSellingPrice', 0) or 0
+    service_cost = getattr(service, 'totalCost', 0) or 0
+    service_profit = getattr(service, 'profit', 0) or 0
+
+    # Determine nights_or_hours and hotel_or_tour_name with safe access
+    nights_or_hours = None
+    hotel_or_tour_name = None
+    service_type = get_text(service, 'serviceType', 'Unknown')
+    
+    if service_type == "Hotel":
+        num_nights = getattr(service, 'numNights', None)
+        nights_or_hours = f"{num_nights} Nights" if num_nights else None
+        hotel_or_tour_name = get_text(service, 'hotelName', 'Unknown Hotel')
+    elif service_type in ["Tour", "Vehicle"]:
+        is_hourly = getattr(service, 'is_hourly', False)
+        hours = getattr(service, 'hours', None)
+        
+        if is_hourly and hours:
+            nights_or_hours = f"{hours} Hours"
+        else:
+            # For tours/vehicles not hourly, show single date if start and end are same
+            start_date = getattr(service, 'startDate', None)
+            end_date = getattr(service, 'endDate', None)
+            
+            if start_date and end_date:
+                if start_date.strftime('%Y-%m-%d') == end_date.strftime('%Y-%m-%d'):
+                    nights_or_hours = start_date.strftime('%Y-%m-%d')
+                else:
+                    nights_or_hours = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
+        
+        hotel_or_tour_name = get_text(service, 'serviceName', 'Unknown Service')
+
+    # Safe access to client information
+    client_first_name = ""
+    client_last_name = ""
+    if service.booking_ref and service.booking_ref.client_ref:
+        client_first_name = get_text(service.booking_ref.client_ref, 'firstName', '')
+        client_last_name = get_text(service.booking_ref.client_ref, 'lastName', '')
+    
+    client_name = f"{client_first_name} {client_last_name}".strip()
+    if not client_name:
+        client_name = "Unknown Client"
+
+    return {
+        "service_id": service.id,
+        "client_name": client_name,
+        "service_name": get_text(service, 'serviceName', 'Unknown Service'),
+        "service_type": service_type,
+        "service_date": getattr(service, 'startDate', None),
+        "selling_price": service_selling_price,
+        "cost_price": service_cost,
+        "profit": service_profit,
+        "nights_or_hours": nights_or_hours,
+        "hotel_or_tour_name": hotel_or_tour_name
+    }
+
+def _monthly_invoice_services(company_id, month, year, service_ids=None):
+    """Services of a company's clients starting in a month (only service_ids, when given), with their booking and client loaded"""
+    query = db.session.query(Service).join(Booking, Service.booking_id == Booking.id).join(
+        Client, Booking.client_id == Client.id
+    ).options(
+        contains_eager(Service.booking_ref).contains_eager(Booking.client_ref)
+    ).filter(
+        Client.company_id == company_id,
+        in_month(Service.startDate, month, year)
+    )
+    if service_ids is not None:
+        query = query.filter(Service.id.in_(service_ids))
+    return query.order_by(Service.id).all()
+
+def _save_monthly_invoice_pdf(monthly_invoice, company_name, progress=no_progress):
+    """Render and write the PDF of a monthly invoice and set its pdfPath; returns the file name or None"""
+    pdf_output = None
+    if monthly_invoice.invoiceType == "partner_company":
+        pdf_output = generate_monthly_company_invoice_pdf(monthly_invoice)
+    elif monthly_invoice.invoiceType == "my_company":
+        pdf_output = generate_my_company_invoice_pdf(monthly_invoice)
+    if not pdf_output:
+        return None
+
+    # Use safe_text for filename to avoid encoding issues
+    company_name_safe = safe_text(company_name).replace(" ", "_")
+    pdf_filename = (
+        f"monthly_invoice_{company_name_safe}_{monthly_invoice.invoice_month}_{monthly_invoice.invoice_year}_"
+        f"{monthly_invoice.invoiceType}.pdf"
+    )
+    pdf_path = os.path.join(os.path.dirname(__file__), "invoices", pdf_filename)
+    # Ensure the invoices directory exists
+    os.makedirs(os.path.join(os.path.dirname(__file__), "invoices"), exist_ok=True)
+    progress(90, "Saving PDF")
+    pdf_output.output(pdf_path)
+    monthly_invoice.pdfPath = f"/api/invoices/download/{pdf_filename}"
+    logging.info(f"Monthly invoice PDF generated: {pdf_filename}")
+    return pdf_filename
+
+class InvoiceDocument(NamedTuple):
+    name: str  # File name without the content hash
+    key: str  # Render cache key, see src/pdf/render_cache.py
+    render: Callable  # Returns the FPDF
+    details: dict  # What the generate handler records besides the PDF
+    preview: Callable  # Returns the HTML preview, see src/previews.py
+
+class InvoiceNotRendered(Exception):
+    """Raised while collecting an invoice's data with the response to give instead of a PDF"""
+    def __init__(self, body, status):
+        super().__init__(body.get("error") or body.get("message"))
+        self.body = body
+        self.status = status
+
+def _inline_pdf(job_type, data):
+    """The PDF itself as the response, rendered into memory
+
+    Nothing is written on the way: a PDF already in the render cache is sent
+    from there, otherwise the rendered bytes are sent from the buffer and, with
+    persist, stored in the render cache once the response has gone out.
+    """
+    try:
+        document = INLINE_DOCUMENTS[job_type](data)
+        stored = render_cache.cache.lookup(document.name, document.key)
+        pdf_bytes = render_cache.cache.read(stored) if stored else bytes(document.render().output())
+    except InvoiceNotRendered as e:
+        return jsonify(e.body), e.status
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error rendering {job_type} invoice: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    filename = render_cache.cache.filename(document.name, document.key)
+    response = Response(pdf_bytes, mimetype="application/pdf")
+    response.content_length = len(pdf_bytes)
+    response.headers.set("Content-Disposition", "inline", filename=safe_text(filename))
+    response.headers["X-Render-Cache"] = "hit" if stored else "miss"
+    if not stored and request_flag(data, "persist"):
+        def persist():
+            try:
+                render_cache.cache.store(document.name, document.key, pdf_bytes)
+            except Exception as e:
+                logging.warning(f"Could not store rendered invoice {filename}: {e}")
+        response.call_on_close(persist)
+    return response
+
+def _html_preview(job_type, data):
+    """The HTML preview of an invoice, drawn from the data its PDF is rendered from"""
+    try:
+        html = INLINE_DOCUMENTS[job_type](data).preview()
+    except InvoiceNotRendered as e:
+        return jsonify(e.body), e.status
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error previewing {job_type} invoice: {e}")
+        return jsonify({"error": str(e)}), 500
+    return Response(html, mimetype="text/html")
+
+def _preview_args():
+    """Query arguments of a preview request in the form of the generate endpoints' JSON body"""
+    return {key: request.args.get(key, type=int) for key in ("companyId", "month", "year") if key in request.args}
+
+def _generate_or_queue(job_type, data):
+    """Render the invoice in the request, or queue it when asked to run asynchronously"""
+    if job_type in INLINE_DOCUMENTS and request_flag(data, "inline"):
+        return _inline_pdf(job_type, data)
+    if not wants_async(data):
+        # Identical requests running at the same time share one generation
+        return single_flight_response(f"invoices.{job_type}", data, lambda: JOB_HANDLERS[job_type](data))
+    try:
+        job = enqueue_job(job_type, data)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error queuing {job_type} invoice job: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "message": "Invoice generation queued",
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": f"/api/invoices/jobs/{job.id}"
+    }), 202
+
+@invoices_bp.route("/invoices/jobs/<int:job_id>", methods=["GET"])
+def get_invoice_job(job_id):
+    """Status, progress and final pdfPath of a queued invoice job"""
+    try:
+        job = db.session.get(InvoiceJob, job_id)
+        if not job:
+            return jsonify({"error": "Invoice job not found"}), 404
+        return jsonify(job_to_dict(job))
+    except Exception as e:
+        logging.error(f"Error fetching invoice job {job_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@invoices_bp.route("/invoices/render-cache", methods=["GET"])
+def get_render_cache_stats():
+    """Hit/miss counters of the invoice PDF render cache (per worker process)"""
+    try:
+        return jsonify(render_cache.cache.stats())
+    except Exception as e:
+        logging.error(f"Error reading render cache stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# HTML previews (see src/previews.py); the query takes the fields of the generate request body
+@invoices_bp.route("/invoices/client/<int:client_id>/preview", methods=["GET"])
+def preview_client_invoice(client_id):
+    return _html_preview("client", dict(_preview_args(), clientId=client_id))
+
+@invoices_bp.route("/invoices/monthly-excel/preview", methods=["GET"])
+def preview_excel_like_monthly_invoice():
+    return _html_preview("monthly_excel", _preview_args())
+
+@invoices_bp.route("/invoices/my-company-detailed/preview", methods=["GET"])
+def preview_my_company_detailed_invoice():
+    return _html_preview("my_company_detailed", _preview_args())
+
+@invoices_bp.route("/invoices/monthly/<int:monthly_invoice_id>/preview", methods=["GET"])
+def preview_monthly_company_invoice(monthly_invoice_id):
+    """HTML preview of a stored monthly invoice (partner_company or my_company)"""
+    try:
+        monthly_invoice = db.session.get(MonthlyCompanyInvoice, monthly_invoice_id)
+        if not monthly_invoice:
+            return jsonify({"error": "Monthly invoice not found"}), 404
+        internal = monthly_invoice.invoiceType == "my_company"
+        html = previews.render(
+            "monthly_invoice.html",
+            title="My Company Invoice (Internal Report)" if internal else "Monthly Company Invoice",
+            company_name=get_company_settings()[0],
+            invoice=monthly_invoice,
+            invoice_serial=f"{'INT' if internal else 'COMP'}-{monthly_invoice.invoiceDate.strftime('%Y%m')}-{monthly_invoice.id}",
+            company=monthly_invoice.company,
+            internal=internal,
+            clients=reports.monthly_invoice_client_totals(monthly_invoice.id)
+        )
+        return Response(html, mimetype="text/html")
+    except Exception as e:
+        logging.error(f"Error previewing monthly invoice {monthly_invoice_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # Fix the route to match frontend expectations
 @invoices_bp.route("/invoices/monthly/generate", methods=["POST"])
 def generate_monthly_company_invoice():
+    return _generate_or_queue("monthly_company", request.get_json())
+
+def _existing_monthly_invoice(company_id, month, year, invoice_type):
+    """The 409 response for a monthly invoice that already exists, or None"""
+    existing_invoice = MonthlyCompanyInvoice.query.filter_by(
+        company_id=company_id,
+        invoice_month=month,
+        invoice_year=year,
+        invoiceType=invoice_type
+    ).first()
+    if not existing_invoice:
+        return None
+    logging.info(f"Invoice for company {company_id} and period {month}/{year} already exists.")
+    return {
+        "error": "Invoice for this company and period already exists",
+        "id": existing_invoice.id,
+        "stale": bool(existing_invoice.stale),
+        "refreshUrl": f"/api/invoices/monthly/{existing_invoice.id}/refresh"
+    }, 409
+
+@job_handler("monthly_company")
+def create_monthly_company_invoice(data, progress=no_progress):
+    """Build the monthly invoice rows of a company and render its PDF"""
     try:
-        data = request.get_json()
         company_id = data.get("companyId")
         month = data.get("month")
         year = data.get("year")
@@ -811,35 +841,28 @@ def generate_monthly_company_invoice():
     
         if not all([company_id, month, year]):
             logging.warning("Missing company ID, month, or year for monthly invoice generation.")
-            return jsonify({"error": "Company ID, month, and year are required"}), 400
+            return {"error": "Company ID, month, and year are required"}, 400
+        period_problem = period_error(month, year)
+        if period_problem:
+            return {"error": period_problem}, 400
 
         company = Company.query.get(company_id)
         if not company:
             logging.warning(f"Company with ID {company_id} not found.")
-            return jsonify({"error": "Company not found"}), 404
-
-        # Check if invoice for this company, month, and year already exists
-        existing_invoice = MonthlyCompanyInvoice.query.filter_by(
-            company_id=company_id,
-            invoice_month=month,
-            invoice_year=year
-        ).first()
+            return {"error": "Company not found"}, 404
 
+        # Check if invoice for this company, month, year and type already exists
+        existing_invoice = _existing_monthly_invoice(company_id, month, year, invoice_type)
         if existing_invoice:
-            logging.info(f"Invoice for company {company_id} and period {month}/{year} already exists.")
-            return jsonify({"error": "Invoice for this company and period already exists"}), 409
+            return existing_invoice
 
         # Fetch bookings for the specified company, month, and year
         # This assumes bookings have a service with a startDate
-        services = db.session.query(Service).join(Booking).join(Client).filter(
-            Client.company_id == company_id,
-            db.extract("month", Service.startDate) == month,
-            db.extract("year", Service.startDate) == year
-        ).all()
+        services = _monthly_invoice_services(company_id, month, year)
 
         if not services:
             logging.info(f"No services found for company {company_id} in {month}/{year}.")
-            return jsonify({"message": "No services found for this company in the specified period"}), 200
+            return {"message": "No services found for this company in the specified period"}, 200
 
         total_amount = 0.0
         total_cost = 0.0
@@ -847,66 +870,11 @@ def generate_monthly_company_invoice():
         invoice_items = []
 
         for service in services:
-            service_selling_price = getattr(service, 'totalSellingPrice', 0) or 0
-            service_cost = getattr(service, 'totalCost', 0) or 0
-            service_profit = getattr(service, 'profit', 0) or 0
-            
-            total_amount += service_selling_price
-            total_cost += service_cost
-            total_profit += service_profit
-
-            # Determine nights_or_hours and hotel_or_tour_name with safe access
-            nights_or_hours = None
-            hotel_or_tour_name = None
-            service_type = safe_get_text(service, 'serviceType', 'Unknown')
-            
-            if service_type == "Hotel":
-                num_nights = getattr(service, 'numNights', None)
-                nights_or_hours = f"{num_nights} Nights" if num_nights else None
-                hotel_or_tour_name = safe_get_text(service, 'hotelName', 'Unknown Hotel')
-            elif service_type in ["Tour", "Vehicle"]:
-                is_hourly = getattr(service, 'is_hourly', False)
-                hours = getattr(service, 'hours', None)
-                
-                if is_hourly and hours:
-                    nights_or_hours = f"{hours} Hours"
-                else:
-                    # For tours/vehicles not hourly, show single date if start and end are same
-                    start_date = getattr(service, 'startDate', None)
-                    end_date = getattr(service, 'endDate', None)
-                    
-                    if start_date and end_date:
-                        if start_date.strftime('%Y-%m-%d') == end_date.strftime('%Y-%m-%d'):
-                            nights_or_hours = start_date.strftime('%Y-%m-%d')
-                        else:
-                            nights_or_hours = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
-                
-                hotel_or_tour_name = safe_get_text(service, 'serviceName', 'Unknown Service')
-
-            # Safe access to client information
-            client_first_name = ""
-            client_last_name = ""
-            if service.booking_ref and service.booking_ref.client_ref:
-                client_first_name = safe_get_text(service.booking_ref.client_ref, 'firstName', '')
-                client_last_name = safe_get_text(service.booking_ref.client_ref, 'lastName', '')
-            
-            client_name = f"{client_first_name} {client_last_name}".strip()
-            if not client_name:
-                client_name = "Unknown Client"
-
-            invoice_item = MonthlyInvoiceItem(
-                service_id=service.id,
-                client_name=client_name,
-                service_name=safe_get_text(service, 'serviceName', 'Unknown Service'),
-                service_type=service_type,
-                service_date=getattr(service, 'startDate', None),
-                selling_price=service_selling_price,
-                cost_price=service_cost,
-                profit=service_profit,
-                nights_or_hours=nights_or_hours,
-                hotel_or_tour_name=hotel_or_tour_name
-            )
-            invoice_items.append(invoice_item)
+            item_values = _monthly_invoice_item_values(service)
+            total_amount += item_values["selling_price"]
+            total_cost += item_values["cost_price"]
+            total_profit += item_values["profit"]
+            invoice_items.append(MonthlyInvoiceItem(**item_values))
 
         new_monthly_invoice = MonthlyCompanyInvoice(
             company_id=company_id,
@@ -920,211 +888,733 @@ def generate_monthly_company_invoice():
             status="completed"  # Set status to completed instead of pending
         )
         db.session.add(new_monthly_invoice)
-        db.session.flush()  # To get the ID for invoice_items
+        try:
+            db.session.flush()  # To get the ID for invoice_items
+        except IntegrityError:
+            # Another request created it since the check above (unique company, period and type)
+            db.session.rollback()
+            return _existing_monthly_invoice(company_id, month, year, invoice_type) or (
+                {"error": "Invoice for this company and period already exists"}, 409
+            )
 
         for item in invoice_items:
             item.monthly_invoice_id = new_monthly_invoice.id
             db.session.add(item)
 
         db.session.commit()
+        progress(50, "Rendering PDF")
 
         # Generate PDF
-        pdf_output = None
-        if invoice_type == "partner_company":
-            pdf_output = generate_monthly_company_invoice_pdf(new_monthly_invoice)
-        elif invoice_type == "my_company":
-            pdf_output = generate_my_company_invoice_pdf(new_monthly_invoice)
-
-        if pdf_output:
-            # Use safe_text for filename to avoid encoding issues
-            company_name_safe = safe_text(company.name).replace(" ", "_")
-            pdf_filename = f"monthly_invoice_{company_name_safe}_{month}_{year}_{invoice_type}.pdf"
-            pdf_path = os.path.join(os.path.dirname(__file__), "invoices", pdf_filename)
-            # Ensure the invoices directory exists
-            os.makedirs(os.path.join(os.path.dirname(__file__), "invoices"), exist_ok=True)
-            pdf_output.output(pdf_path)
-            
+        pdf_filename = _save_monthly_invoice_pdf(new_monthly_invoice, company.name, progress)
+
+        if pdf_filename:
             # Save PDF path to database
-            new_monthly_invoice.pdfPath = f"/api/invoices/download/{pdf_filename}"
             db.session.commit()
             
-            logging.info(f"Monthly invoice PDF generated: {pdf_filename}")
-            return jsonify({
+            return {
                 "message": "Monthly invoice generated successfully", 
                 "id": new_monthly_invoice.id, 
                 "pdfPath": f"/api/invoices/download/{pdf_filename}"
-            }), 201
+            }, 201
         else:
             logging.warning("Monthly invoice generated, but PDF could not be created.")
-            return jsonify({"message": "Monthly invoice generated, but PDF could not be created."}), 201
+            return {"message": "Monthly invoice generated, but PDF could not be created."}, 201
     except Exception as e:
         db.session.rollback()
         logging.error(f"Error generating monthly invoice: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+@invoices_bp.route("/invoices/monthly/<int:monthly_invoice_id>/refresh", methods=["POST"])
+def refresh_monthly_company_invoice_items(monthly_invoice_id):
+    data = request.get_json(silent=True)
+    data = dict(data or {}, monthlyInvoiceId=monthly_invoice_id)
+    return _generate_or_queue("monthly_refresh", dict(data, full=request_flag(data, "full")))
+
+# Item columns whose amounts make up the invoice totals
+MONTHLY_INVOICE_TOTALS = {"selling_price": "totalAmount", "cost_price": "totalCost", "profit": "totalProfit"}
+
+def _monthly_invoice_refresh_scope(monthly_invoice, change_rows, full=False):
+    """Items of a monthly invoice to recompute and the current values of their services' items, by service id
+
+    Only the lines recorded as changed since the last refresh, or every line of
+    the period when full.
+    """
+    if full:
+        services = _monthly_invoice_services(
+            monthly_invoice.company_id, monthly_invoice.invoice_month, monthly_invoice.invoice_year
+        )
+        items = MonthlyInvoiceItem.query.filter_by(monthly_invoice_id=monthly_invoice.id)
+    else:
+        service_ids = {row.service_id for row in change_rows if row.service_id is not None}
+        item_ids = {row.item_id for row in change_rows if row.item_id is not None}
+        services = _monthly_invoice_services(
+            monthly_invoice.company_id, monthly_invoice.invoice_month, monthly_invoice.invoice_year, service_ids
+        ) if service_ids else []
+        items = MonthlyInvoiceItem.query.filter(
+            MonthlyInvoiceItem.monthly_invoice_id == monthly_invoice.id,
+            or_(MonthlyInvoiceItem.service_id.in_(service_ids), MonthlyInvoiceItem.id.in_(item_ids))
+        )
+    current = {service.id: _monthly_invoice_item_values(service) for service in services}
+    return items.order_by(MonthlyInvoiceItem.id).all(), current
+
+@job_handler("monthly_refresh")
+def refresh_monthly_company_invoice(data, progress=no_progress):
+    """Bring a stored monthly invoice up to date with the services of its company and period
+
+    Only the lines recorded as changed (MonthlyInvoiceChange) are recomputed:
+    items of services added to the period are inserted, items whose service
+    changed are rewritten and items of services that left the period (or were
+    deleted) are removed; the totals move by the difference of those items
+    only. With full (or for invoices flagged before the changes were
+    recorded) every line of the period is compared. The PDF is rendered again
+    only when a line changed or it is missing.
+    """
+    try:
+        monthly_invoice_id = data.get("monthlyInvoiceId")
+        monthly_invoice = db.session.get(MonthlyCompanyInvoice, monthly_invoice_id) if monthly_invoice_id else None
+        if not monthly_invoice:
+            return {"error": "Monthly invoice not found"}, 404
+
+        change_rows = db.session.execute(select(
+            MonthlyInvoiceChange.id, MonthlyInvoiceChange.service_id, MonthlyInvoiceChange.item_id
+        ).where(MonthlyInvoiceChange.monthly_invoice_id == monthly_invoice.id)).all()
+        full = bool(data.get("full")) or bool(monthly_invoice.stale and not change_rows)
+        items, current = _monthly_invoice_refresh_scope(monthly_invoice, change_rows, full)
+        progress(20, f"Comparing {len(items)} items with {len(current)} services")
+        deltas = dict.fromkeys(MONTHLY_INVOICE_TOTALS, 0.0)
+        added = updated = removed = 0
+
+        for item in items:
+            values = current.pop(item.service_id, None) if item.service_id is not None else None
+            if values is None:
+                for field in MONTHLY_INVOICE_TOTALS:
+                    deltas[field] -= getattr(item, field) or 0
+                db.session.delete(item)
+                removed += 1
+                continue
+            changes = {field: value for field, value in values.items() if getattr(item, field) != value}
+            if changes:
+                for field in MONTHLY_INVOICE_TOTALS:
+                    deltas[field] += values[field] - (getattr(item, field) or 0)
+                for field, value in changes.items():
+                    setattr(item, field, value)
+                updated += 1
+
+        # Services of the period the invoice does not list yet
+        for values in current.values():
+            for field in MONTHLY_INVOICE_TOTALS:
+                deltas[field] += values[field]
+            db.session.add(MonthlyInvoiceItem(monthly_invoice_id=monthly_invoice.id, **values))
+            added += 1
+
+        for field, total in MONTHLY_INVOICE_TOTALS.items():
+            if deltas[field]:
+                setattr(monthly_invoice, total, (getattr(monthly_invoice, total) or 0) + deltas[field])
+        # Only the changes read above: lines changed meanwhile stay recorded, and the invoice stale
+        change_ids = [row.id for row in change_rows]
+        for start in range(0, len(change_ids), LEDGER_BATCH):
+            db.session.execute(delete(MonthlyInvoiceChange).where(MonthlyInvoiceChange.id.in_(change_ids[start:start + LEDGER_BATCH])))
+        monthly_invoice.stale = db.session.query(
+            select(MonthlyInvoiceChange.id).where(MonthlyInvoiceChange.monthly_invoice_id == monthly_invoice.id).exists()
+        ).scalar()
+        db.session.commit()
+
+        changed = bool(added or updated or removed)
+        rendered = False
+        if changed or not _stored_pdf(monthly_invoice.pdfPath)[1]:
+            progress(50, "Rendering PDF")
+            company_name = monthly_invoice.company.name if monthly_invoice.company else "Unknown Company"
+            rendered = bool(_save_monthly_invoice_pdf(monthly_invoice, company_name, progress))
+            db.session.commit()
+
+        logging.info(
+            f"Monthly invoice {monthly_invoice.id} refreshed: {added} added, {updated} updated, {removed} removed"
+            f"{', PDF rendered' if rendered else ''}"
+        )
+        return {
+            "message": "Monthly invoice refreshed" if changed else "Monthly invoice is up to date",
+            "id": monthly_invoice.id,
+            "itemsAdded": added,
+            "itemsUpdated": updated,
+            "itemsRemoved": removed,
+            "totalAmount": monthly_invoice.totalAmount,
+            "totalCost": monthly_invoice.totalCost,
+            "totalProfit": monthly_invoice.totalProfit,
+            "pdfRendered": rendered,
+            "pdfPath": monthly_invoice.pdfPath
+        }, 200
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error refreshing monthly invoice: {e}")
+        return {"error": str(e)}, 500
+
+@invoices_bp.route("/invoices/monthly/close", methods=["POST"])
+def close_month():
+    """Generate the monthly invoices of every company with services in a month"""
+    return _generate_or_queue("month_end", request.get_json())
+
+def render_monthly_invoice_file(monthly_invoice_id):
+    """Render the PDF of a stored monthly invoice; returns its pdfPath (stored by the caller)"""
+    monthly_invoice = db.session.get(MonthlyCompanyInvoice, monthly_invoice_id)
+    company_name = monthly_invoice.company.name if monthly_invoice.company else "Unknown Company"
+    if _save_monthly_invoice_pdf(monthly_invoice, company_name):
+        return monthly_invoice.pdfPath
+    return None
+
+def _insert_skipping_conflicts(model):
+    """INSERT of model rows that leaves out rows conflicting with a unique index (PostgreSQL and SQLite)"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    return insert(model)
+
+def _render_monthly_invoice_files(invoice_ids, processes, progress=no_progress):
+    """{invoice id: pdfPath or error} for the given monthly invoices, rendered on a process pool"""
+    from src.invoice_worker import call_in_app, process_pool
+
+    database_uri = current_app.config["SQLALCHEMY_DATABASE_URI"]
+    if database_uri in ("sqlite://", "sqlite:///:memory:"):
+        # Other processes cannot see an in-memory database
+        processes = 1
+    if has_request_context():
+        # Never start a process pool inside a web worker: only queued runs
+        # (src/invoice_worker.py) render on several processes
+        processes = 1
+    results = {}
+    def record(invoice_id, render):
+        try:
+            results[invoice_id] = {"pdfPath": render()}
+        except Exception as e:
+            logging.error(f"Error rendering monthly invoice {invoice_id}: {e}")
+            results[invoice_id] = {"error": str(e)}
+        progress(30 + 65 * len(results) // len(invoice_ids), f"Rendered {len(results)} of {len(invoice_ids)} PDFs")
+
+    # Starting a pool process (about a second) only pays off for many PDFs
+    processes = min(processes, len(invoice_ids) // MONTH_END_PDFS_PER_PROCESS)
+    if processes <= 1:
+        for invoice_id in invoice_ids:
+            record(invoice_id, lambda: render_monthly_invoice_file(invoice_id))
+        return results
+    # Worker processes with their own app, fonts and logo (see src/invoice_worker.py)
+    with process_pool(processes, database_uri) as pool:
+        futures = {pool.submit(call_in_app, render_monthly_invoice_file, invoice_id): invoice_id for invoice_id in invoice_ids}
+        for future in as_completed(futures):
+            record(futures[future], future.result)
+    return results
+
+@job_handler("month_end")
+def create_month_end_invoices(data, progress=no_progress):
+    """Month-end run: the monthly invoices of all companies for a period, in bulk
+
+    Services of the period are fetched in one query and partitioned by
+    company; invoice and item rows are written with bulk inserts. Queued
+    runs render the PDFs on a process pool, runs inside a request one after
+    the other. Invoices that already exist for a company, period and type,
+    or are created meanwhile by another request, are left alone.
+    """
+    from src.invoice_worker import DEFAULT_PROCESSES, MAX_PROCESSES
 
-@invoices_bp.route("/invoices/client/<int:client_id>/generate", methods=["POST"])
-def generate_client_invoice(client_id):
     try:
-        data = request.get_json()
+        started = time.monotonic()
         month = data.get("month")
         year = data.get("year")
+        invoice_types = data.get("invoiceTypes") or list(MONTH_END_INVOICE_TYPES)
+        company_ids = data.get("companyIds")
+        processes = data.get("processes", DEFAULT_PROCESSES)
+
+        if not all([month, year]):
+            return {"error": "Month and year are required"}, 400
+        period_problem = period_error(month, year)
+        if period_problem:
+            return {"error": period_problem}, 400
+        try:
+            processes = int(processes) if not isinstance(processes, (bool, float)) else 0
+        except (TypeError, ValueError):
+            processes = 0
+        if processes < 1:
+            return {"error": "processes must be a positive whole number"}, 400
+        processes = min(processes, MAX_PROCESSES)
+        unknown_types = [invoice_type for invoice_type in invoice_types if invoice_type not in MONTH_END_INVOICE_TYPES]
+        if unknown_types:
+            return {"error": f"Unknown invoice types: {', '.join(unknown_types)}"}, 400
+
+        # All services of the period with their booking and client, in one query
+        services_query = db.session.query(Service, Client.company_id).join(
+            Booking, Service.booking_id == Booking.id
+        ).join(Client, Booking.client_id == Client.id).options(
+            contains_eager(Service.booking_ref).contains_eager(Booking.client_ref)
+        ).filter(Client.company_id.isnot(None), in_month(Service.startDate, month, year))
+        if company_ids:
+            services_query = services_query.filter(Client.company_id.in_(company_ids))
+        services_by_company = {
+            company_id: [service for service, _ in rows]
+            for company_id, rows in groupby(services_query.order_by(Client.company_id, Service.id).all(), key=lambda row: row[1])
+        }
 
-        client = Client.query.get(client_id)
-        if not client:
-            logging.warning(f"Client with ID {client_id} not found.")
-            return jsonify({"error": "Client not found"}), 404
+        companies = {
+            company.id: company for company in Company.query.filter(Company.id.in_(list(services_by_company))).all()
+        }
+        existing = {
+            (company_id, invoice_type): (invoice_id, bool(stale))
+            for invoice_id, company_id, invoice_type, stale in db.session.query(
+                MonthlyCompanyInvoice.id, MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.invoiceType,
+                MonthlyCompanyInvoice.stale
+            ).filter(
+                MonthlyCompanyInvoice.company_id.in_(list(services_by_company)),
+                MonthlyCompanyInvoice.invoice_month == month,
+                MonthlyCompanyInvoice.invoice_year == year
+            ).all()
+        }
+        progress(10, f"Found {len(services_by_company)} companies with services")
+
+        summary = {}
+        invoice_rows = []
+        item_rows = []
+        for company_id, services in services_by_company.items():
+            company = companies.get(company_id)
+            summary[company_id] = {
+                "companyId": company_id,
+                "companyName": safe_text(company.name) if company else "Unknown Company",
+                "services": len(services),
+                "invoices": []
+            }
+            items = [_monthly_invoice_item_values(service) for service in services]
+            for invoice_type in invoice_types:
+                if (company_id, invoice_type) in existing:
+                    invoice_id, stale = existing[(company_id, invoice_type)]
+                    summary[company_id]["invoices"].append({
+                        "invoiceType": invoice_type, "id": invoice_id, "status": "exists", "stale": stale
+                    })
+                    continue
+                invoice_rows.append({
+                    "company_id": company_id,
+                    "invoice_month": month,
+                    "invoice_year": year,
+                    "invoiceDate": date.today(),
+                    "totalAmount": sum(item["selling_price"] for item in items),
+                    "totalCost": sum(item["cost_price"] for item in items),
+                    "totalProfit": sum(item["profit"] for item in items),
+                    "invoiceType": invoice_type,
+                    "status": "completed"
+                })
+                item_rows.append(items)
+
+        # Bulk inserts. An invoice created meanwhile by another close or
+        # generate request is skipped by the unique index instead of failing
+        # the run, and reported as existing
+        created = {}
+        if invoice_rows:
+            created = {
+                (company_id, invoice_type): invoice_id
+                for invoice_id, company_id, invoice_type in db.session.execute(
+                    _insert_skipping_conflicts(MonthlyCompanyInvoice).returning(
+                        MonthlyCompanyInvoice.id, MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.invoiceType
+                    ),
+                    invoice_rows
+                )
+            }
+        conflicts = set()
+        created_rows = []
+        created_items = []
+        for row, items in zip(invoice_rows, item_rows):
+            key = (row["company_id"], row["invoiceType"])
+            if key in created:
+                created_rows.append(row)
+                created_items.append(items)
+            else:
+                conflicts.add(key)
+        invoice_rows = created_rows
+        invoice_ids = [created[(row["company_id"], row["invoiceType"])] for row in invoice_rows]
+        if invoice_ids:
+            db.session.execute(insert(MonthlyInvoiceItem), [
+                dict(item, monthly_invoice_id=invoice_id)
+                for invoice_id, items in zip(invoice_ids, created_items) for item in items
+            ])
+            # Bulk statements skip the flush hooks that keep the invoice ledger
+            refresh_invoice_ledger(db.session.connection(), monthly_invoice_ids=invoice_ids)
+        db.session.commit()
+        if conflicts:
+            for invoice_id, company_id, invoice_type, stale in db.session.query(
+                MonthlyCompanyInvoice.id, MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.invoiceType,
+                MonthlyCompanyInvoice.stale
+            ).filter(
+                MonthlyCompanyInvoice.company_id.in_({company_id for company_id, _ in conflicts}),
+                MonthlyCompanyInvoice.invoice_month == month,
+                MonthlyCompanyInvoice.invoice_year == year
+            ).all():
+                if (company_id, invoice_type) in conflicts:
+                    summary[company_id]["invoices"].append({
+                        "invoiceType": invoice_type, "id": invoice_id, "status": "exists", "stale": bool(stale)
+                    })
+        progress(30, f"Created {len(invoice_ids)} invoices")
+
+        rendered = _render_monthly_invoice_files(invoice_ids, processes, progress) if invoice_ids else {}
+        pdf_paths = [
+            {"id": invoice_id, "pdfPath": result["pdfPath"]}
+            for invoice_id, result in rendered.items() if result.get("pdfPath")
+        ]
+        if pdf_paths:
+            db.session.execute(update(MonthlyCompanyInvoice), pdf_paths)
+            refresh_invoice_ledger(db.session.connection(), monthly_invoice_ids=[row["id"] for row in pdf_paths])
+        db.session.commit()
 
-        # Debug: Log client information with safe access
-        client_first_name = safe_get_text(client, 'firstName', 'Unknown')
-        client_last_name = safe_get_text(client, 'lastName', 'Client')
-        logging.info(f"Generating invoice for client {client_id}: {client_first_name} {client_last_name}")
+        for invoice_id, row in zip(invoice_ids, invoice_rows):
+            result = rendered.get(invoice_id, {})
+            summary[row["company_id"]]["invoices"].append({
+                "invoiceType": row["invoiceType"],
+                "id": invoice_id,
+                "status": "created",
+                "totalAmount": row["totalAmount"],
+                "totalCost": row["totalCost"],
+                "totalProfit": row["totalProfit"],
+                "pdfPath": result.get("pdfPath"),
+                "error": result.get("error")
+            })
 
-        # Get all bookings for this client first
-        bookings = Booking.query.filter_by(client_id=client_id).all()
-        logging.info(f"Found {len(bookings)} bookings for client {client_id}")
+        duration = time.monotonic() - started
+        logging.info(f"Month-end run for {month}/{year}: {len(invoice_ids)} invoices for {len(summary)} companies in {duration:.1f}s")
+        return {
+            "message": "Month-end invoices generated",
+            "month": month,
+            "year": year,
+            "invoicesCreated": len(invoice_ids),
+            "pdfErrors": sum(1 for result in rendered.values() if result.get("error")),
+            "durationSeconds": round(duration, 2),
+            "companies": list(summary.values())
+        }, 201
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error in month-end invoice run: {e}")
+        return {"error": str(e)}, 500
+
+def _client_invoice_data(client, services):
+    """What the detailed invoice of a client is drawn from: the client and its services, by category"""
+    # Prepare client data for PDF generation with safe access
+    client_first_name = get_text(client, 'firstName', 'Unknown')
+    client_last_name = get_text(client, 'lastName', 'Client')
+    client_name = f"{client_first_name} {client_last_name}".strip()
+    if not client_name:
+        client_name = "Unknown Client"
+    
+    client_email = get_text(client, 'email', 'No email provided')
+    
+    # Get earliest start date with safe access
+    start_dates = []
+    for service in services:
+        start_date = getattr(service, 'startDate', None)
+        if start_date:
+            start_dates.append(start_date)
+    
+    arrival_date = min(start_dates).strftime("%Y-%m-%d") if start_dates else "N/A"
+    
+    client_data = {
+        "clientName": client_name,
+        "email": client_email,
+        "arrivalDate": arrival_date,
+        "services": [],
+        "totalSellingPrice": 0
+    }
 
-        # Get services from all bookings for this client
-        services_query = db.session.query(Service).join(Booking).filter(
-            Booking.client_id == client_id
-        )
+    for service in services:
+        # Categorize services with safe access
+        service_type = get_text(service, 'serviceType', 'Unknown')
+        service_category = "Tours and Car Rentals"
+        if service_type == "Hotel":
+            service_category = "Hotels"
+        
+        start_date = getattr(service, 'startDate', None)
+        end_date = getattr(service, 'endDate', None)
+        total_selling_price = getattr(service, 'totalSellingPrice', 0) or 0
+        
+        service_data = {
+            "serviceName": get_text(service, 'serviceName', 'Unknown Service'),
+            "serviceType": service_type,
+            "serviceCategory": service_category,
+            "startDate": start_date.strftime("%Y-%m-%d") if start_date else "N/A",
+            "endDate": end_date.strftime("%Y-%m-%d") if end_date else "N/A",
+            "totalSellingPrice": float(total_selling_price),
+            "nights": getattr(service, 'numNights', None) if service_type == "Hotel" else None,
+            "hours": getattr(service, 'hours', None) if getattr(service, 'is_hourly', False) else None,
+            "hotelName": get_text(service, 'hotelName', None) if service_type == "Hotel" else None,
+            "hotelCity": get_text(service, 'hotelCity', None) if service_type == "Hotel" else None
+        }
+        client_data["services"].append(service_data)
+        client_data["totalSellingPrice"] += total_selling_price
 
-        # Apply month/year filter only if both are provided
-        if month and year:
-            services_query = services_query.filter(
-                db.extract("month", Service.startDate) == month,
-                db.extract("year", Service.startDate) == year
-            )
-            logging.info(f"Filtering services for month {month} and year {year}")
+    return client_data
 
-        services = services_query.all()
-        logging.info(f"Found {len(services)} services for client {client_id}")
+@invoices_bp.route("/invoices/client/<int:client_id>/generate", methods=["POST"])
+def generate_client_invoice(client_id):
+    data = request.get_json()
+    return _generate_or_queue("client", dict(data, clientId=client_id) if isinstance(data, dict) else data)
+
+def _client_invoice_document(data):
+    """The detailed invoice of a client (optionally for one month)"""
+    client_id = data.get("clientId")
+    month = data.get("month")
+    year = data.get("year")
+
+    period_problem = period_error(month, year) if month and year else None
+    if period_problem:
+        raise InvoiceNotRendered({"error": period_problem}, 400)
+
+    client = Client.query.get(client_id)
+    if not client:
+        logging.warning(f"Client with ID {client_id} not found.")
+        raise InvoiceNotRendered({"error": "Client not found"}, 404)
+
+    # Debug: Log client information with safe access
+    client_first_name = get_text(client, 'firstName', 'Unknown')
+    client_last_name = get_text(client, 'lastName', 'Client')
+    logging.info(f"Generating invoice for client {client_id}: {client_first_name} {client_last_name}")
+
+    # Get all bookings for this client first
+    bookings = Booking.query.filter_by(client_id=client_id).all()
+    logging.info(f"Found {len(bookings)} bookings for client {client_id}")
+
+    # Get services from all bookings for this client
+    services_query = db.session.query(Service).join(Booking).filter(
+        Booking.client_id == client_id
+    )
+
+    # Apply month/year filter only if both are provided
+    if month and year:
+        services_query = services_query.filter(
+            in_month(Service.startDate, month, year)
+        )
+        logging.info(f"Filtering services for month {month} and year {year}")
 
-        # Debug: Log service details with safe access
-        for service in services:
-            service_name = safe_get_text(service, 'serviceName', 'Unknown Service')
-            service_type = safe_get_text(service, 'serviceType', 'Unknown Type')
-            start_date = getattr(service, 'startDate', None)
-            start_date_str = start_date.strftime('%Y-%m-%d') if start_date else 'N/A'
-            logging.info(f"Service: {service_name}, Type: {service_type}, Start: {start_date_str}")
+    services = services_query.all()
+    logging.info(f"Found {len(services)} services for client {client_id}")
 
-        if not services:
-            # Additional debug: Check if there are any services at all for this client
-            all_services = db.session.query(Service).join(Booking).filter(Booking.client_id == client_id).all()
-            logging.info(f"Total services for client {client_id} (without date filter): {len(all_services)}")
-            
-            if all_services:
-                logging.info("Services exist but don't match the date filter")
-                for service in all_services:
-                    service_name = safe_get_text(service, 'serviceName', 'Unknown Service')
-                    start_date = getattr(service, 'startDate', None)
-                    start_date_str = start_date.strftime('%Y-%m-%d') if start_date else 'N/A'
-                    logging.info(f"Available service: {service_name}, Date: {start_date_str}")
-            
-            return jsonify({"message": "No services found for this client in the specified period"}), 200
+    # Debug: Log service details with safe access
+    for service in services:
+        service_name = get_text(service, 'serviceName', 'Unknown Service')
+        service_type = get_text(service, 'serviceType', 'Unknown Type')
+        start_date = getattr(service, 'startDate', None)
+        start_date_str = start_date.strftime('%Y-%m-%d') if start_date else 'N/A'
+        logging.info(f"Service: {service_name}, Type: {service_type}, Start: {start_date_str}")
 
-        # Prepare client data for PDF generation with safe access
-        client_name = f"{client_first_name} {client_last_name}".strip()
-        if not client_name:
-            client_name = "Unknown Client"
-        
-        client_email = safe_get_text(client, 'email', 'No email provided')
-        
-        # Get earliest start date with safe access
-        start_dates = []
-        for service in services:
-            start_date = getattr(service, 'startDate', None)
-            if start_date:
-                start_dates.append(start_date)
-        
-        arrival_date = min(start_dates).strftime("%Y-%m-%d") if start_dates else "N/A"
-        
-        client_data = {
-            "clientName": client_name,
-            "email": client_email,
-            "arrivalDate": arrival_date,
-            "services": [],
-            "totalSellingPrice": 0
-        }
+    if not services:
+        # Additional debug: Check if there are any services at all for this client
+        all_services = db.session.query(Service).join(Booking).filter(Booking.client_id == client_id).all()
+        logging.info(f"Total services for client {client_id} (without date filter): {len(all_services)}")
+        
+        if all_services:
+            logging.info("Services exist but don't match the date filter")
+            for service in all_services:
+                service_name = get_text(service, 'serviceName', 'Unknown Service')
+                start_date = getattr(service, 'startDate', None)
+                start_date_str = start_date.strftime('%Y-%m-%d') if start_date else 'N/A'
+                logging.info(f"Available service: {service_name}, Date: {start_date_str}")
+        
+        raise InvoiceNotRendered({"message": "No services found for this client in the specified period"}, 200)
+
+    client_data = _client_invoice_data(client, services)
+
+    # Use safe_text for filename to avoid encoding issues
+    client_name_safe = safe_text(f"{client_first_name}_{client_last_name}").replace(" ", "_")
+    pdf_name = f"client_invoice_{client_name_safe}_{client_id}"
+    if month and year:
+        pdf_name = f"client_invoice_{client_name_safe}_{month}_{year}"
+    return InvoiceDocument(
+        name=pdf_name,
+        # The date printed on the invoice is one of its inputs
+        key=render_cache.cache.key("client", [client_data, date.today()], settings=get_company_settings()),
+        render=lambda: generate_client_detailed_invoice_pdf(client_data),
+        details={"bookingId": services[0].booking_id, "totalAmount": client_data["totalSellingPrice"]},
+        preview=lambda: previews.render(
+            "client.html", title="Client Detailed Invoice", company_name=get_company_settings()[0],
+            client=client_data, invoice_date=date.today()
+        )
+    )
 
-        for service in services:
-            # Categorize services with safe access
-            service_type = safe_get_text(service, 'serviceType', 'Unknown')
-            service_category = "Tours and Car Rentals"
-            if service_type == "Hotel":
-                service_category = "Hotels"
-            
-            start_date = getattr(service, 'startDate', None)
-            end_date = getattr(service, 'endDate', None)
-            total_selling_price = getattr(service, 'totalSellingPrice', 0) or 0
-            
-            service_data = {
-                "serviceName": safe_get_text(service, 'serviceName', 'Unknown Service'),
-                "serviceType": service_type,
-                "serviceCategory": service_category,
-                "startDate": start_date.strftime("%Y-%m-%d") if start_date else "N/A",
-                "endDate": end_date.strftime("%Y-%m-%d") if end_date else "N/A",
-                "totalSellingPrice": float(total_selling_price),
-                "nights": getattr(service, 'numNights', None) if service_type == "Hotel" else None,
-                "hours": getattr(service, 'hours', None) if getattr(service, 'is_hourly', False) else None,
-                "hotelName": safe_get_text(service, 'hotelName', None) if service_type == "Hotel" else None,
-                "hotelCity": safe_get_text(service, 'hotelCity', None) if service_type == "Hotel" else None
-            }
-            client_data["services"].append(service_data)
-            client_data["totalSellingPrice"] += total_selling_price
+@job_handler("client")
+def create_client_invoice(data, progress=no_progress):
+    """Render the detailed invoice of a client and record it as an Invoice"""
+    try:
+        document = _client_invoice_document(data)
+
+        # Generate PDF, unless the same invoice was rendered before
+        progress(50, "Rendering PDF")
+        pdf_filename, cached = render_cache.cache.fetch(document.name, document.key, document.render)
+        progress(90, "Saving invoice")
+
+        # Create invoice record in database
+        new_invoice = Invoice(
+            booking_id=document.details["bookingId"],  # Use first service's booking
+            invoiceType="client",
+            totalAmount=document.details["totalAmount"],
+            status="completed",  # Set status to completed instead of generated
+            invoiceDate=date.today(),
+            pdfPath=f"/api/invoices/download/{pdf_filename}"
+        )
+        db.session.add(new_invoice)
+        db.session.commit()
 
-        # Generate PDF
-        pdf_output = generate_client_detailed_invoice_pdf(client_data)
-        
-        if pdf_output:
-            # Use safe_text for filename to avoid encoding issues
-            client_name_safe = safe_text(f"{client_first_name}_{client_last_name}").replace(" ", "_")
-            pdf_filename = f"client_invoice_{client_name_safe}_{client_id}.pdf"
-            if month and year:
-                pdf_filename = f"client_invoice_{client_name_safe}_{month}_{year}.pdf"
-            
-            pdf_path = os.path.join(os.path.dirname(__file__), "invoices", pdf_filename)
-            # Ensure the invoices directory exists
-            os.makedirs(os.path.join(os.path.dirname(__file__), "invoices"), exist_ok=True)
-            pdf_output.output(pdf_path)
-            
-            # Create invoice record in database
-            new_invoice = Invoice(
-                booking_id=services[0].booking_id,  # Use first service's booking
-                invoiceType="client",
-                totalAmount=client_data["totalSellingPrice"],
-                status="completed",  # Set status to completed instead of generated
-                invoiceDate=date.today(),
-                pdfPath=f"/api/invoices/download/{pdf_filename}"
-            )
-            db.session.add(new_invoice)
-            db.session.commit()
-            
-            logging.info(f"Client invoice PDF generated: {pdf_filename}")
-            return jsonify({
-                "message": "Client invoice generated successfully", 
-                "id": new_invoice.id, 
-                "pdfPath": f"/api/invoices/download/{pdf_filename}"
-            }), 201
-        else:
-            logging.warning("Client invoice could not be created.")
-            return jsonify({"message": "Client invoice could not be created."}), 500
+        logging.info(f"Client invoice PDF generated: {pdf_filename}")
+        return {
+            "message": "Client invoice generated successfully", 
+            "id": new_invoice.id, 
+            "pdfPath": f"/api/invoices/download/{pdf_filename}",
+            "cached": cached
+        }, 201
+    except InvoiceNotRendered as e:
+        return e.body, e.status
     except Exception as e:
         db.session.rollback()
         logging.error(f"Error generating client invoice: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 @invoices_bp.route("/invoices/download/<filename>", methods=["GET"])
 def download_invoice(filename):
+    """Send a stored invoice PDF
+
+    The ETag is the SHA-256 of the file, so If-None-Match gets a 304 and
+    Range requests resume a partial download (both handled by send_file).
+    With INVOICE_DOWNLOAD_OFFLOAD set to "nginx" or "sendfile" the body is
+    left to the front proxy through X-Accel-Redirect or X-Sendfile, so the
+    worker is free as soon as the headers are written.
+    """
     try:
-        pdf_path = os.path.join(os.path.dirname(__file__), "invoices", filename)
-        if os.path.exists(pdf_path):
-            return send_file(pdf_path, as_attachment=True, download_name=filename)
-        else:
+        pdf_path = safe_join(render_cache.CACHE_DIR, filename)
+        if not pdf_path or not os.path.isfile(pdf_path):
             return jsonify({"error": "File not found"}), 404
+        stat = os.stat(pdf_path)
+        etag = render_cache.cache.etag(pdf_path, stat)
+        offload = current_app.config.get("INVOICE_DOWNLOAD_OFFLOAD")
+
+        if offload in ("nginx", "sendfile"):
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                # The proxy sends the body and answers Range requests itself
+                response = current_app.response_class(mimetype="application/pdf")
+                if offload == "nginx":
+                    prefix = current_app.config.get("INVOICE_ACCEL_REDIRECT_PREFIX", "/protected/invoices/")
+                    response.headers["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(filename)
+                else:
+                    response.headers["X-Sendfile"] = pdf_path
+                response.headers.set("Content-Disposition", "attachment", filename=safe_text(filename))
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response
+
+        return send_file(
+            pdf_path,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=filename,
+            etag=etag,
+            last_modified=stat.st_mtime
+        )
     except Exception as e:
         logging.error(f"Error downloading invoice: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _stored_pdf(pdf_path):
+    """(file name, path) of the stored PDF a pdfPath value points to; the path is None when the file is missing"""
+    filename = os.path.basename(pdf_path or "")
+    path = safe_join(render_cache.CACHE_DIR, filename) if filename else None
+    return filename, path if path and os.path.isfile(path) else None
+
+def _invoice_bundle_contents(month, year, company_id=None):
+    """(archive files, manifest rows) of the invoices and monthly company invoices of a month
+
+    Only the manifest columns are read, joined in one query per invoice table,
+    so no client or company is loaded row by row.
+    """
+    regular = db.session.query(
+        Invoice.id, Invoice.invoiceType, Invoice.invoiceDate, Invoice.totalAmount, Invoice.status, Invoice.pdfPath,
+        Client.firstName, Client.lastName, Company.name.label("companyName")
+    ).outerjoin(Booking, Invoice.booking_id == Booking.id).outerjoin(
+        Client, Booking.client_id == Client.id
+    ).outerjoin(Company, Client.company_id == Company.id).filter(in_month(Invoice.invoiceDate, month, year))
+    monthly = db.session.query(
+        MonthlyCompanyInvoice.id, MonthlyCompanyInvoice.invoiceType, MonthlyCompanyInvoice.invoiceDate,
+        MonthlyCompanyInvoice.totalAmount, MonthlyCompanyInvoice.status, MonthlyCompanyInvoice.pdfPath,
+        Company.name.label("companyName")
+    ).outerjoin(Company, MonthlyCompanyInvoice.company_id == Company.id).filter(
+        MonthlyCompanyInvoice.invoice_month == month,
+        MonthlyCompanyInvoice.invoice_year == year
+    )
+    if company_id:
+        regular = regular.filter(Client.company_id == company_id)
+        monthly = monthly.filter(MonthlyCompanyInvoice.company_id == company_id)
+
+    files = {}
+    manifest = []
+    def add(row, pdf_path):
+        filename, path = _stored_pdf(pdf_path)
+        # Invoices rendered from the same data share one PDF, which goes in once
+        if path and filename not in files:
+            files[filename] = path
+        row.update(
+            file=filename,
+            bytes=os.path.getsize(path) if path else "",
+            included="yes" if path else "no"
+        )
+        manifest.append(row)
+
+    for invoice in regular.order_by(Invoice.invoiceDate, Invoice.id).all():
+        add({
+            "record": "invoice",
+            "id": invoice.id,
+            "type": invoice.invoiceType,
+            "company": invoice.companyName or "",
+            "client": f"{invoice.firstName or ''} {invoice.lastName or ''}".strip(),
+            "period": f"{year}-{month:02d}",
+            "invoiceDate": invoice.invoiceDate.strftime("%Y-%m-%d") if invoice.invoiceDate else "",
+            "totalAmount": f"{invoice.totalAmount or 0:.2f}",
+            "status": invoice.status
+        }, invoice.pdfPath)
+    for monthly_invoice in monthly.order_by(MonthlyCompanyInvoice.company_id, MonthlyCompanyInvoice.id).all():
+        add({
+            "record": "monthly_company_invoice",
+            "id": monthly_invoice.id,
+            "type": monthly_invoice.invoiceType,
+            "company": monthly_invoice.companyName or "",
+            "client": "",
+            "period": f"{year}-{month:02d}",
+            "invoiceDate": monthly_invoice.invoiceDate.strftime("%Y-%m-%d") if monthly_invoice.invoiceDate else "",
+            "totalAmount": f"{monthly_invoice.totalAmount or 0:.2f}",
+            "status": monthly_invoice.status
+        }, monthly_invoice.pdfPath)
+    return list(files.items()), manifest
+
+@invoices_bp.route("/invoices/bundle", methods=["GET"])
+def download_invoice_bundle():
+    """ZIP of the stored PDFs of a month's invoices with a CSV manifest, streamed as it is built
+
+    Query: month, year and optionally company_id. The manifest lists every
+    matching invoice, including those whose PDF is not on disk.
+    """
+    month = request.args.get("month", type=int)
+    year = request.args.get("year", type=int)
+    company_id = request.args.get("company_id", type=int)
+    if not month or not year:
+        return jsonify({"error": "Month and year are required"}), 400
+    period_problem = period_error(month, year)
+    if period_problem:
+        return jsonify({"error": period_problem}), 400
+    try:
+        # Rows are read before the response starts; the PDFs are read while it streams
+        files, manifest = _invoice_bundle_contents(month, year, company_id)
+    except Exception as e:
+        logging.error(f"Error collecting invoice bundle: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    bundle_name = f"invoices_{year}_{month:02d}" + (f"_company_{company_id}" if company_id else "") + ".zip"
+    response = Response(
+        bundles.stream_zip(files, manifest=("manifest.csv", BUNDLE_MANIFEST_FIELDS, manifest)),
+        mimetype="application/zip"
+    )
+    response.headers.set("Content-Disposition", "attachment", filename=bundle_name)
+    response.headers["X-Invoice-Count"] = str(len(manifest))
+    return response
+
 @invoices_bp.route("/invoices/<int:invoice_id>", methods=["DELETE"])
 def delete_invoice(invoice_id):
     """Delete an invoice by ID"""
@@ -1134,8 +1624,12 @@ def delete_invoice(invoice_id):
         if not invoice:
             return jsonify({"error": "Invoice not found"}), 404
         
-        # Delete the PDF file if it exists
-        if invoice.pdfPath:
+        # Delete the PDF file if it exists and no other invoice was given the
+        # same file by the render cache
+        shared = invoice.pdfPath and Invoice.query.filter(
+            Invoice.pdfPath == invoice.pdfPath, Invoice.id != invoice.id
+        ).first() is not None
+        if invoice.pdfPath and not shared:
             try:
                 # Extract filename from pdfPath
                 filename = invoice.pdfPath.split("/")[-1]
@@ -1168,9 +1662,9 @@ class ExcelLikeInvoicePDF(MyFPDF):
     def header(self):
         company_name, company_logo = get_company_settings()
         
-        if company_logo and os.path.exists(company_logo):
+        if company_logo:
             try:
-                self.image(company_logo, 10, 8, 33)
+                draw_logo(self, company_logo, 10, 8, 33)
                 self.ln(25)
             except Exception as e:
                 logging.error(f"Could not load logo: {e}")
@@ -1178,25 +1672,23 @@ class ExcelLikeInvoicePDF(MyFPDF):
         else:
             self.ln(10)
         
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "B", 15) if add_unicode_fonts(self) else self.set_font("Helvetica", "B", 15)
-        self.cell(0, 10, safe_text(company_name), 0, 1, "C")
+        use_font(self, "B", 15)
+        self.cell(0, 10, pdf_text(company_name), 0, 1, "C")
         self.cell(0, 10, "Monthly Company Invoice - Excel Style", 0, 1, "C")
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "I", 8) if add_unicode_fonts(self) else self.set_font("Helvetica", "I", 8)
+        use_font(self, "I", 8)
         self.cell(0, 10, f"Page {self.page_no()}", 0, 0, "C")
 
 class MyCompanyDetailedInvoicePDF(MyFPDF):
     def header(self):
         company_name, company_logo = get_company_settings()
         
-        if company_logo and os.path.exists(company_logo):
+        if company_logo:
             try:
-                self.image(company_logo, 10, 8, 33)
+                draw_logo(self, company_logo, 10, 8, 33)
                 self.ln(25)
             except Exception as e:
                 logging.error(f"Could not load logo: {e}")
@@ -1204,71 +1696,56 @@ class MyCompanyDetailedInvoicePDF(MyFPDF):
         else:
             self.ln(10)
         
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "B", 15) if add_unicode_fonts(self) else self.set_font("Helvetica", "B", 15)
-        self.cell(0, 10, safe_text(company_name), 0, 1, "C")
+        use_font(self, "B", 15)
+        self.cell(0, 10, pdf_text(company_name), 0, 1, "C")
         self.cell(0, 10, "My Company Detailed Invoice", 0, 1, "C")
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        add_unicode_fonts(self)
-        self.set_font("NotoArabic", "I", 8) if add_unicode_fonts(self) else self.set_font("Helvetica", "I", 8)
+        use_font(self, "I", 8)
         self.cell(0, 10, f"Page {self.page_no()}", 0, 0, "C")
 
 # NEW FUNCTION: Generate Excel-like monthly invoice PDF
-def generate_excel_like_monthly_invoice_pdf(company_data, excel_data):
-    """Generate Excel-like monthly invoice PDF showing payment status for each client"""
+def generate_excel_like_monthly_invoice_pdf(report):
+    """Generate Excel-like monthly invoice PDF showing payment status for each client (a MonthlyExcelReport)"""
     pdf = ExcelLikeInvoicePDF()
-    add_unicode_fonts(pdf)
+    use_font(pdf)
     pdf.add_page()
     
     # Company and period information
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, f"Company: {safe_text(company_data['name'])}", 0, 1, "L")
-    pdf.cell(0, 10, f"Period: {excel_data['period']['monthName']} {excel_data['period']['year']}", 0, 1, "L")
+    use_font(pdf, "B", 14)
+    pdf.cell(0, 10, f"Company: {pdf_text(report.company.name)}", 0, 1, "L")
+    pdf.cell(0, 10, f"Period: {report.monthName} {report.year}", 0, 1, "L")
     pdf.ln(10)
     
-    # Table header
-    pdf.set_font("NotoArabic", "B", 10) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 10)
-    
-    # Column widths
-    col_widths = [40, 25, 25, 25, 25, 20]  # Client, Date, Amount, Paid, Due, Status
-    
-    pdf.cell(col_widths[0], 8, "Client Name", 1, 0, "C")
-    pdf.cell(col_widths[1], 8, "Arrival Date", 1, 0, "C")
-    pdf.cell(col_widths[2], 8, "Amount(USD)", 1, 0, "C")
-    pdf.cell(col_widths[3], 8, "Paid", 1, 0, "C")
-    pdf.cell(col_widths[4], 8, "Due", 1, 0, "C")
-    pdf.cell(col_widths[5], 8, "Status", 1, 1, "C")
-    
-    # Table data
-    pdf.set_font("NotoArabic", "", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 9)
-    
-    for client in excel_data['clients']:
-        # Determine row color based on payment status
-        if client['paymentStatus'] == 'paid':
-            pdf.set_fill_color(144, 238, 144)  # Light green
-        elif client['paymentStatus'] == 'partial':
-            pdf.set_fill_color(255, 255, 0)   # Yellow
-        else:
-            pdf.set_fill_color(255, 182, 193)  # Light red
-        
-        client_name = safe_text(client['clientName'][:25])
-        arrival_date = client['arrivalDate'][:10] if client['arrivalDate'] else "N/A"
-        
-        pdf.cell(col_widths[0], 6, client_name, 1, 0, "L", True)
-        pdf.cell(col_widths[1], 6, arrival_date, 1, 0, "C", True)
-        pdf.cell(col_widths[2], 6, f"${client['totalAmount']:.0f}", 1, 0, "R", True)
-        pdf.cell(col_widths[3], 6, f"${client['paidAmount']:.0f}", 1, 0, "R", True)
-        pdf.cell(col_widths[4], 6, f"${client['dueAmount']:.0f}", 1, 0, "R", True)
-        
-        status_text = "PAID" if client['paymentStatus'] == 'paid' else "DUE"
-        pdf.cell(col_widths[5], 6, status_text, 1, 1, "C", True)
+    # Row color by payment status
+    def status_fill(client):
+        if client.paymentStatus == 'paid':
+            return (144, 238, 144)  # Light green
+        elif client.paymentStatus == 'partial':
+            return (255, 255, 0)  # Yellow
+        return (255, 182, 193)  # Light red
+    
+    draw_table(pdf, [
+        Column("Client Name", min_width=40, max_width=70),
+        Column("Arrival Date", "C", width=25),
+        Column("Amount(USD)", "R", width=25),
+        Column("Paid", "R", width=25),
+        Column("Due", "R", width=25),
+        Column("Status", "C", width=20),
+    ], report.clients, cells=lambda client: (
+        client.clientName,
+        client.arrivalDate.isoformat()[:10] if client.arrivalDate else "N/A",
+        f"${client.totalAmount:.0f}",
+        f"${client.paidAmount:.0f}",
+        f"${client.dueAmount:.0f}",
+        "PAID" if client.paymentStatus == 'paid' else "DUE"
+    ), fill=status_fill)
     
     # Summary section
     pdf.ln(5)
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     
     # Summary table
     summary_col_widths = [80, 40]
@@ -1279,78 +1756,82 @@ def generate_excel_like_monthly_invoice_pdf(company_data, excel_data):
     
     pdf.set_fill_color(255, 255, 255)  # White
     pdf.cell(summary_col_widths[0], 6, "Total Amount", 1, 0, "L", True)
-    pdf.cell(summary_col_widths[1], 6, f"${excel_data['summary']['totalAmount']:.0f}", 1, 1, "R", True)
+    pdf.cell(summary_col_widths[1], 6, f"${round(report.totalAmount, 2):.0f}", 1, 1, "R", True)
     
     pdf.set_fill_color(144, 238, 144)  # Light green
     pdf.cell(summary_col_widths[0], 6, "Total Paid", 1, 0, "L", True)
-    pdf.cell(summary_col_widths[1], 6, f"${excel_data['summary']['totalPaid']:.0f}", 1, 1, "R", True)
+    pdf.cell(summary_col_widths[1], 6, f"${round(report.totalPaid, 2):.0f}", 1, 1, "R", True)
     
     pdf.set_fill_color(255, 182, 193)  # Light red
     pdf.cell(summary_col_widths[0], 6, "Total Due", 1, 0, "L", True)
-    pdf.cell(summary_col_widths[1], 6, f"${excel_data['summary']['totalDue']:.0f}", 1, 1, "R", True)
+    pdf.cell(summary_col_widths[1], 6, f"${round(report.totalDue, 2):.0f}", 1, 1, "R", True)
     
     return pdf
 
 # NEW FUNCTION: Generate detailed invoice for my company
-def generate_my_company_detailed_invoice_pdf(company_data, excel_data):
-    """Generate detailed invoice for my company showing costs, profits, etc."""
+def generate_my_company_detailed_invoice_pdf(report):
+    """Generate detailed invoice for my company showing costs, profits, etc. (a MonthlyDetailedReport)"""
     pdf = MyCompanyDetailedInvoicePDF()
-    add_unicode_fonts(pdf)
+    use_font(pdf)
     pdf.add_page()
     
     # Company and period information
-    pdf.set_font("NotoArabic", "B", 14) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, f"Partner Company: {safe_text(company_data['name'])}", 0, 1, "L")
-    pdf.cell(0, 10, f"Period: {excel_data['period']['monthName']} {excel_data['period']['year']}", 0, 1, "L")
+    use_font(pdf, "B", 14)
+    pdf.cell(0, 10, f"Partner Company: {pdf_text(report.company.name)}", 0, 1, "L")
+    pdf.cell(0, 10, f"Period: {report.monthName} {report.year}", 0, 1, "L")
     pdf.cell(0, 10, f"Invoice Date: {date.today().strftime('%Y-%m-%d')}", 0, 1, "L")
     pdf.ln(10)
     
     # Detailed breakdown by client
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, "Detailed Service Breakdown", 0, 1, "C")
     pdf.ln(5)
     
-    # For each client, show detailed services
-    for client in excel_data['clients']:
-        pdf.set_font("NotoArabic", "B", 11) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 11)
-        pdf.cell(0, 8, f"Client: {safe_text(client['clientName'])}", 0, 1, "L")
-        pdf.cell(0, 6, f"Arrival: {client['arrivalDate'][:10] if client['arrivalDate'] else 'N/A'}", 0, 1, "L")
+    service_columns = [
+        Column("Service", width=65),
+        Column("Date", "C", width=25),
+        Column("Cost", "R", width=30),
+        Column("Selling", "R", width=30),
+        Column("Profit", "R", width=30),
+    ]
+    total_cost = 0.0
+    total_revenue = 0.0
+    total_profit = 0.0
+    
+    # The service lines stream from one query, ordered by client
+    for client_id, services in groupby(report.services, key=lambda service: service.clientId):
+        services = iter(services)
+        first = next(services)
+        use_font(pdf, "B", 11)
+        pdf.cell(0, 8, f"Client: {pdf_text(first.clientName)}", 0, 1, "L")
+        pdf.cell(0, 6, f"Arrival: {first.arrivalDate.isoformat()[:10] if first.arrivalDate else 'N/A'}", 0, 1, "L")
         pdf.ln(2)
         
-        # Service details table header
-        pdf.set_font("NotoArabic", "B", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 9)
-        service_col_widths = [60, 30, 30, 30]
-        
-        pdf.cell(service_col_widths[0], 6, "Service", 1, 0, "C")
-        pdf.cell(service_col_widths[1], 6, "Cost", 1, 0, "C")
-        pdf.cell(service_col_widths[2], 6, "Selling", 1, 0, "C")
-        pdf.cell(service_col_widths[3], 6, "Profit", 1, 1, "C")
-        
-        # Here you would get actual service details for the client
-        # For now, we'll show a summary row
-        pdf.set_font("NotoArabic", "", 9) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "", 9)
-        
-        # Calculate estimated cost (70% of selling price for example)
-        estimated_cost = client['totalAmount'] * 0.7
-        estimated_profit = client['totalAmount'] - estimated_cost
-        
-        pdf.cell(service_col_widths[0], 6, "Service Package", 1, 0, "L")
-        pdf.cell(service_col_widths[1], 6, f"${estimated_cost:.0f}", 1, 0, "R")
-        pdf.cell(service_col_widths[2], 6, f"${client['totalAmount']:.0f}", 1, 0, "R")
-        pdf.cell(service_col_widths[3], 6, f"${estimated_profit:.0f}", 1, 1, "R")
+        # Service details, drawn as they stream; the title row repeats on page breaks
+        table = draw_table(pdf, service_columns, chain([first], services), cells=lambda service: (
+            f"{service.serviceName} ({service.serviceType})",
+            service.serviceDate.strftime('%Y-%m-%d') if service.serviceDate else "N/A",
+            f"${service.cost:.0f}",
+            f"${service.selling:.0f}",
+            f"${service.profit:.0f}"
+        ), header_font_size=9, header_height=6)
+        
+        # Client subtotal
+        table.row(
+            ["Client Total", f"${first.clientCost:.0f}", f"${first.clientSelling:.0f}", f"${first.clientProfit:.0f}"],
+            style="B", spans=[2, 1, 1, 1], aligns=["R", "R", "R", "R"]
+        )
+        total_cost += first.clientCost
+        total_revenue += first.clientSelling
+        total_profit += first.clientProfit
         
         pdf.ln(5)
     
     # Overall summary
-    pdf.set_font("NotoArabic", "B", 12) if add_unicode_fonts(pdf) else pdf.set_font("Helvetica", "B", 12)
+    use_font(pdf, "B", 12)
     pdf.cell(0, 10, "Monthly Summary", 0, 1, "C")
     pdf.ln(2)
     
-    # Calculate totals
-    total_revenue = excel_data['summary']['totalAmount']
-    estimated_total_cost = total_revenue * 0.7
-    estimated_total_profit = total_revenue - estimated_total_cost
-    
     summary_col_widths = [100, 40]
     
     pdf.set_fill_color(173, 216, 230)  # Light blue
@@ -1361,12 +1842,12 @@ def generate_my_company_detailed_invoice_pdf(company_data, excel_data):
     pdf.cell(summary_col_widths[0], 6, "Total Revenue", 1, 0, "L", True)
     pdf.cell(summary_col_widths[1], 6, f"${total_revenue:.0f}", 1, 1, "R", True)
     
-    pdf.cell(summary_col_widths[0], 6, "Estimated Total Cost", 1, 0, "L", True)
-    pdf.cell(summary_col_widths[1], 6, f"${estimated_total_cost:.0f}", 1, 1, "R", True)
+    pdf.cell(summary_col_widths[0], 6, "Total Cost", 1, 0, "L", True)
+    pdf.cell(summary_col_widths[1], 6, f"${total_cost:.0f}", 1, 1, "R", True)
     
     pdf.set_fill_color(144, 238, 144)  # Light green
-    pdf.cell(summary_col_widths[0], 6, "Estimated Profit", 1, 0, "L", True)
-    pdf.cell(summary_col_widths[1], 6, f"${estimated_total_profit:.0f}", 1, 1, "R", True)
+    pdf.cell(summary_col_widths[0], 6, "Total Profit", 1, 0, "L", True)
+    pdf.cell(summary_col_widths[1], 6, f"${total_profit:.0f}", 1, 1, "R", True)
     
     return pdf
 
@@ -1374,89 +1855,198 @@ def generate_my_company_detailed_invoice_pdf(company_data, excel_data):
 @invoices_bp.route("/invoices/monthly-excel/generate", methods=["POST"])
 def generate_excel_like_monthly_invoice():
     """Generate Excel-like monthly invoice PDF"""
+    return _generate_or_queue("monthly_excel", request.get_json())
+
+def _excel_like_invoice_document(data):
+    """The Excel-like monthly invoice of a company: its clients with totals and payment status"""
+    company_id = data.get('companyId')
+    month = data.get('month', datetime.now().month)
+    year = data.get('year', datetime.now().year)
+    
+    if not company_id:
+        raise InvoiceNotRendered({"error": "Company ID is required"}, 400)
+    
+    # Get company data
+    company = Company.query.get_or_404(company_id)
+    
+    # Same data as GET /companies/<id>/monthly-invoice-excel, read in-process
+    report = reports.monthly_excel_report(company, *report_period(month, year))
+    return InvoiceDocument(
+        name=f"excel_invoice_{company.name}_{report.month}_{report.year}",
+        key=render_cache.cache.key("monthly_excel", report.to_dict(), settings=get_company_settings()),
+        render=lambda: generate_excel_like_monthly_invoice_pdf(report),
+        details={},
+        preview=lambda: previews.render(
+            "monthly_excel.html", title="Monthly Invoice", company_name=get_company_settings()[0], report=report
+        )
+    )
+
+@job_handler("monthly_excel")
+def create_excel_like_monthly_invoice(data, progress=no_progress):
     try:
-        data = request.get_json()
-        company_id = data.get('companyId')
-        month = data.get('month', datetime.now().month)
-        year = data.get('year', datetime.now().year)
-        
-        if not company_id:
-            return jsonify({"error": "Company ID is required"}), 400
-        
-        # Get company data
-        company = Company.query.get_or_404(company_id)
-        
-        # Get Excel-like data (this would call the companies endpoint)
-        from flask import current_app
-        with current_app.test_client() as client:
-            response = client.get(f'/api/companies/{company_id}/monthly-invoice-excel?month={month}&year={year}')
-            excel_data = response.get_json()
-        
-        # Generate PDF
-        pdf = generate_excel_like_monthly_invoice_pdf(company.__dict__, excel_data)
-        
-        # Save PDF
-        invoices_dir = os.path.join(os.path.dirname(__file__), "invoices")
-        if not os.path.exists(invoices_dir):
-            os.makedirs(invoices_dir)
+        document = _excel_like_invoice_document(data)
         
-        pdf_filename = f"excel_invoice_{company.name}_{month}_{year}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = os.path.join(invoices_dir, pdf_filename)
-        pdf.output(pdf_path)
+        # Generate and save the PDF, or reuse the one rendered from the same data
+        progress(50, "Rendering PDF")
+        pdf_filename, cached = render_cache.cache.fetch(document.name, document.key, document.render)
         
-        return jsonify({
+        return {
             "message": "Excel-like monthly invoice generated successfully",
             "pdfPath": f"/api/invoices/download/{pdf_filename}",
-            "filename": pdf_filename
-        }), 201
+            "filename": pdf_filename,
+            "cached": cached
+        }, 201
         
+    except InvoiceNotRendered as e:
+        return e.body, e.status
     except Exception as e:
         logging.error(f"Error generating Excel-like monthly invoice: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 # NEW ROUTE: Generate detailed invoice for my company
 @invoices_bp.route("/invoices/my-company-detailed/generate", methods=["POST"])
 def generate_my_company_detailed_invoice():
     """Generate detailed invoice for my company"""
+    return _generate_or_queue("my_company_detailed", request.get_json())
+
+def _my_company_detailed_invoice_document(data):
+    """The my-company detailed invoice: every service of a company's clients with its cost and profit"""
+    company_id = data.get('companyId')
+    month = data.get('month', datetime.now().month)
+    year = data.get('year', datetime.now().year)
+    
+    if not company_id:
+        raise InvoiceNotRendered({"error": "Company ID is required"}, 400)
+    
+    # Get company data
+    company = Company.query.get_or_404(company_id)
+    
+    # Service lines with their real cost and profit, streamed from one query.
+    # The stream is hashed first; it is only queried again to render a PDF
+    # that is not in the render cache yet
+    month, year = report_period(month, year)
+    return InvoiceDocument(
+        name=f"my_company_detailed_{company.name}_{month}_{year}",
+        key=render_cache.cache.key(
+            "my_company_detailed", [company.id, month, year, date.today()],
+            rows=reports.monthly_detailed_report(company, month, year).services, settings=get_company_settings()
+        ),
+        render=lambda: generate_my_company_detailed_invoice_pdf(reports.monthly_detailed_report(company, month, year)),
+        details={},
+        preview=lambda: _my_company_detailed_preview(reports.monthly_detailed_report(company, month, year))
+    )
+
+def _my_company_detailed_preview(report):
+    # Service lines one client at a time, as the PDF draws them
+    clients = (list(services) for _, services in groupby(report.services, key=lambda service: service.clientId))
+    return previews.render(
+        "my_company_detailed.html", title="My Company Detailed Invoice", company_name=get_company_settings()[0],
+        report=report, invoice_date=date.today(), clients=clients
+    )
+
+@job_handler("my_company_detailed")
+def create_my_company_detailed_invoice(data, progress=no_progress):
     try:
-        data = request.get_json()
-        company_id = data.get('companyId')
-        month = data.get('month', datetime.now().month)
-        year = data.get('year', datetime.now().year)
-        
-        if not company_id:
-            return jsonify({"error": "Company ID is required"}), 400
-        
-        # Get company data
-        company = Company.query.get_or_404(company_id)
-        
-        # Get Excel-like data (this would call the companies endpoint)
-        from flask import current_app
-        with current_app.test_client() as client:
-            response = client.get(f'/api/companies/{company_id}/monthly-invoice-excel?month={month}&year={year}')
-            excel_data = response.get_json()
-        
-        # Generate PDF
-        pdf = generate_my_company_detailed_invoice_pdf(company.__dict__, excel_data)
-        
-        # Save PDF
-        invoices_dir = os.path.join(os.path.dirname(__file__), "invoices")
-        if not os.path.exists(invoices_dir):
-            os.makedirs(invoices_dir)
+        document = _my_company_detailed_invoice_document(data)
         
-        pdf_filename = f"my_company_detailed_{company.name}_{month}_{year}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = os.path.join(invoices_dir, pdf_filename)
-        pdf.output(pdf_path)
+        # Generate and save the PDF
+        progress(50, "Rendering PDF")
+        pdf_filename, cached = render_cache.cache.fetch(document.name, document.key, document.render)
         
-        return jsonify({
+        return {
             "message": "My company detailed invoice generated successfully",
             "pdfPath": f"/api/invoices/download/{pdf_filename}",
-            "filename": pdf_filename
-        }), 201
+            "filename": pdf_filename,
+            "cached": cached
+        }, 201
         
+    except InvoiceNotRendered as e:
+        return e.body, e.status
     except Exception as e:
         logging.error(f"Error generating my company detailed invoice: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+@invoices_bp.route("/invoices/company/<int:company_id>/statement/generate", methods=["POST"])
+def generate_company_statement(company_id):
+    """Generate the statement pack of a company: every client's detailed invoice for a month in one PDF"""
+    data = request.get_json()
+    return _generate_or_queue("company_statement", dict(data, companyId=company_id) if isinstance(data, dict) else data)
+
+@invoices_bp.route("/invoices/company/<int:company_id>/statement/preview", methods=["GET"])
+def preview_company_statement(company_id):
+    return _html_preview("company_statement", dict(_preview_args(), companyId=company_id))
+
+def _company_statement_document(data):
+    """The statement pack of a company: the detailed invoice of each of its clients with services in a month"""
+    company_id = data.get("companyId")
+    month = data.get("month", datetime.now().month)
+    year = data.get("year", datetime.now().year)
+
+    if not company_id:
+        raise InvoiceNotRendered({"error": "Company ID is required"}, 400)
+    period_problem = period_error(month, year)
+    if period_problem:
+        raise InvoiceNotRendered({"error": period_problem}, 400)
+
+    company = Company.query.get_or_404(company_id)
+    month, year = report_period(month, year)
+
+    # The services of all clients come from one query (with their booking and
+    # client); each client's section gets the same data as its own invoice
+    # for the month from POST /invoices/client/<id>/generate
+    services_by_client = {}
+    for service in _monthly_invoice_services(company.id, month, year):
+        services_by_client.setdefault(service.booking_ref.client_ref, []).append(service)
+    if not services_by_client:
+        raise InvoiceNotRendered({"message": "No services found for this company's clients in the specified period"}, 200)
+
+    clients = [
+        _client_invoice_data(client, services)
+        for client, services in sorted(services_by_client.items(), key=lambda entry: entry[0].id)
+    ]
+    company_name_safe = safe_text(company.name or f"company_{company.id}").replace(" ", "_")
+    return InvoiceDocument(
+        name=f"company_statement_{company_name_safe}_{month}_{year}",
+        key=render_cache.cache.key("company_statement", [company.id, clients, date.today()], settings=get_company_settings()),
+        render=lambda: generate_company_statement_pdf(clients),
+        details={"clientCount": len(clients), "totalAmount": sum(client["totalSellingPrice"] for client in clients)},
+        preview=lambda: previews.render(
+            "company_statement.html", title="Company Statement", company_name=get_company_settings()[0],
+            clients=clients, invoice_date=date.today()
+        )
+    )
+
+@job_handler("company_statement")
+def create_company_statement(data, progress=no_progress):
+    try:
+        document = _company_statement_document(data)
+
+        # One document and one rendering context for all of the clients
+        progress(50, f"Rendering {document.details['clientCount']} client invoices")
+        pdf_filename, cached = render_cache.cache.fetch(document.name, document.key, document.render)
+
+        return {
+            "message": "Company statement generated successfully",
+            "pdfPath": f"/api/invoices/download/{pdf_filename}",
+            "filename": pdf_filename,
+            "cached": cached,
+            "clientCount": document.details["clientCount"],
+            "totalAmount": document.details["totalAmount"]
+        }, 201
+
+    except InvoiceNotRendered as e:
+        return e.body, e.status
+    except Exception as e:
+        logging.error(f"Error generating company statement: {e}")
+        return {"error": str(e)}, 500
+
+# Generate endpoints that can answer with the PDF itself (?inline=true)
+INLINE_DOCUMENTS = {
+    "client": _client_invoice_document,
+    "monthly_excel": _excel_like_invoice_document,
+    "my_company_detailed": _my_company_detailed_invoice_document,
+    "company_statement": _company_statement_document,
+}
 
 # ==========================================
 # END OF NEW FEATURES
@@ -4,6 +4,9 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from src.models.database import db, Notification, Booking, Driver, Service, Company, Client, Settings
+from src.models import loaders, settings_cache
+from src.query_budget import query_budget
+from src.pagination import PaginationError, date_range_filter, keyset_page, page_response, wants_full_list
 import json
 import traceback
 import requests
@@ -12,33 +15,28 @@ import hmac
 
 notifications_bp = Blueprint("notifications", __name__)
 
+NOTIFICATION_SORTS = {
+    "sentAt": [Notification.sent_at, Notification.id],
+}
+
 def get_email_settings():
-    """Get email settings from database"""
+    """Get email settings from the cached database settings"""
     try:
-        email_settings = Settings.query.filter_by(key="email_settings").first()
-        if email_settings:
-            return json.loads(email_settings.value)
-        return None
+        return settings_cache.get_dict("email_settings")
     except:
         return None
 
 def get_admin_phone_numbers():
-    """Get admin phone numbers from database settings"""
+    """Get admin phone numbers from the cached database settings"""
     try:
-        admin_settings = Settings.query.filter_by(key="admin_phone_numbers").first()
-        if admin_settings:
-            return json.loads(admin_settings.value)
-        return []
+        return settings_cache.get_list("admin_phone_numbers")
     except:
         return []
 
 def get_meta_whatsapp_settings():
-    """Get Meta WhatsApp Business API settings from database"""
+    """Get Meta WhatsApp Business API settings from the cached database settings"""
     try:
-        meta_settings = Settings.query.filter_by(key="meta_whatsapp_settings").first()
-        if meta_settings:
-            return json.loads(meta_settings.value)
-        return None
+        return settings_cache.get_dict("meta_whatsapp_settings")
     except Exception as e:
         print(f"Error getting Meta WhatsApp settings: {str(e)}")
         return None
@@ -154,11 +152,12 @@ def send_email_notification(recipient_email, subject, message):
         traceback.print_exc()
         return False
 
-def send_whatsapp_notification_meta(phone_number, message):
+def send_whatsapp_notification_meta(phone_number, message, meta_settings=None):
     """Send WhatsApp notification using Meta WhatsApp Business API"""
     try:
-        # Get Meta WhatsApp settings
-        meta_settings = get_meta_whatsapp_settings()
+        # Get Meta WhatsApp settings (callers sending in a loop pass them in)
+        if meta_settings is None:
+            meta_settings = get_meta_whatsapp_settings()
         if not meta_settings:
             print("Meta WhatsApp settings not configured")
             return False
@@ -208,28 +207,31 @@ def send_whatsapp_notification_meta(phone_number, message):
         traceback.print_exc()
         return False
 
-def send_admin_notification(message):
+def send_admin_notification(message, admin_numbers=None, meta_settings=None):
     """Send notification to admin phone numbers"""
-    admin_numbers = get_admin_phone_numbers()
+    if admin_numbers is None:
+        admin_numbers = get_admin_phone_numbers()
     if not admin_numbers:
         print("Admin phone numbers not configured.")
         return False
     
+    if meta_settings is None:
+        meta_settings = get_meta_whatsapp_settings()
     success_count = 0
     for phone_number in admin_numbers:
-        if send_whatsapp_notification_meta(phone_number, message):
+        if send_whatsapp_notification_meta(phone_number, message, meta_settings):
             success_count += 1
     return success_count > 0
 
-def send_formatted_admin_notification(client_name, arrival_time, date, tour_name, notification_type="arrival"):
+def send_formatted_admin_notification(client_name, arrival_time, date, tour_name, notification_type="arrival", admin_numbers=None, meta_settings=None):
     """Send formatted notification to admin"""
     message = format_turkish_notification_template(client_name, arrival_time, date, tour_name, notification_type)
-    return send_admin_notification(message)
+    return send_admin_notification(message, admin_numbers, meta_settings)
 
-def send_formatted_driver_notification(driver_phone, client_name, arrival_time, date, tour_name, notification_type="driver_assignment"):
+def send_formatted_driver_notification(driver_phone, client_name, arrival_time, date, tour_name, notification_type="driver_assignment", meta_settings=None):
     """Send formatted notification to driver"""
     message = format_turkish_notification_template(client_name, arrival_time, date, tour_name, notification_type)
-    return send_whatsapp_notification_meta(driver_phone, message)
+    return send_whatsapp_notification_meta(driver_phone, message, meta_settings)
 
 def verify_webhook_signature(payload, signature, app_secret):
     """Verify webhook signature from Meta"""
@@ -433,7 +435,12 @@ def webhook():
 @notifications_bp.route("/notifications/driver/<int:driver_id>", methods=["GET"])
 def get_driver_notifications(driver_id):
     try:
-        notifications = Notification.query.filter_by(driver_id=driver_id).order_by(Notification.sent_at.desc()).all()
+        query = Notification.query.filter(Notification.driver_id == driver_id, date_range_filter(Notification.sent_at))
+        full_list = wants_full_list()
+        if full_list:
+            notifications, next_cursor = query.order_by(Notification.sent_at.desc()).all(), None
+        else:
+            notifications, next_cursor = keyset_page(query, NOTIFICATION_SORTS, "-sentAt")
         result = []
         for notification in notifications:
             result.append({
@@ -445,7 +452,11 @@ def get_driver_notifications(driver_id):
                 "sentStatus": notification.is_sent,
                 "sendTime": notification.sent_at.isoformat()
             })
-        return jsonify(result)
+        if full_list:
+            return jsonify(result)
+        return jsonify(page_response(result, next_cursor))
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -556,17 +567,22 @@ def send_company_notification(company_id):
         return jsonify({"error": str(e)}), 500
 
 @notifications_bp.route("/notifications/schedule", methods=["POST"])
+@query_budget(8)
 def schedule_notifications():
     """Schedule automatic notifications for upcoming bookings with Turkish templates"""
     try:
         notifications_sent = 0
+        # Resolve the recipients and API settings once for the whole run
+        # ({} rather than None when unconfigured, so the senders do not look them up again)
+        admin_numbers = get_admin_phone_numbers()
+        meta_settings = get_meta_whatsapp_settings() or {}
         
         # --- Admin Notifications (24-hour and 1-hour before client arrival) ---
         now = datetime.now()
         
         # 24-hour reminder for admin about client arrival
         twenty_four_hours_later = now + timedelta(hours=24)
-        services_24h_admin = db.session.query(Service).join(Booking).join(Client).filter(
+        services_24h_admin = db.session.query(Service).options(*loaders.service_notifications()).join(Booking).join(Client).filter(
             Service.startDate == twenty_four_hours_later.date(),
             Booking.status.in_(["pending", "confirmed"])
         ).all()
@@ -577,13 +593,13 @@ def schedule_notifications():
             date = service.startDate.strftime("%Y-%m-%d")
             tour_name = service.serviceName
             
-            if send_formatted_admin_notification(client_name, arrival_time, date, tour_name, "reminder_24h"):
+            if send_formatted_admin_notification(client_name, arrival_time, date, tour_name, "reminder_24h", admin_numbers, meta_settings):
                 notifications_sent += 1
 
         # 1-hour reminder for admin about client arrival (especially for tours)
         one_hour_later = now + timedelta(hours=1)
         services_1h_admin = []
-        for service in db.session.query(Service).join(Booking).join(Client).filter(
+        for service in db.session.query(Service).options(*loaders.service_notifications()).join(Booking).join(Client).filter(
             Service.startDate == one_hour_later.date(),
             Booking.status.in_(["pending", "confirmed"])
         ).all():
@@ -600,33 +616,33 @@ def schedule_notifications():
             date = service.startDate.strftime("%Y-%m-%d")
             tour_name = service.serviceName
             
-            if send_formatted_admin_notification(client_name, arrival_time, date, tour_name, "reminder_1h"):
+            if send_formatted_admin_notification(client_name, arrival_time, date, tour_name, "reminder_1h", admin_numbers, meta_settings):
                 notifications_sent += 1
 
         # --- Driver Notifications (Existing Logic with new templates) ---
         # Get services that need 24-hour reminders
         tomorrow = datetime.now().date() + timedelta(days=1)
-        services_24h_driver = db.session.query(Service).join(Booking).filter(
+        services_24h_driver = db.session.query(Service).options(*loaders.service_notifications()).join(Booking).filter(
             Service.startDate == tomorrow,
             Booking.status.in_(["pending", "confirmed"]),
             Service.driver_id.isnot(None) # Only notify drivers if assigned
         ).all()
         
         for service in services_24h_driver:
-            driver = Driver.query.get(service.driver_id)
+            driver = service.driver_ref
             if driver and driver.phone:
                 client_name = f"{service.booking_ref.client_ref.firstName} {service.booking_ref.client_ref.lastName}"
                 arrival_time = service.startTime.strftime("%H:%M") if service.startTime else "Belirtilmemiş"
                 date = service.startDate.strftime("%Y-%m-%d")
                 tour_name = service.serviceName
                 
-                if send_formatted_driver_notification(driver.phone, client_name, arrival_time, date, tour_name, "reminder_24h"):
+                if send_formatted_driver_notification(driver.phone, client_name, arrival_time, date, tour_name, "reminder_24h", meta_settings):
                     notifications_sent += 1
 
         # Get services that need 1-hour reminders
         one_hour_later = now + timedelta(hours=1)
         services_1h_driver = []
-        for service in db.session.query(Service).join(Booking).filter(
+        for service in db.session.query(Service).options(*loaders.service_notifications()).join(Booking).filter(
             Service.startDate == one_hour_later.date(),
             Booking.status.in_(["pending", "confirmed"]),
             Service.driver_id.isnot(None)
@@ -638,14 +654,14 @@ def schedule_notifications():
                     services_1h_driver.append(service)
 
         for service in services_1h_driver:
-            driver = Driver.query.get(service.driver_id)
+            driver = service.driver_ref
             if driver and driver.phone:
                 client_name = f"{service.booking_ref.client_ref.firstName} {service.booking_ref.client_ref.lastName}"
                 arrival_time = service.startTime.strftime("%H:%M") if service.startTime else "Belirtilmemiş"
                 date = service.startDate.strftime("%Y-%m-%d")
                 tour_name = service.serviceName
                 
-                if send_formatted_driver_notification(driver.phone, client_name, arrival_time, date, tour_name, "reminder_1h"):
+                if send_formatted_driver_notification(driver.phone, client_name, arrival_time, date, tour_name, "reminder_1h", meta_settings):
                     notifications_sent += 1
 
         return jsonify({
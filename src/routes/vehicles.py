@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
 from src.models.database import db, Vehicle, Booking, Driver, Service # Import Service model
+from src.pagination import PaginationError, keyset_page, list_arg, page_response, wants_full_list
 
 vehicles_bp = Blueprint("vehicles", __name__)
 
+VEHICLE_SORTS = {
+    "id": [Vehicle.id],
+    "plateNumber": [Vehicle.plateNumber, Vehicle.id],
+}
+
 def safe_count(query_result):
     """دالة مساعدة لضمان إرجاع رقم صحيح بدلاً من None"""
     try:
@@ -23,7 +29,15 @@ def safe_int(value, default=0):
 @vehicles_bp.route("/vehicles", methods=["GET"])
 def get_vehicles():
     try:
-        vehicles = Vehicle.query.all()
+        query = Vehicle.query
+        types = list_arg("type")
+        if types:
+            query = query.filter(Vehicle.type.in_(types))
+        full_list = wants_full_list()
+        if full_list:
+            vehicles, next_cursor = query.all(), None
+        else:
+            vehicles, next_cursor = keyset_page(query, VEHICLE_SORTS, "id")
         result = []
         for vehicle in vehicles:
             # Check current availability by querying through Service model with safe counting
@@ -65,7 +79,11 @@ def get_vehicles():
                 "activeBookings": active_bookings,
                 "completedBookings": completed_bookings
             })
-        return jsonify(result)
+        if full_list:
+            return jsonify(result)
+        return jsonify(page_response(result, next_cursor))
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
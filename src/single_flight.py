@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, jsonify
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from src.extensions import db
+from src.models.database import RequestClaim
+
+# Single-flight coalescing of expensive identical requests.
+#
+# While a request for an endpoint is being computed, requests for the same
+# endpoint with the same parameters wait for it and answer with its result
+# instead of running the queries and the render again. Within a process they
+# block on the running call. Across worker processes the first request
+# inserts a RequestClaim row keyed on the request; the others find the key
+# taken and poll the row until the result is stored on it. A claim whose
+# worker died expires after CLAIM_TIMEOUT. Only requests that saw the claim
+# running take its result, which is kept for RESULT_TTL for them and then
+# expires; a request arriving after it finished computes afresh without a
+# claim, so this is not a cache.
+
+CLAIM_TIMEOUT = timedelta(seconds=int(os.environ.get("SINGLE_FLIGHT_TIMEOUT", "600")))
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+# Long enough for every waiting request to poll once more; identical requests
+# arriving meanwhile compute on their own, so this window is kept short
+RESULT_TTL = timedelta(seconds=3 * MAX_POLL_INTERVAL)
+# Request options that change how the answer is delivered, not what it is
+IGNORED_PARAMS = ("async", "inline", "persist")
+
+RUNNING = "running"
+DONE = "done"
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_lock = threading.Lock()
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    # Query strings and form posts send numbers as text
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+def flight_key(endpoint, params):
+    """Hex digest identifying a request: the endpoint and its normalized parameters"""
+    if isinstance(params, dict):
+        params = {key: value for key, value in params.items() if key not in IGNORED_PARAMS}
+    payload = json.dumps([endpoint, _normalize(params)], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def single_flight(endpoint, params, compute):
+    """Run compute() -> (JSON body, status) once for all identical concurrent requests
+
+    Returns (body, status, shared), shared being True when the result was
+    computed by another request.
+    """
+    key = flight_key(endpoint, params)
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        body, status, _ = flight.result
+        return body, status, True
+
+    try:
+        flight.result = _claimed_call(key, endpoint, compute)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.done.set()
+
+def single_flight_response(endpoint, params, compute):
+    """single_flight as a (JSON response, status) pair; a shared result is marked X-Single-Flight: shared"""
+    body, status, shared = single_flight(endpoint, params, compute)
+    response = jsonify(body)
+    if shared:
+        response.headers["X-Single-Flight"] = "shared"
+    return response, status
+
+def _worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _shared_database():
+    # Other processes cannot see an in-memory database
+    return current_app.config["SQLALCHEMY_DATABASE_URI"] not in ("sqlite://", "sqlite:///:memory:")
+
+def _claimed_call(key, endpoint, compute):
+    if not _shared_database():
+        body, status = compute()
+        return body, status, False
+
+    delay = POLL_INTERVAL
+    waited = False
+    while not _claim(key, endpoint):
+        claim = _stored_claim(key)
+        if claim is not None and claim.status == DONE:
+            if waited:
+                return json.loads(claim.result), claim.statusCode, True
+            # Finished before this request arrived, so it is not shared. The
+            # row is left to expire: other workers may still be polling it
+            body, status = compute()
+            return body, status, False
+        if claim is not None:
+            waited = True
+        # Still running, or released or expired just now (claimed on the next round)
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_POLL_INTERVAL)
+
+    try:
+        body, status = compute()
+    except BaseException:
+        _release(key)
+        raise
+    _store(key, body, status)
+    return body, status, False
+
+def _claim(key, endpoint):
+    """Insert the claim row for key; False when another request holds it"""
+    table = RequestClaim.__table__
+    now = datetime.utcnow()
+    try:
+        # Own connection and transaction, so other workers see the claim at once
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.expiresAt < now))
+            connection.execute(insert(table).values(
+                requestKey=key, endpoint=endpoint, status=RUNNING, worker=_worker(), created_at=now,
+                expiresAt=now + CLAIM_TIMEOUT
+            ))
+        return True
+    except IntegrityError:
+        return False
+
+def _stored_claim(key):
+    table = RequestClaim.__table__
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(table.c.status, table.c.statusCode, table.c.result).where(
+                table.c.requestKey == key, table.c.expiresAt >= datetime.utcnow()
+            )
+        ).first()
+
+def _store(key, body, status):
+    """Put the result on the claim, for the requests of other workers waiting on it"""
+    table = RequestClaim.__table__
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(table.c.requestKey == key, table.c.worker == _worker()).values(
+                status=DONE, statusCode=status, result=current_app.json.dumps(body),
+                expiresAt=datetime.utcnow() + RESULT_TTL
+            ))
+    except Exception as e:
+        # Waiting requests then claim the key and compute the result themselves
+        logging.warning(f"Could not store the single-flight result of {key[:12]}: {e}")
+        _release(key)
+
+def _release(key):
+    """Delete this worker's running claim on key, so a waiting request can claim it"""
+    table = RequestClaim.__table__
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(
+                table.c.requestKey == key, table.c.worker == _worker(), table.c.status == RUNNING
+            ))
+    except Exception as e:
+        logging.warning(f"Could not release the single-flight claim {key[:12]}: {e}")